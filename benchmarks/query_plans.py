@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+"""
+Show the query plans and timings of the queries hitting the
+composite indexes, before and after the ``0006_composite_indexes``
+migration and the following ones.
+
+The database is migrated to ``0005``, populated with random data,
+the queries are explained and timed, then the database is migrated
+to the last migration and the queries are explained and timed again.
+
+By default a temporary SQLite database is used::
+
+    python benchmarks/query_plans.py --persons 2000
+
+A different database can be used, defining it in a settings module::
+
+    DJANGO_SETTINGS_MODULE=bench_settings python benchmarks/query_plans.py
+
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+import django
+from django.conf import settings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def setup(db_name):
+    if 'DJANGO_SETTINGS_MODULE' not in os.environ:
+        settings.configure(
+            DATABASES={
+                'default': {
+                    'ENGINE': 'django.db.backends.sqlite3',
+                    'NAME': db_name,
+                }
+            },
+            INSTALLED_APPS=(
+                'django.contrib.contenttypes',
+                'popolo',
+            ),
+            SECRET_KEY='this-is-just-for-benchmarks-so-not-that-secret',
+            ROOT_URLCONF='popolo.urls',
+        )
+    django.setup()
+
+
+def populate(n_persons):
+    """Generate persons, with identifiers, other names and
+    memberships to organizations and posts, and area relationships.
+    Rows are inserted with raw SQL, so that the tables can be populated
+    while the schema is at the previous migration.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from django.db import connection, transaction
+
+    from popolo.utils.intervals import start_key, end_key
+
+    def date(year_from, year_to):
+        return '{0}-{1:02d}-{2:02d}'.format(
+            random.randint(year_from, year_to),
+            random.randint(1, 12), random.randint(1, 28)
+        )
+
+    def dates(year_from, year_to):
+        """A start date between ``year_from`` and 1990, and an end
+        date between 1991 and ``year_to``, followed by their keys"""
+        start, end = date(year_from, 1990), date(1991, year_to)
+        return [start, end, start_key(start), end_key(end)]
+
+    ct_person = ContentType.objects.get_or_create(
+        app_label='popolo', model='person'
+    )[0].id
+    ct_org = ContentType.objects.get_or_create(
+        app_label='popolo', model='organization'
+    )[0].id
+
+    n_orgs = max(n_persons // 20, 1)
+    with transaction.atomic(), connection.cursor() as c:
+        for n in range(n_orgs):
+            c.execute(
+                "INSERT INTO popolo_organization "
+                "(name, slug, created_at, updated_at, start_key, end_key) "
+                "VALUES (%s, %s, '2018-01-01', '2018-01-01', 0, 14608240)",
+                ['org {0}'.format(n), 'org-{0}'.format(n)]
+            )
+            c.execute(
+                "INSERT INTO popolo_post "
+                "(label, organization_id, slug, created_at, updated_at, "
+                "start_key, end_key) "
+                "VALUES (%s, %s, %s, '2018-01-01', '2018-01-01', 0, 14608240)",
+                ['post {0}'.format(n), n + 1, 'post-{0}'.format(n)]
+            )
+            c.execute(
+                "INSERT INTO popolo_area "
+                "(name, identifier, classification, slug, "
+                "created_at, updated_at, start_key, end_key) "
+                "VALUES (%s, %s, '', %s, '2018-01-01', '2018-01-01', "
+                "0, 14608240)",
+                ['area {0}'.format(n), 'A{0}'.format(n), 'area-{0}'.format(n)]
+            )
+            for m in range(10):
+                c.execute(
+                    "INSERT INTO popolo_othername "
+                    "(name, othername_type, content_type_id, object_id, "
+                    "start_date, end_date, start_key, end_key) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                    [
+                        'name {0}'.format(m), random.choice(['FOR', 'ALT']),
+                        ct_org, n + 1
+                    ] + dates(1950, 2017)
+                )
+        for n in range(n_orgs):
+            for m in range(5):
+                c.execute(
+                    "INSERT INTO popolo_arearelationship "
+                    "(source_area_id, dest_area_id, classification, "
+                    "created_at, updated_at, start_key, end_key) "
+                    "VALUES (%s, %s, %s, '2018-01-01', '2018-01-01', "
+                    "0, 14608240)",
+                    [
+                        n + 1, random.randint(1, n_orgs),
+                        random.choice(['FIP', 'AMP', 'ACP'])
+                    ]
+                )
+
+        for n in range(n_persons):
+            c.execute(
+                "INSERT INTO popolo_person "
+                "(name, gender, slug, created_at, updated_at, "
+                "start_key, end_key) "
+                "VALUES (%s, '', %s, '2018-01-01', '2018-01-01', "
+                "0, 14608240)",
+                ['person {0}'.format(n), 'person-{0}'.format(n)]
+            )
+            for m in range(5):
+                c.execute(
+                    "INSERT INTO popolo_identifier "
+                    "(identifier, scheme, content_type_id, object_id, "
+                    "start_date, end_date, start_key, end_key) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                    [
+                        'ID{0}-{1}'.format(n, m),
+                        random.choice(['CF', 'OP', 'ISTAT', 'WIKI']),
+                        ct_person, n + 1
+                    ] + dates(1950, 2017)
+                )
+            for m in range(5):
+                org = random.randint(1, n_orgs)
+                c.execute(
+                    "INSERT INTO popolo_membership "
+                    "(person_id, organization_id, post_id, slug, "
+                    "start_date, end_date, created_at, updated_at, "
+                    "start_key, end_key) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, "
+                    "'2018-01-01', '2018-01-01', %s, %s)",
+                    [
+                        n + 1, org, random.choice([None, org]),
+                        'membership-{0}-{1}'.format(n, m),
+                    ] + dates(1950, 2017)
+                )
+
+    return ct_person, ct_org, n_orgs
+
+
+def hot_queries(ct_person, ct_org, n_persons, n_orgs):
+    """The queries issued by the shortcut methods and querysets"""
+    from popolo.models import (
+        Identifier, OtherName, Membership, AreaRelationship
+    )
+
+    person_id = random.randint(1, n_persons)
+    org_id = random.randint(1, n_orgs)
+    return [
+        (
+            'identifiers of an object, by scheme',
+            Identifier.objects.filter(
+                content_type_id=ct_person, object_id=person_id, scheme='CF'
+            )
+        ),
+        (
+            'other names of an object, by type',
+            OtherName.objects.filter(
+                content_type_id=ct_org, object_id=org_id,
+                othername_type='FOR'
+            ).order_by('-end_date')
+        ),
+        (
+            'memberships to the same organization and post',
+            Membership.objects.filter(
+                organization_id=org_id, post_id=org_id, person_id=person_id
+            )
+        ),
+        (
+            'current memberships to the same organization, at a date',
+            Membership.objects.filter(
+                organization_id=org_id, post__isnull=True
+            ).current('1991-01-15')
+        ),
+        (
+            'area relationships, by classification',
+            AreaRelationship.objects.filter(
+                source_area_id=org_id, classification='FIP'
+            )
+        ),
+        (
+            'memberships ended before a date',
+            Membership.objects.past('1991-01-15')
+        ),
+    ]
+
+
+def explain(queryset):
+    from django.db import connection
+
+    sql, params = queryset.query.sql_with_params()
+    if connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+    with connection.cursor() as c:
+        c.execute(prefix + sql, params)
+        return [' '.join(str(col) for col in row) for row in c.fetchall()]
+
+
+def execute(queryset):
+    from django.db import connection
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as c:
+        c.execute(sql, params)
+        return c.fetchall()
+
+
+def report(queries, repeat):
+    for title, qs in queries:
+        elapsed = min(timeit.repeat(
+            lambda: execute(qs), number=100, repeat=repeat
+        )) / 100
+        print("* {0}: {1:.3f} ms".format(title, elapsed * 1000))
+        for line in explain(qs):
+            print("    {0}".format(line))
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--persons', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    db_file = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+    db_file.close()
+    try:
+        setup(db_file.name)
+        from django.core.management import call_command
+        from django.db import connection
+
+        call_command('migrate', 'popolo', '0005', verbosity=0)
+        ct_person, ct_org, n_orgs = populate(args.persons)
+        if connection.vendor == 'sqlite':
+            connection.cursor().execute('ANALYZE')
+        queries = hot_queries(ct_person, ct_org, args.persons, n_orgs)
+
+        print("Before (0005_dateframeable_date_keys)")
+        print("=====================================")
+        report(queries, args.repeat)
+
+        call_command('migrate', 'popolo', verbosity=0)
+        if connection.vendor == 'sqlite':
+            connection.cursor().execute('ANALYZE')
+
+        print("After (0006_composite_indexes and later)")
+        print("========================================")
+        report(queries, args.repeat)
+    finally:
+        os.unlink(db_file.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
 "A Django-based model of the OpenGovernment context, compliant with the Popolo data specifications."
 
 __version__ = '2.2.1'
+
+default_app_config = 'popolo.apps.PopoloConfig'
@@ -0,0 +1,46 @@
+from django.apps import AppConfig, apps
+from django.db.models.signals import post_migrate, pre_save
+from django.utils.translation import ugettext_lazy as _
+
+
+class PopoloConfig(AppConfig):
+    name = 'popolo'
+    verbose_name = _("Popolo")
+
+    def ready(self):
+        """Connect the ``pre_save`` validators only to the models
+        needing them: the dates checks and keys to Dateframeable models,
+        of any installed app, ``full_clean`` to the main popolo models
+
+        Receivers are connected in the order they have to run.
+
+        The popolo models are registered in the map of their content
+        types, emptied after each migration.
+        """
+        from popolo.behaviors.models import Dateframeable
+        from popolo.utils import content_types
+        from popolo.models import (
+            VALIDATED_MODELS, verify_start_end_dates_order,
+            validate_fields, update_dateframeable_keys
+        )
+
+        dateframeable = [
+            m for m in apps.get_models() if issubclass(m, Dateframeable)
+        ]
+        for receiver, senders in (
+            (verify_start_end_dates_order, dateframeable),
+            (validate_fields, VALIDATED_MODELS),
+            (update_dateframeable_keys, dateframeable),
+        ):
+            for sender in senders:
+                pre_save.connect(
+                    receiver, sender=sender,
+                    dispatch_uid='popolo_{0}_{1}'.format(
+                        receiver.__name__, sender._meta.label_lower
+                    )
+                )
+
+        content_types.register(self.get_models())
+        post_migrate.connect(
+            content_types.clear, dispatch_uid='popolo_content_types_clear'
+        )
@@ -7,12 +7,17 @@ except ImportError:
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import models, router
 from django.utils.translation import ugettext_lazy as _
 from model_utils.fields import AutoCreatedField, AutoLastModifiedField
 from autoslug import AutoSlugField
+from autoslug import utils as autoslug_utils
 from datetime import datetime
 
+from popolo.utils import PartialDate, PartialDateException
+from popolo.utils.bulk import unique_slugs
+from popolo.utils.intervals import start_key, end_key
+
 __author__ = 'guglielmo'
 
 
@@ -21,6 +26,57 @@ def get_slug_source(instance):
     return instance.slug_source
 
 
+class AllocatableAutoSlugField(AutoSlugField):
+    """An AutoSlugField allocating unique slugs with
+    ``popolo.utils.bulk.unique_slugs``, fetching the existing slugs
+    sharing the same prefix with a single query, instead of probing the
+    database once for each ``-2``, ``-3``, ... suffix
+
+    Slugs already allocated, e.g. by ``PermalinkableQuerySet.bulk_create``,
+    for instances having the ``_slug_allocated`` attribute set,
+    are accepted without querying the database.
+    """
+
+    def get_slug_source(self, instance):
+        """Return the value the slug of an instance is generated from,
+        the current slug or the populated one, as AutoSlugField does
+        """
+        value = self.value_from_object(instance)
+        if self.always_update or (self.populate_from and not value):
+            value = autoslug_utils.get_prepopulated_value(self, instance)
+        return value
+
+    def allocate(self, instances, using='default', exclude=None):
+        """Allocate unique slugs to instances of the model
+
+        :param instances: the model instances
+        :param using: the database alias
+        :param exclude: the primary keys of the existing instances
+            among them
+        """
+        slugs = unique_slugs(
+            self.model, [self.get_slug_source(i) for i in instances],
+            field_name=self.name, using=using, exclude=exclude
+        )
+        for instance, slug in zip(instances, slugs):
+            setattr(instance, self.attname, slug)
+
+    def pre_save(self, instance, add):
+        if getattr(instance, '_slug_allocated', False):
+            return getattr(instance, self.attname)
+        if not self.unique or self.unique_with or \
+                self.manager is not None or self.manager_name is not None:
+            return super(AllocatableAutoSlugField, self).pre_save(
+                instance, add
+            )
+        self.allocate(
+            [instance],
+            using=router.db_for_write(type(instance), instance=instance),
+            exclude=[instance.pk] if instance.pk is not None else None
+        )
+        return getattr(instance, self.attname)
+
+
 class GenericRelatable(models.Model):
     """
     An abstract class that provides the possibility of generic relations
@@ -38,18 +94,13 @@ def validate_partial_date(value):
     Validate a partial date, it can be partial, but it must yet be a valid date.
     Accepted formats are: YYYY-MM-DD, YYYY-MM, YYYY.
     2013-22 must rais a ValidationError, as 2013-13-12, or 2013-11-55.
+    Parsed dates are cached, see ``PartialDate.of``.
     """
     try:
-        datetime.strptime(value, '%Y-%m-%d')
-    except ValueError:
-        try:
-            datetime.strptime(value, '%Y-%m')
-        except ValueError:
-            try:
-                datetime.strptime(value, '%Y')
-            except ValueError:
-                raise ValidationError(
-                    u'date seems not to be correct %s' % value)
+        PartialDate.of(value)
+    except PartialDateException:
+        raise ValidationError(
+            u'date seems not to be correct %s' % value)
 
 
 class Dateframeable(models.Model):
@@ -58,6 +109,13 @@ class Dateframeable(models.Model):
     the class.
     Uncomplete dates can be used. The validation pattern is: "^[0-9]{4}(-[
     0-9]{2}){0,2}$"
+
+    The ``start_key`` and ``end_key`` fields shadow the dates with
+    integer sort keys (see ``PartialDate.key``), null dates being
+    mapped to the ``PartialDate.MIN_KEY`` and ``PartialDate.MAX_KEY``
+    sentinels, so that the queryset filters can use simple,
+    indexable range predicates.
+    They are updated automatically whenever an instance is saved.
     """
     partial_date_validator = RegexValidator(regex="^[0-9]{4}(-[0-9]{2}){0,2}$",
                                             message="Date has wrong format")
@@ -72,6 +130,16 @@ class Dateframeable(models.Model):
         validators=[partial_date_validator, validate_partial_date],
         help_text=_("The date when the validity of the item ends")
     )
+    start_key = models.IntegerField(
+        _("start key"),
+        default=PartialDate.MIN_KEY, editable=False, db_index=True,
+        help_text=_("The sortable key of the start date, used in queries")
+    )
+    end_key = models.IntegerField(
+        _("end key"),
+        default=PartialDate.MAX_KEY, editable=False, db_index=True,
+        help_text=_("The sortable key of the end date, used in queries")
+    )
     end_reason = models.CharField(
         _("end reason"),
         max_length=255,
@@ -81,6 +149,31 @@ class Dateframeable(models.Model):
         )
     )
 
+    def update_date_keys(self):
+        """Update the ``start_key`` and ``end_key`` fields,
+        out of ``start_date`` and ``end_date``
+
+        This is done automatically when saving an instance, and needs
+        to be called explicitly only when ``save`` is bypassed,
+        as in ``bulk_create``.
+
+        :raise ValidationError: if one of the dates is not valid
+        """
+        try:
+            self.start_key = start_key(self.start_date)
+        except PartialDateException:
+            raise ValidationError(
+                {'start_date': u'date seems not to be correct %s' %
+                 self.start_date}
+            )
+        try:
+            self.end_key = end_key(self.end_date)
+        except PartialDateException:
+            raise ValidationError(
+                {'end_date': u'date seems not to be correct %s' %
+                 self.end_date}
+            )
+
     @property
     def is_active_now(self):
         """Return the current status of the item, whether active or not
@@ -136,7 +229,7 @@ class Permalinkable(models.Model):
     """
     from django.utils.text import slugify
 
-    slug = AutoSlugField(
+    slug = AllocatableAutoSlugField(
         populate_from=get_slug_source,
         max_length=255,
         unique=True,
@@ -3,6 +3,9 @@ from datetime import timedelta
 from datetime import datetime
 
 from django.core.exceptions import ValidationError
+from django.db.models import F
+
+from popolo.utils import PartialDate, PartialDatesInterval
 
 
 class BehaviorTestCaseMixin(object):
@@ -101,6 +104,87 @@ class DateframeableTests(BehaviorTestCaseMixin):
         self.assertEqual(self.get_model().objects.future().count(), 1,
                          "One future object should have been fetched")
 
+    def test_date_keys_are_updated_on_save(self):
+        obj = self.create_instance(start_date='2012-10-12')
+        self.assertEqual(obj.start_key, PartialDate('2012-10-12').key)
+        self.assertEqual(obj.end_key, PartialDate.MAX_KEY)
+
+        obj.start_date = None
+        obj.end_date = '2013'
+        obj.save()
+        self.assertEqual(obj.start_key, PartialDate.MIN_KEY)
+        self.assertEqual(obj.end_key, PartialDate('2013').key)
+
+    def test_date_keys_are_updated_on_update(self):
+        objects = self.get_model().objects
+        obj = self.create_instance(start_date='2000')
+        rows = objects.filter(pk=obj.pk)
+
+        rows.update(end_date='2010-01-01')
+        self.assertEqual(objects.past('2015').count(), 1)
+        self.assertEqual(objects.current('2020-01-01').count(), 0)
+        self.assertEqual(
+            rows.get().end_key, PartialDate('2010-01-01').key
+        )
+
+        # keys of dates set with expressions are computed afterwards
+        rows.update(end_date=F('start_date'), start_date=None)
+        obj = rows.get()
+        self.assertEqual(obj.end_date, '2000')
+        self.assertEqual(obj.end_key, PartialDate('2000').key)
+        self.assertEqual(obj.start_key, PartialDate.MIN_KEY)
+        self.assertEqual(objects.past('2001').count(), 1)
+
+        with self.assertRaises(ValidationError):
+            rows.update(start_date='2010-13')
+
+    def test_querysets_filters_open_ended(self):
+        """Test current, past and future querysets with null dates"""
+        self.create_instance(start_date='2012-10-12')
+        self.create_instance(end_date='2012-10-12')
+
+        self.assertEqual(
+            self.get_model().objects.current('2012-10-12').count(), 2)
+        self.assertEqual(
+            self.get_model().objects.current('2012-10').count(), 1)
+        self.assertEqual(
+            self.get_model().objects.current('2013').count(), 1)
+        self.assertEqual(
+            self.get_model().objects.past('2013').count(), 1)
+        self.assertEqual(
+            self.get_model().objects.future('2012').count(), 1)
+
+    def test_overlapping_queryset(self):
+        """Test the overlapping queryset gives the same results as
+        PartialDate.intervals_overlap, touching ranges excluded"""
+        dates = [
+            (None, None), ('2010', None), (None, '2010'),
+            ('2010-01-01', '2010-01-01'), ('2010', '2010-12-31'),
+            ('2010-06', '2011-06'), ('2011-06-01', None),
+            ('2005-03-04', '2010-01-01'), (None, '2009-12-31'),
+        ]
+        ids = [
+            self.create_instance(start_date=s, end_date=e).pk
+            for s, e in dates
+        ]
+        for start, end in dates + [('2010-01-01', '2010-01-02')]:
+            new_int = PartialDatesInterval(start=start, end=end)
+            expected = set(
+                pk for pk, (s, e) in zip(ids, dates)
+                if PartialDate.intervals_overlap(
+                    new_int, PartialDatesInterval(start=s, end=e)
+                ) > 0
+            )
+            self.assertEqual(
+                set(
+                    self.get_model().objects.filter(pk__in=ids).overlapping(
+                        start, end
+                    ).values_list('pk', flat=True)
+                ),
+                expected,
+                "overlapping({0}, {1})".format(start, end)
+            )
+
     def test_is_active_now(self):
         i = self.create_instance()
         self.assertEqual(i.is_active_now, True)
@@ -185,3 +269,9 @@ class PermalinkableTests(BehaviorTestCaseMixin):
     def test_instance_permalink_contains_slug(self):
         i = self.create_instance()
         self.assertIn(i.slug, i.get_absolute_url())
+
+    def test_instance_keeps_slug_when_saved_again(self):
+        i = self.create_instance()
+        slug = i.slug
+        i.save()
+        self.assertEqual(i.slug, slug)
@@ -0,0 +1,209 @@
+"""Streaming exporter of Popolo JSON.
+
+Collections are scanned with ``QuerySet.iterator``, in chunks of
+``batch_size`` instances; for each chunk, identifiers, other names,
+contact details, links and sources are fetched with one query for
+each relation, and the records are written out before the next chunk
+is read, so that the memory footprint depends on ``batch_size``,
+not on the size of the database.
+
+Two layouts are written, the ones read by the importer
+(see ``popolo.importers.reader``):
+
+* the Popolo JSON export, a single object whose keys are collections,
+  each an array of records;
+* NDJSON, a record per line, with its collection in the ``_type`` key.
+
+Records refer to each other through the primary keys of the rows::
+
+    exporter = PopoloJSONExporter(batch_size=1000)
+    with io.open('export.ndjson', 'w', encoding='utf-8') as fp:
+        counts = exporter.export(fp, format='ndjson')
+
+"""
+import io
+import json
+from collections import OrderedDict
+
+from django.utils import six
+
+from popolo import prefetch
+from popolo.importers.popolo_json import PopoloJSONImporter, SINGULAR
+from popolo.importers.reader import NDJSON_EXTENSIONS
+from popolo.utils.bulk import chunks
+
+
+class PopoloJSONExporter(object):
+    """Export areas, organizations, persons, posts and memberships
+    as Popolo JSON, or NDJSON
+
+    The records have the keys read by ``PopoloJSONImporter``, so that
+    an export can be imported in another database.
+    """
+
+    #: the collections, in the order they are exported
+    collections = PopoloJSONImporter.collections
+
+    #: the fields of the instances copied into the keys of the records
+    fields = PopoloJSONImporter.fields
+
+    #: the keys of the records referring to other records:
+    #: key -> (foreign key, referred collection)
+    references = PopoloJSONImporter.references
+
+    #: the generic relations copied into the records
+    related = (
+        'identifiers', 'other_names', 'contact_details', 'links', 'sources'
+    )
+
+    def __init__(self, batch_size=500):
+        """Initialize the exporter
+
+        :param batch_size: the number of instances read at once
+        """
+        self.batch_size = batch_size
+
+    @property
+    def models(self):
+        from popolo.models import Area, Organization, Person, Post, Membership
+        return {
+            'areas': Area,
+            'organizations': Organization,
+            'persons': Person,
+            'posts': Post,
+            'memberships': Membership,
+        }
+
+    def get_queryset(self, collection):
+        """Return the instances of a collection to be exported"""
+        return self.models[collection]._default_manager.order_by('pk')
+
+    def iter_records(self, collections=None):
+        """Yield the records of the instances of some collections
+
+        :param collections: the collections to be exported,
+            by default all of them
+        :return: generator of (collection, record) tuples
+        """
+        for collection in collections or self.collections:
+            model = self.models[collection]
+            names = set(f.name for f in model._meta.get_fields())
+            relations = [r for r in self.related if r in names]
+            for chunk in chunks(
+                self.get_queryset(collection).iterator(), self.batch_size
+            ):
+                prefetch.generic(chunk, *relations)
+                for obj in chunk:
+                    yield collection, self.record(collection, obj, relations)
+
+    def record(self, collection, obj, relations):
+        """Return the record of an instance
+
+        :param collection: the collection of the instance
+        :param obj: the instance, with its relations prefetched
+        :param relations: the relations copied into the record
+        :return: the record
+        """
+        data = OrderedDict([('id', six.text_type(obj.pk))])
+        for name in self.fields[collection]:
+            value = getattr(obj, name)
+            if value not in (None, ''):
+                data[name] = value
+        for key, (field, referred) in self.references[collection].items():
+            value = getattr(obj, field + '_id')
+            if value is not None:
+                data[key] = six.text_type(value)
+        if collection == 'memberships' and obj.member_organization_id:
+            data['member'] = OrderedDict([
+                ('@type', 'Organization'),
+                ('id', six.text_type(obj.member_organization_id)),
+            ])
+        for relation in relations:
+            rows = [
+                getattr(self, relation[:-1] + '_row')(related)
+                for related in getattr(obj, relation).all()
+            ]
+            if rows:
+                data[relation] = rows
+        return data
+
+    @staticmethod
+    def _row(obj, keys):
+        return OrderedDict(
+            (k, getattr(obj, k)) for k in keys
+            if getattr(obj, k) not in (None, '')
+        )
+
+    def identifier_row(self, identifier):
+        return self._row(identifier, (
+            'identifier', 'scheme', 'start_date', 'end_date', 'source'
+        ))
+
+    def other_name_row(self, other_name):
+        return self._row(other_name, (
+            'name', 'note', 'start_date', 'end_date'
+        ))
+
+    def contact_detail_row(self, contact_detail):
+        row = OrderedDict([('type', contact_detail.contact_type.lower())])
+        row.update(self._row(contact_detail, ('value', 'label', 'note')))
+        return row
+
+    def link_row(self, link_rel):
+        return self._row(link_rel.link, ('url', 'note'))
+
+    def source_row(self, source_rel):
+        return self._row(source_rel.source, ('url', 'note'))
+
+    def export(self, fp, format='json', collections=None):
+        """Write the records of some collections
+
+        :param fp: a text file, or file-like object
+        :param format: ``json`` or ``ndjson``
+        :param collections: the collections to be exported,
+            by default all of them
+        :return: the number of records written, by collection
+        """
+        counts = OrderedDict(
+            (c, 0) for c in collections or self.collections
+        )
+        records = self.iter_records(list(counts))
+        if format == 'ndjson':
+            for collection, record in records:
+                record['_type'] = SINGULAR[collection]
+                fp.write(six.text_type(json.dumps(record)) + u'\n')
+                counts[collection] += 1
+            return counts
+
+        fp.write(u'{')
+        current = None
+        for collection, record in records:
+            if collection != current:
+                if current is not None:
+                    fp.write(u'\n],\n')
+                fp.write(u'{0}: [\n'.format(json.dumps(collection)))
+                current = collection
+            else:
+                fp.write(u',\n')
+            fp.write(six.text_type(json.dumps(record)))
+            counts[collection] += 1
+        if current is not None:
+            fp.write(u'\n]')
+        fp.write(u'}\n')
+        return counts
+
+    def export_to_file(self, filename, format=None, collections=None):
+        """Write the records of some collections to a file
+
+        :param filename: the path of the file
+        :param format: ``json`` or ``ndjson``; by default NDJSON is
+            written for the ``.ndjson`` and ``.jsonl`` extensions
+        :param collections: the collections to be exported,
+            by default all of them
+        :return: the number of records written, by collection
+        """
+        if format is None:
+            format = 'ndjson' if filename.endswith(NDJSON_EXTENSIONS) \
+                else 'json'
+        with io.open(filename, 'w', encoding='utf-8') as fp:
+            return self.export(fp, format, collections)
@@ -0,0 +1,241 @@
+"""Columnar snapshots of memberships, ownerships, electoral results
+and areas, for analytics.
+
+Each table is a flat, denormalized view of a model: the names and
+identifiers of the related persons, organizations, posts and areas are
+joined in the database, and the rows are read with a single
+``values_list`` query, through a server-side cursor where the database
+supports it (``QuerySet.iterator``).
+
+Rows are written in chunks of ``batch_size``, as typed columns:
+Parquet files are written when ``pyarrow`` is installed, CSV files
+otherwise::
+
+    exporter = SnapshotExporter()
+    files = exporter.export('/tmp/snapshot')
+
+"""
+import csv
+import io
+import os
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import models
+from django.utils import six
+
+from popolo.utils.bulk import chunks
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class SnapshotExporter(object):
+    """Write the tables of a snapshot, a file each"""
+
+    #: the tables: name -> (model, lookups of the columns);
+    #: columns are named after their lookups, ``__`` replaced by ``_``
+    tables = OrderedDict([
+        ('memberships', ('popolo.Membership', (
+            'id', 'label', 'role', 'start_date', 'end_date',
+            'person_id', 'person__name',
+            'member_organization_id', 'member_organization__name',
+            'organization_id', 'organization__name',
+            'organization__classification',
+            'post_id', 'post__label', 'post__role',
+            'area_id', 'area__name', 'area__identifier',
+            'on_behalf_of_id', 'on_behalf_of__name',
+        ))),
+        ('ownerships', ('popolo.Ownership', (
+            'id', 'organization_id', 'organization__name',
+            'owner_person_id', 'owner_person__name',
+            'owner_organization_id', 'owner_organization__name',
+            'percentage', 'start_date', 'end_date',
+        ))),
+        ('electoral_results', ('popolo.ElectoralResult', (
+            'id', 'event_id', 'event__name', 'event__event_type',
+            'event__identifier',
+            'constituency_id', 'constituency__name',
+            'constituency__identifier',
+            'organization_id', 'organization__name',
+            'list_id', 'list__name', 'candidate_id', 'candidate__name',
+            'n_eligible_voters', 'n_ballots', 'perc_turnout',
+            'perc_valid_votes', 'perc_null_votes', 'perc_blank_votes',
+            'n_preferences', 'perc_preferences', 'is_elected',
+        ))),
+        ('areas', ('popolo.Area', (
+            'id', 'name', 'identifier', 'classification',
+            'istat_classification', 'parent_id', 'parent__name',
+            'parent__identifier', 'is_provincial_capital', 'gps_lat',
+            'gps_lon', 'inhabitants', 'start_date', 'end_date',
+        ))),
+    ])
+
+    def __init__(self, batch_size=10000, format=None):
+        """Initialize the exporter
+
+        :param batch_size: the number of rows written at once
+        :param format: ``parquet`` or ``csv``; by default Parquet
+            when ``pyarrow`` is installed, CSV otherwise
+        :raise ImportError: if Parquet is requested, but ``pyarrow``
+            is not installed
+        """
+        if format is None:
+            format = 'csv' if pyarrow is None else 'parquet'
+        if format == 'parquet' and pyarrow is None:
+            raise ImportError(
+                "pyarrow is required to write Parquet, but it is not "
+                "installed"
+            )
+        self.batch_size = batch_size
+        self.format = format
+
+    def columns(self, table):
+        """Return the columns of a table
+
+        :param table: the name of the table
+        :return: list of (name, lookup, type) tuples, the type being
+            one of ``int``, ``float``, ``bool`` and ``string``
+        """
+        from django.apps import apps
+
+        label, lookups = self.tables[table]
+        model = apps.get_model(label)
+        columns = []
+        for lookup in lookups:
+            opts = model._meta
+            parts = lookup.split('__')
+            for part in parts[:-1]:
+                opts = opts.get_field(part).related_model._meta
+            field = opts.get_field(parts[-1])
+            columns.append((
+                lookup.replace('__', '_'), lookup, self.column_type(field)
+            ))
+        return columns
+
+    @staticmethod
+    def column_type(field):
+        if field.is_relation:
+            field = field.target_field
+        if isinstance(field, (models.BooleanField, models.NullBooleanField)):
+            return 'bool'
+        if isinstance(field, (models.AutoField, models.IntegerField)):
+            return 'int'
+        if isinstance(field, (models.FloatField, models.DecimalField)):
+            return 'float'
+        return 'string'
+
+    def get_queryset(self, table):
+        """Return the rows of a table, as tuples of the column values"""
+        from django.apps import apps
+
+        label, lookups = self.tables[table]
+        return apps.get_model(label)._default_manager.order_by(
+            'pk'
+        ).values_list(*lookups)
+
+    def export(self, directory, tables=None):
+        """Write the tables of a snapshot into a directory
+
+        :param directory: the directory of the files, created if missing
+        :param tables: the names of the tables, by default all of them
+        :return: dict of (path, number of rows) tuples, by table
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        files = OrderedDict()
+        for table in tables or self.tables:
+            path = os.path.join(
+                directory, '{0}.{1}'.format(table, self.format)
+            )
+            files[table] = (path, self.export_table(table, path))
+        return files
+
+    def export_table(self, table, path):
+        """Write a table into a file
+
+        :param table: the name of the table
+        :param path: the path of the file
+        :return: the number of rows written
+        """
+        columns = self.columns(table)
+        writer = (
+            _ParquetWriter if self.format == 'parquet' else _CSVWriter
+        )(path, columns)
+        n = 0
+        try:
+            rows = self.get_queryset(table).iterator()
+            for chunk in chunks(rows, self.batch_size):
+                writer.write(chunk)
+                n += len(chunk)
+        finally:
+            writer.close()
+        return n
+
+
+class _CSVWriter(object):
+    """Write chunks of rows to a CSV file, with a header"""
+
+    def __init__(self, path, columns):
+        if six.PY2:
+            self.file = open(path, 'wb')
+        else:
+            self.file = io.open(path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.file)
+        self.write([[name for name, lookup, type in columns]])
+
+    def write(self, rows):
+        if six.PY2:
+            rows = (
+                [
+                    v.encode('utf-8') if isinstance(v, six.text_type) else v
+                    for v in row
+                ] for row in rows
+            )
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter(object):
+    """Write chunks of rows to a Parquet file, a row group each"""
+
+    types = {
+        'int': 'int64',
+        'float': 'float64',
+        'bool': 'bool_',
+        'string': 'string',
+    }
+
+    def __init__(self, path, columns):
+        self.columns = columns
+        self.arrow_types = [
+            getattr(pyarrow, self.types[type])()
+            for name, lookup, type in columns
+        ]
+        self.schema = pyarrow.schema([
+            pyarrow.field(name, arrow_type) for (name, lookup, type),
+            arrow_type in zip(columns, self.arrow_types)
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        arrays = []
+        for (name, lookup, type), arrow_type, values in zip(
+            self.columns, self.arrow_types, zip(*rows)
+        ):
+            if type == 'float':
+                values = [
+                    float(v) if isinstance(v, Decimal) else v for v in values
+                ]
+            arrays.append(pyarrow.array(list(values), type=arrow_type))
+        self.writer.write_table(
+            pyarrow.Table.from_arrays(arrays, schema=self.schema)
+        )
+
+    def close(self):
+        self.writer.close()
@@ -0,0 +1,200 @@
+"""The progress of imports, persisted so that they can be resumed.
+
+A checkpoint is a directory holding:
+
+* ``state.json``, the committed chunks of each collection, the
+  completed stages and the stats of the import, written again,
+  atomically, each time a chunk is committed;
+* ``spool/``, the spool files of the collections, so that chunks are
+  read back in the same order when resuming;
+* ``ids.sqlite3``, the ids map of the imported records.
+
+Chunks are numbered in the order they are produced, for each
+collection; the committed ones are stored as an offset, below which
+all chunks are committed, and the list of the committed chunks
+beyond it.
+
+As ``state.json`` can only be written once a chunk is committed, each
+chunk is also recorded in the database, as an ``ImportedChunk`` row
+inserted in the transaction of the chunk, with its counts and the
+primary keys of its records: the chunks committed right before an
+import was interrupted, and missing from ``state.json``, are recovered
+out of these rows when resuming, instead of being written again.
+The rows are deleted with the checkpoint.
+"""
+import io
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.utils import six
+
+
+class Checkpoint(object):
+    """The progress of an import, in a directory"""
+
+    def __init__(self, path):
+        """Initialize the checkpoint
+
+        :param path: the path of the directory
+        """
+        self.path = path
+        self.state = None
+        self._lock = threading.Lock()
+
+    @property
+    def spool_dir(self):
+        return os.path.join(self.path, 'spool')
+
+    @property
+    def id_map_path(self):
+        return os.path.join(self.path, 'ids.sqlite3')
+
+    @property
+    def state_path(self):
+        return os.path.join(self.path, 'state.json')
+
+    def exists(self):
+        """Whether an import left progress to resume"""
+        return os.path.exists(self.state_path)
+
+    def start(self, source, **options):
+        """Start recording a new import, discarding previous progress
+
+        :param source: the path of the imported file
+        :param options: the options of the import to be used when
+            resuming, ex: ``batch_size``
+        """
+        if self.exists():
+            self.load()
+        self.clear()
+        os.makedirs(self.spool_dir)
+        self.state = OrderedDict([
+            ('token', uuid.uuid4().hex),
+            ('source', os.path.abspath(source)),
+            ('options', options),
+            ('spools', None),
+            ('stats', None),
+            ('stages', []),
+            ('chunks', {}),
+            ('unresolved', []),
+        ])
+        self.save()
+
+    def load(self):
+        """Load the progress of a previous import
+
+        :return: the state of the import
+        """
+        with io.open(self.state_path, encoding='utf-8') as f:
+            self.state = json.load(f, object_pairs_hook=OrderedDict)
+        return self.state
+
+    def save(self):
+        """Write the state, replacing the previous one atomically"""
+        tmp_path = self.state_path + '.tmp'
+        with io.open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(six.text_type(json.dumps(self.state)))
+            f.flush()
+            os.fsync(f.fileno())
+        getattr(os, 'replace', os.rename)(tmp_path, self.state_path)
+
+    def spooled(self, spools, stats):
+        """Record the spool files of the collections
+
+        :param spools: the paths of the files, by collection
+        :param stats: the stats of the import, once spooled
+        """
+        with self._lock:
+            self.state['spools'] = spools
+            self.state['stats'] = stats
+            self.save()
+
+    def is_committed(self, collection, n):
+        """Whether the ``n``-th chunk of a collection is committed"""
+        chunks = self.state['chunks'].get(collection)
+        return bool(chunks) and (n < chunks['offset'] or n in chunks['done'])
+
+    def committed(self, collection, n, stats, unresolved=()):
+        """Record the ``n``-th chunk of a collection as committed
+
+        :param stats: the stats of the import, including the chunk
+        :param unresolved: the collections with unresolved parents
+        """
+        with self._lock:
+            chunks = self.state['chunks'].setdefault(
+                collection, {'offset': 0, 'done': []}
+            )
+            done = set(chunks['done'])
+            done.add(n)
+            while chunks['offset'] in done:
+                done.remove(chunks['offset'])
+                chunks['offset'] += 1
+            chunks['done'] = sorted(done)
+            self.state['stats'] = stats
+            self.state['unresolved'] = sorted(
+                set(self.state['unresolved']) | set(unresolved)
+            )
+            self.save()
+
+    def mark(self, collection, n, counts, ids, unresolved=False):
+        """Record the ``n``-th chunk of a collection in the database,
+        within the transaction writing its rows
+
+        :param counts: the counts of the chunk, added to the stats
+        :param ids: list of (source id, primary key) tuples
+            of the records of the chunk
+        :param unresolved: whether the chunk has unresolved parents
+        """
+        from popolo.models import ImportedChunk
+
+        ImportedChunk.objects.create(
+            checkpoint=self.state['token'], collection=collection,
+            number=n, counts=json.dumps(counts), ids=json.dumps(ids),
+            unresolved=unresolved
+        )
+
+    def unrecorded(self):
+        """Return the chunks recorded in the database, but not as
+        committed in the state, as when the import was interrupted
+        right after committing them
+
+        :return: list of (collection, number, counts, ids, unresolved)
+            tuples
+        """
+        from popolo.models import ImportedChunk
+
+        rows = ImportedChunk.objects.filter(
+            checkpoint=self.state['token']
+        ).order_by('collection', 'number')
+        return [
+            (
+                r.collection, r.number, json.loads(r.counts),
+                json.loads(r.ids), r.unresolved
+            )
+            for r in rows if not self.is_committed(r.collection, r.number)
+        ]
+
+    def stage_completed(self, stage):
+        """Record a stage as completed
+
+        :param stage: the name of the stage
+        """
+        with self._lock:
+            self.state['stages'].append(stage)
+            self.save()
+
+    def clear(self):
+        """Remove the directory of the checkpoint, and the chunks
+        recorded in the database"""
+        from popolo.models import ImportedChunk
+
+        if self.state is not None:
+            ImportedChunk.objects.filter(
+                checkpoint=self.state['token']
+            ).delete()
+        self.state = None
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,219 @@
+"""Maps of the ids of the imported records to primary keys.
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+from django.utils import six
+
+
+class IdMap(object):
+    """The primary keys of the imported records, by collection
+    and source id, together with an optional hash of each record
+
+    Keys are kept in memory up to ``max_memory`` entries; beyond that
+    they are spilled to a SQLite database in a temporary file,
+    so that the memory footprint of an import is bounded.
+
+    Given a ``path``, keys are instead stored in a SQLite database
+    at that path from the start, and kept when the map is closed,
+    so that an interrupted import can be resumed, or a later import
+    compared with the records of the previous ones.
+
+    The map can be shared by the worker threads of an import.
+    """
+
+    def __init__(self, max_memory=100000, path=None):
+        """Initialize the map
+
+        :param max_memory: the number of entries kept in memory
+        :param path: the path of a persistent database of the entries
+        """
+        self.max_memory = max_memory
+        self.path = path
+        self._memory = {}
+        self._db = None
+        self._tmpdir = None
+        self._lock = threading.RLock()
+        if path is not None:
+            self._connect(path)
+
+    def _connect(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ids (collection TEXT, "
+            "source_id TEXT, pk INTEGER, hash TEXT, "
+            "PRIMARY KEY (collection, source_id))"
+        )
+
+    def _spill(self):
+        self._tmpdir = tempfile.mkdtemp(prefix='popolo-idmap-')
+        self._connect(os.path.join(self._tmpdir, 'ids.sqlite3'))
+        self._db.executemany(
+            "INSERT INTO ids VALUES (?, ?, ?, ?)",
+            ((c, s, pk, h) for (c, s), (pk, h) in self._memory.items())
+        )
+        self._db.commit()
+        self._memory = {}
+
+    @property
+    def spilled(self):
+        """Whether the entries have been spilled to disk"""
+        return self._db is not None
+
+    def __len__(self):
+        with self._lock:
+            if self._db is None:
+                return len(self._memory)
+            return self._db.execute("SELECT COUNT(*) FROM ids").fetchone()[0]
+
+    def get(self, collection, source_id):
+        """Return the primary key of a record, or None if not imported
+
+        :param collection: the collection, ex: ``persons``
+        :param source_id: the id of the record in the source
+        :return: the primary key, or None
+        """
+        if source_id is None:
+            return None
+        source_id = six.text_type(source_id)
+        with self._lock:
+            if self._db is None:
+                entry = self._memory.get((collection, source_id))
+                return entry[0] if entry else None
+            row = self._db.execute(
+                "SELECT pk FROM ids WHERE collection = ? AND source_id = ?",
+                (collection, source_id)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, collection, source_ids):
+        """Return the primary keys of many records
+
+        :param collection: the collection, ex: ``persons``
+        :param source_ids: the ids of the records in the source
+        :return: dict of primary keys by source id, for the imported ones
+        """
+        return dict(
+            (s, pk) for s, (pk, h) in self.get_entries(
+                collection, source_ids
+            ).items()
+        )
+
+    def get_entries(self, collection, source_ids):
+        """Return the primary keys and the hashes of many records
+
+        :param collection: the collection, ex: ``persons``
+        :param source_ids: the ids of the records in the source
+        :return: dict of (primary key, hash) tuples by source id,
+            for the imported records
+        """
+        source_ids = set(
+            six.text_type(s) for s in source_ids if s is not None
+        )
+        with self._lock:
+            if self._db is None:
+                return dict(
+                    (s, self._memory[(collection, s)])
+                    for s in source_ids if (collection, s) in self._memory
+                )
+            found = {}
+            source_ids = list(source_ids)
+            # keep below the SQLite limit of variables in a query
+            for n in range(0, len(source_ids), 500):
+                chunk = source_ids[n:n + 500]
+                found.update(
+                    (s, (pk, h)) for s, pk, h in self._db.execute(
+                        "SELECT source_id, pk, hash FROM ids "
+                        "WHERE collection = ? AND source_id IN ({0})".format(
+                            ', '.join('?' * len(chunk))
+                        ),
+                        [collection] + chunk
+                    ).fetchall()
+                )
+        return found
+
+    def set_many(self, collection, items):
+        """Set the primary keys of many records
+
+        :param collection: the collection, ex: ``persons``
+        :param items: iterable of (source id, primary key) tuples,
+            or (source id, primary key, hash) tuples
+        """
+        items = [
+            (six.text_type(i[0]), i[1], i[2] if len(i) > 2 else None)
+            for i in items
+        ]
+        with self._lock:
+            if self._db is None:
+                for s, pk, h in items:
+                    self._memory[(collection, s)] = (pk, h)
+                if len(self._memory) > self.max_memory:
+                    self._spill()
+                return
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO ids VALUES (?, ?, ?, ?)",
+                    ((collection, s, pk, h) for s, pk, h in items)
+                )
+
+    def delete_many(self, collection, source_ids):
+        """Remove the entries of many records
+
+        :param collection: the collection, ex: ``persons``
+        :param source_ids: the ids of the records in the source
+        """
+        source_ids = [six.text_type(s) for s in source_ids]
+        with self._lock:
+            if self._db is None:
+                for s in source_ids:
+                    self._memory.pop((collection, s), None)
+                return
+            with self._db:
+                self._db.executemany(
+                    "DELETE FROM ids WHERE collection = ? AND source_id = ?",
+                    ((collection, s) for s in source_ids)
+                )
+
+    def items(self, collection, chunk_size=1000):
+        """Yield the source ids and primary keys of a collection,
+        reading the database a page at a time
+
+        :param collection: the collection, ex: ``persons``
+        :param chunk_size: the number of entries of a page
+        :return: generator of (source id, primary key) tuples
+        """
+        last = None
+        while True:
+            with self._lock:
+                if self._db is None:
+                    page = sorted(
+                        (s, pk) for (c, s), (pk, h) in self._memory.items()
+                        if c == collection and (last is None or s > last)
+                    )[:chunk_size]
+                else:
+                    page = self._db.execute(
+                        "SELECT source_id, pk FROM ids WHERE collection = ? "
+                        "AND source_id {0} ? ORDER BY source_id "
+                        "LIMIT ?".format('>=' if last is None else '>'),
+                        (collection, last or u'', chunk_size)
+                    ).fetchall()
+            for item in page:
+                yield item
+            if len(page) < chunk_size:
+                return
+            last = page[-1][0]
+
+    def close(self):
+        """Release the memory and the temporary files;
+        a persistent database is kept"""
+        with self._lock:
+            self._memory = {}
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+            if self._tmpdir is not None:
+                shutil.rmtree(self._tmpdir, ignore_errors=True)
+                self._tmpdir = None
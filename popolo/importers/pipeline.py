@@ -0,0 +1,94 @@
+"""A pool of worker threads processing the tasks of an import stage.
+
+Each worker thread has its own database connections (Django connections
+are thread-local), closed when the worker exits. Tasks are sent to the
+workers through bounded queues, so that the tasks produced, but not yet
+processed, do not pile up in memory.
+
+Tasks can be assigned a partition: tasks of the same partition are
+processed by the same worker, in order, so that, for example,
+the memberships of a person are never written concurrently.
+"""
+import sys
+import threading
+
+from django.db import connections
+from django.utils import six
+from django.utils.six.moves import queue
+
+_done = object()
+
+
+class Pipeline(object):
+    """Process tasks with a pool of worker threads, or in the current
+    thread when a single worker is requested
+    """
+
+    def __init__(self, workers=1, queue_size=2):
+        """Initialize the pipeline
+
+        :param workers: the number of worker threads
+        :param queue_size: the number of tasks waiting for each worker
+        """
+        self.workers = max(workers, 1)
+        self.queue_size = queue_size
+
+    def run(self, tasks, process):
+        """Process tasks, returning when all of them have been processed
+
+        :param tasks: iterable of (partition, task) tuples; the partition
+            is a hashable key, or None to let any worker process the task
+        :param process: the function processing a task
+        :raise: the first exception raised by ``process``,
+            once the workers are stopped
+        """
+        if self.workers == 1:
+            for partition, task in tasks:
+                process(task)
+            return
+
+        errors = []
+        queues = [queue.Queue(self.queue_size) for n in range(self.workers)]
+
+        def work(q):
+            try:
+                while True:
+                    task = q.get()
+                    if task is _done:
+                        break
+                    # keep draining the queue after an error,
+                    # so that the producer is never blocked
+                    if not errors:
+                        try:
+                            process(task)
+                        except Exception:
+                            errors.append(sys.exc_info())
+            finally:
+                for connection in connections.all():
+                    connection.close()
+
+        threads = [
+            threading.Thread(target=work, args=(q,)) for q in queues
+        ]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        try:
+            n = 0
+            for partition, task in tasks:
+                if errors:
+                    break
+                if partition is None:
+                    w = n % self.workers
+                    n += 1
+                else:
+                    w = hash(partition) % self.workers
+                queues[w].put(task)
+        finally:
+            for q in queues:
+                q.put(_done)
+            for t in threads:
+                t.join()
+
+        if errors:
+            six.reraise(*errors[0])
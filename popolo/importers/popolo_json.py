@@ -0,0 +1,1049 @@
+"""Streaming importer of Popolo JSON exports.
+
+The export is read record by record (see ``popolo.importers.reader``)
+and split into a spool file for each collection, so that collections
+can be imported in dependency order, whatever their order in the
+export: areas, organizations, persons, posts and memberships.
+
+Each collection is then read back in chunks of ``batch_size`` records;
+for each chunk, instances are built, validated as a batch
+(see ``popolo.validation.instances_errors``) and written with
+``bulk_create`` within a transaction, together with their identifiers,
+other names, contact details, links and sources.
+
+Cross references among records (``organization_id``, ``person_id``,
+``parent_id``, ...) are resolved through an ``IdMap`` of the source
+ids to the primary keys of the imported rows, spilled to disk when
+it grows past ``max_memory_ids`` entries.
+
+Collections are imported in stages: areas, organizations, persons
+and posts, memberships. The chunks of a stage can be imported
+concurrently by a pool of ``workers`` threads (see
+``popolo.importers.pipeline``), each with its own database connection.
+
+Given a ``checkpoint`` directory, the progress of the import is recorded
+each time a chunk is committed (see ``popolo.importers.checkpoint``),
+and an interrupted import can be continued with ``resume``, skipping
+the committed chunks; chunks are also recorded in the database, in
+their own transaction, so that the ones committed right before the
+interruption are skipped as well.
+
+Records are not matched to existing rows: unless ``append`` is given,
+an import into tables already having rows is refused, as it would
+duplicate the rows of previous imports, but for diff imports with the
+ids map of a previous import, and for resumed imports.
+
+The memory footprint depends on ``batch_size`` and ``max_memory_ids``,
+not on the size of the export::
+
+    importer = PopoloJSONImporter(batch_size=1000, workers=4)
+    stats = importer.import_from_export_json('export.json')
+    timings = importer.timings
+
+"""
+import copy
+import hashlib
+import io
+import itertools
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.utils import six, timezone
+
+from popolo.importers.checkpoint import Checkpoint
+from popolo.importers.idmap import IdMap
+from popolo.importers.pipeline import Pipeline
+from popolo.importers.reader import COLLECTIONS, iter_records
+from popolo.utils.bulk import bulk_update, chunks
+from popolo.validation import instances_errors
+
+logger = logging.getLogger(__name__)
+
+# the singular form of the collections
+SINGULAR = dict((v, k) for k, v in COLLECTIONS.items())
+
+
+class PopoloJSONImporter(object):
+    """Import persons, organizations, posts, memberships and areas out
+    of Popolo JSON exports, or NDJSON files
+
+    The ``update_<record type>`` methods build the instances out of the
+    records, and can be overridden to adapt the data of the source.
+
+    Records whose id has already been imported, during the same import,
+    are skipped; records that cannot be imported are logged and
+    counted in ``stats``, without stopping the import.
+    """
+
+    #: the collections, in the order they are imported
+    collections = ('areas', 'organizations', 'persons', 'posts', 'memberships')
+
+    #: the stages of the import: the chunks of the collections of a stage
+    #: are imported concurrently, once the previous stages are completed
+    stages = (
+        ('areas',),
+        ('organizations',),
+        ('persons', 'posts'),
+        ('memberships',),
+    )
+
+    #: the attempts at writing a chunk, failing on integrity errors
+    #: (ex: the same slug allocated by concurrent workers)
+    write_attempts = 3
+
+    #: the keys of the records copied into the fields of the instances
+    fields = {
+        'areas': (
+            'name', 'identifier', 'classification',
+            'start_date', 'end_date',
+        ),
+        'organizations': (
+            'name', 'classification', 'abstract', 'description',
+            'founding_date', 'dissolution_date', 'image',
+        ),
+        'persons': (
+            'name', 'family_name', 'given_name', 'additional_name',
+            'honorific_prefix', 'honorific_suffix', 'patronymic_name',
+            'sort_name', 'email', 'gender', 'birth_date', 'death_date',
+            'image', 'summary', 'biography', 'national_identity',
+        ),
+        'posts': (
+            'label', 'other_label', 'role', 'start_date', 'end_date',
+        ),
+        'memberships': (
+            'label', 'role', 'start_date', 'end_date',
+        ),
+    }
+
+    #: the keys of the records referring to other records:
+    #: key -> (foreign key, referred collection)
+    references = {
+        'areas': {
+            'parent_id': ('parent', 'areas'),
+        },
+        'organizations': {
+            'parent_id': ('parent', 'organizations'),
+            'area_id': ('area', 'areas'),
+        },
+        'persons': {},
+        'posts': {
+            'organization_id': ('organization', 'organizations'),
+            'area_id': ('area', 'areas'),
+        },
+        'memberships': {
+            'person_id': ('person', 'persons'),
+            'organization_id': ('organization', 'organizations'),
+            'post_id': ('post', 'posts'),
+            'on_behalf_of_id': ('on_behalf_of', 'organizations'),
+            'area_id': ('area', 'areas'),
+        },
+    }
+
+    def __init__(self, *args, **kwargs):
+        """Initialize the importer
+
+        :param truncate: ``yes`` to truncate values too long for their
+            fields, ``warn`` to truncate them and log a warning;
+            by default such records fail
+        :param batch_size: the number of records written at once
+        :param max_memory_ids: the number of ids kept in memory,
+            before spilling the ids map to disk
+        :param allow_overlap: whether memberships overlapping other
+            memberships of the same person, organization and post
+            are imported
+        :param workers: the number of threads importing the chunks of
+            a stage, each with its own database connection;
+            a single one is used on SQLite
+        :param checkpoint: the path of a directory where the progress
+            of the import is recorded, see
+            ``popolo.importers.checkpoint``
+        :param resume: whether the import recorded in ``checkpoint``
+            is continued
+        :param diff: the path of the ids map of previous imports,
+            with the hashes of their records: only new and changed
+            records are written, and the rows of the records missing
+            from the export are deleted; the map is created by the first
+            import, and updated by each import
+        :param append: whether the records are imported into tables
+            already having rows, as new rows; otherwise they must be
+            empty, unless a previous import is continued, with ``diff``
+            or ``resume``
+        """
+        self.truncate = kwargs.pop('truncate', None)
+        self.batch_size = kwargs.pop('batch_size', 500)
+        self.max_memory_ids = kwargs.pop('max_memory_ids', 100000)
+        self.allow_overlap = kwargs.pop('allow_overlap', False)
+        self.workers = kwargs.pop('workers', 1)
+        self.checkpoint = kwargs.pop('checkpoint', None)
+        self.resume = kwargs.pop('resume', False)
+        self.diff = kwargs.pop('diff', None)
+        self.append = kwargs.pop('append', False)
+        super(PopoloJSONImporter, self).__init__(*args, **kwargs)
+        self.id_map = None
+        self.stats = OrderedDict()
+        self.timings = OrderedDict()
+        self._unresolved_parents = set()
+        self._lock = threading.Lock()
+        self._chunk = threading.local()
+        self._checkpoint = None
+
+    @property
+    def models(self):
+        from popolo.models import Area, Organization, Person, Post, Membership
+        return {
+            'areas': Area,
+            'organizations': Organization,
+            'persons': Person,
+            'posts': Post,
+            'memberships': Membership,
+        }
+
+    def import_from_export_json(self, filename, format=None):
+        """Import the records of an export
+
+        With a ``checkpoint``, the progress of the import is recorded
+        as chunks are committed; with ``resume``, the import recorded
+        in the checkpoint is continued, skipping the committed chunks.
+
+        :param filename: the path of the export
+        :param format: ``json`` or ``ndjson``, see
+            ``popolo.importers.reader.iter_records``
+        :return: the stats of the import, by collection
+        :raise ValueError: if the tables are not empty, and neither
+            ``append`` is given nor a previous import is continued
+        """
+        if self.diff and self.checkpoint:
+            raise ValueError("Diff imports cannot be checkpointed")
+        continued = (
+            self.diff and os.path.exists(self.diff) or
+            self.resume and self.checkpoint and
+            Checkpoint(self.checkpoint).exists()
+        )
+        if not (self.append or continued):
+            self.check_empty()
+        keys = ('created', 'skipped', 'failed')
+        if self.diff:
+            keys = (
+                'created', 'updated', 'unchanged', 'deleted',
+                'skipped', 'failed'
+            )
+        self.stats = OrderedDict(
+            (c, OrderedDict((k, 0) for k in keys)) for c in self.collections
+        )
+        self.timings = OrderedDict()
+        self._unresolved_parents = set()
+
+        checkpoint = None
+        if self.checkpoint:
+            checkpoint = Checkpoint(self.checkpoint)
+            if self.resume and checkpoint.exists():
+                state = checkpoint.load()
+                if state['source'] != os.path.abspath(filename):
+                    raise ValueError(
+                        "The checkpoint in {0} is of the import of {1}".format(
+                            checkpoint.path, state['source']
+                        )
+                    )
+                # chunks are produced again as in the interrupted import
+                self.batch_size = state['options']['batch_size']
+                self.workers = state['options']['workers']
+                if state['stats'] is not None:
+                    self.stats = state['stats']
+                self._unresolved_parents = set(state['unresolved'])
+                logger.info("Resuming the import of %s", filename)
+            else:
+                checkpoint.start(
+                    filename, batch_size=self.batch_size, workers=self.workers
+                )
+        self._checkpoint = checkpoint
+
+        workers = self.workers
+        if workers > 1 and connection.vendor == 'sqlite':
+            # SQLite allows a single writer at a time
+            logger.info("Importing with a single worker on SQLite")
+            workers = 1
+        pipeline = Pipeline(workers=workers)
+
+        if checkpoint is not None:
+            self.id_map = IdMap(path=checkpoint.id_map_path)
+            spool_dir = checkpoint.spool_dir
+            self.recover(checkpoint)
+        else:
+            self.id_map = IdMap(max_memory=self.max_memory_ids, path=self.diff)
+            spool_dir = tempfile.mkdtemp(prefix='popolo-import-')
+        seen = IdMap(max_memory=self.max_memory_ids)
+        try:
+            spools = checkpoint and checkpoint.state['spools']
+            if not spools:
+                spools = self.spool(
+                    iter_records(filename, format), spool_dir, seen
+                )
+                if checkpoint is not None:
+                    checkpoint.spooled(spools, self.stats)
+            if self.diff:
+                # before writing, so that the new rows are not checked
+                # against the ones to be deleted
+                self.delete_missing(seen)
+            seen.close()
+            for stage in self.stages:
+                stage = [c for c in stage if c in spools]
+                name = ', '.join(stage)
+                if not stage or (
+                    checkpoint and name in checkpoint.state['stages']
+                ):
+                    continue
+                counter = itertools.count()
+                start = time.time()
+                pipeline.run(
+                    self.stage_tasks(stage, spools, workers, counter),
+                    self.process_chunk
+                )
+                for collection in stage:
+                    if collection in self._unresolved_parents:
+                        self.link_parents(collection, spools[collection])
+                self.timings[name] = (next(counter), time.time() - start)
+                if checkpoint is not None:
+                    checkpoint.stage_completed(name)
+        finally:
+            seen.close()
+            self.id_map.close()
+            if checkpoint is None:
+                shutil.rmtree(spool_dir, ignore_errors=True)
+        if checkpoint is not None:
+            # the import is completed, nothing is left to resume
+            checkpoint.clear()
+        return self.stats
+
+    def check_empty(self):
+        """Check that the tables of the collections have no rows,
+        as the rows of previous imports would be duplicated
+
+        :raise ValueError: if some tables have rows
+        """
+        populated = [
+            c for c in self.collections
+            if self.models[c]._default_manager.exists()
+        ]
+        if populated:
+            raise ValueError(
+                "The {0} tables already have rows, that would be "
+                "created again: import with the ids map of the previous "
+                "imports (diff), or append the records".format(
+                    ', '.join(populated)
+                )
+            )
+
+    def spool(self, records, spool_dir, seen):
+        """Split records into a NDJSON file for each collection,
+        skipping the records whose id has already been spooled
+
+        :param records: iterable of (collection, record) tuples
+        :param spool_dir: the directory of the files
+        :param seen: an ``IdMap``, where the ids of the records are set
+        :return: dict of the paths of the files, by collection
+        """
+        files = {}
+        # repeated ids are skipped here, rather than when importing,
+        # as records of the same id could be imported concurrently
+        try:
+            for collection, record in records:
+                source_id = record.get('id')
+                if source_id is not None:
+                    if seen.get(collection, source_id) is not None:
+                        self.stats[collection]['skipped'] += 1
+                        continue
+                    seen.set_many(collection, [(source_id, 0)])
+                if collection not in files:
+                    files[collection] = io.open(
+                        os.path.join(spool_dir, collection + '.ndjson'),
+                        'w', encoding='utf-8'
+                    )
+                files[collection].write(
+                    six.text_type(json.dumps(record)) + u'\n'
+                )
+        finally:
+            for f in files.values():
+                f.close()
+        return dict((c, f.name) for c, f in files.items())
+
+    @staticmethod
+    def read_spool(path):
+        with io.open(path, encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def stage_tasks(self, stage, spools, workers, counter):
+        """Yield the chunks of records of the collections of a stage,
+        as tasks of a ``Pipeline``
+
+        Memberships are partitioned by member, so that the memberships
+        of a person or organization, checked for overlaps when written,
+        are never written concurrently.
+
+        Chunks are numbered, and produced in the same order for the
+        same spool files, ``batch_size`` and ``workers``; the chunks
+        committed before an import was interrupted are skipped.
+
+        :param stage: the collections of the stage
+        :param spools: the paths of the spool files, by collection
+        :param workers: the number of workers of the pipeline
+        :param counter: an ``itertools.count``, advanced for each
+            record imported
+        :return: generator of (partition, (collection, number, records))
+            tuples
+        """
+        def task(partition, collection, chunk):
+            n = next(numbers[collection])
+            if self._checkpoint is not None and \
+                    self._checkpoint.is_committed(collection, n):
+                return None
+            for r in chunk:
+                next(counter)
+            return partition, (collection, n, chunk)
+
+        numbers = dict((c, itertools.count()) for c in stage)
+        for collection in stage:
+            records = self.read_spool(spools[collection])
+            if collection != 'memberships':
+                for chunk in chunks(records, self.batch_size):
+                    t = task(None, collection, chunk)
+                    if t is not None:
+                        yield t
+                continue
+
+            buckets = [[] for n in range(workers)]
+            for record in records:
+                member = record.get('person_id') or (
+                    record.get('member') or {}
+                ).get('id')
+                # a stable hash, for the chunks to be the same on resume
+                n = zlib.crc32(
+                    six.text_type(member).encode('utf-8')
+                ) % workers
+                buckets[n].append(record)
+                if len(buckets[n]) >= self.batch_size:
+                    t = task(n, collection, buckets[n])
+                    buckets[n] = []
+                    if t is not None:
+                        yield t
+            for n, bucket in enumerate(buckets):
+                if bucket:
+                    t = task(n, collection, bucket)
+                    if t is not None:
+                        yield t
+
+    def process_chunk(self, task):
+        """Import a chunk of records; the function of the ``Pipeline``
+
+        The counts of the chunk are added to ``stats`` once the chunk
+        is imported, and recorded in the checkpoint together with it.
+        """
+        collection, n, records = task
+        self._chunk.counts = defaultdict(int)
+        self._chunk.number = n
+        try:
+            if collection == 'memberships':
+                self.import_memberships(records)
+            else:
+                self.import_chunk(collection, records)
+            with self._lock:
+                for key, value in self._chunk.counts.items():
+                    self.stats[collection][key] += value
+                if self._checkpoint is not None:
+                    self._checkpoint.committed(
+                        collection, n, copy.deepcopy(self.stats),
+                        self._unresolved_parents
+                    )
+        finally:
+            self._chunk.counts = None
+            self._chunk.number = None
+
+    def mark(self, collection, items, changed=(), failed=0):
+        """Record the chunk being written in the database, with the
+        counts and the ids ``created`` will add, when checkpointed;
+        called within the transaction of the chunk
+
+        :param items: list of (record, instance) tuples, created
+        :param changed: list of (record, instance) tuples, updated
+        :param failed: the number of records failing when written
+        """
+        if self._checkpoint is None:
+            return
+        counts = defaultdict(int, self._chunk.counts)
+        counts['created'] += len(items)
+        if changed:
+            counts['updated'] += len(changed)
+        if failed:
+            counts['failed'] += failed
+        self._checkpoint.mark(
+            collection, self._chunk.number, counts, [
+                (r['id'], i.pk)
+                for r, i in itertools.chain(items, changed)
+                if r.get('id') is not None
+            ],
+            unresolved=collection in self._unresolved_parents
+        )
+
+    def recover(self, checkpoint):
+        """Add the chunks recorded in the database, but missing from
+        the checkpoint, to the stats and to the ids map, and record
+        them as committed
+
+        :param checkpoint: the ``Checkpoint`` of a resumed import
+        """
+        for collection, n, counts, ids, unresolved in \
+                checkpoint.unrecorded():
+            for key, value in counts.items():
+                self.stats[collection][key] += value
+            self.id_map.set_many(collection, ids)
+            if unresolved:
+                self._unresolved_parents.add(collection)
+            checkpoint.committed(
+                collection, n, copy.deepcopy(self.stats),
+                self._unresolved_parents
+            )
+            logger.info(
+                "Chunk %s of %s committed before the interruption",
+                n, collection
+            )
+
+    #
+    # instances
+    #
+
+    def build(self, collection, data):
+        """Return the unsaved instance built out of a record
+
+        :param collection: the collection of the record
+        :param data: the record
+        :return: the instance
+        """
+        kwargs = dict(
+            (k, data[k]) for k in self.fields[collection]
+            if data.get(k) is not None
+        )
+        for key, (field, referred) in self.references[collection].items():
+            source_id = data.get(key)
+            if source_id is None:
+                continue
+            pk = self.id_map.get(referred, source_id)
+            if pk is None:
+                if referred == collection:
+                    # the parent comes later, see link_parents
+                    self._unresolved_parents.add(collection)
+                    continue
+                raise ValueError("Unknown {0} {1}".format(
+                    SINGULAR[referred], source_id
+                ))
+            kwargs[field + '_id'] = pk
+        return self.models[collection](**kwargs)
+
+    def update_area(self, area_data):
+        """Return the unsaved Area built out of an area record"""
+        area_data = dict(area_data)
+        # identifiers of areas are unique
+        if not area_data.get('identifier'):
+            area_data['identifier'] = area_data.get('id')
+        return self.build('areas', area_data)
+
+    def update_organization(self, organization_data):
+        """Return the unsaved Organization built out of
+        an organization record"""
+        return self.build('organizations', organization_data)
+
+    def update_person(self, person_data):
+        """Return the unsaved Person built out of a person record"""
+        return self.build('persons', person_data)
+
+    def update_post(self, post_data):
+        """Return the unsaved Post built out of a post record"""
+        return self.build('posts', post_data)
+
+    def update_membership(self, membership_data):
+        """Return the unsaved Membership built out of a membership record,
+        the member being either ``person_id``, or ``member``,
+        with its ``@type`` and ``id``"""
+        membership_data = dict(membership_data)
+        member = membership_data.pop('member', None) or {}
+        membership = None
+        if member.get('@type', 'Person') == 'Organization':
+            membership = self.build('memberships', membership_data)
+            membership.member_organization_id = self.id_map.get(
+                'organizations', member.get('id')
+            )
+            if membership.member_organization_id is None:
+                raise ValueError("Unknown organization {0}".format(
+                    member.get('id')
+                ))
+        elif member.get('id') is not None:
+            membership_data.setdefault('person_id', member['id'])
+        if membership is None:
+            membership = self.build('memberships', membership_data)
+        membership.allow_overlap = self.allow_overlap
+        return membership
+
+    def truncate_values(self, instance):
+        """Truncate the values too long for their fields,
+        when ``truncate`` is ``yes`` or ``warn``"""
+        if self.truncate not in ('yes', 'warn'):
+            return
+        for field in instance._meta.fields:
+            value = getattr(instance, field.attname)
+            if field.max_length and isinstance(value, six.string_types) \
+                    and len(value) > field.max_length:
+                if self.truncate == 'warn':
+                    logger.warning(
+                        "Value of %s.%s truncated to %s characters: %s",
+                        instance._meta.model_name, field.name,
+                        field.max_length, value
+                    )
+                setattr(instance, field.attname, value[:field.max_length])
+
+    #
+    # writes
+    #
+
+    def count(self, collection, key, n=1):
+        counts = getattr(self._chunk, 'counts', None)
+        if counts is not None:
+            # added to the stats by process_chunk
+            counts[key] += n
+            return
+        with self._lock:
+            self.stats[collection][key] += n
+
+    def fail(self, collection, record, error):
+        self.count(collection, 'failed')
+        logger.warning(
+            "Could not import %s %s: %s",
+            SINGULAR[collection], record.get('id'), error
+        )
+
+    def build_chunk(self, collection, records):
+        """Build the instances of a chunk of records, skipping the records
+        already imported and failing the ones that cannot be built
+
+        In a diff import, the instances of the records imported before,
+        and changed since, have the primary keys of their rows; the
+        unchanged records are skipped.
+
+        :return: list of (record, instance) tuples
+        """
+        from popolo.behaviors.models import Dateframeable
+        from popolo.models import prepare_dateframeable
+
+        imported = self.id_map.get_entries(
+            collection, [r.get('id') for r in records]
+        )
+        items = []
+        for record in records:
+            source_id = record.get('id')
+            pk = None
+            if source_id is not None and six.text_type(source_id) in imported:
+                pk, previous_hash = imported[six.text_type(source_id)]
+                if not self.diff:
+                    # imported by an interrupted import, after its last
+                    # checkpoint; repeated ids are skipped when spooling
+                    self.count(collection, 'created')
+                    continue
+                if previous_hash == self.record_hash(record):
+                    self.count(collection, 'unchanged')
+                    continue
+            try:
+                instance = getattr(
+                    self, 'update_' + SINGULAR[collection]
+                )(record)
+                instance.pk = pk
+                self.truncate_values(instance)
+                if isinstance(instance, Dateframeable):
+                    prepare_dateframeable(instance)
+            except Exception as e:
+                self.fail(collection, record, e)
+                continue
+            items.append((record, instance))
+        return items
+
+    def check_unique(self, collection, items):
+        """Fail the instances having the same values of unique fields
+        of other instances, or of existing rows, with one query
+        per unique field
+
+        :return: the valid (record, instance) tuples
+        """
+        model = self.models[collection]
+        # the rows updated by the chunk
+        pks = [i.pk for r, i in items if i.pk is not None]
+        for field in model._meta.fields:
+            if not field.unique or field.primary_key or field.name == 'slug':
+                continue
+            values = set(getattr(i, field.attname) for r, i in items)
+            existing = set(model._default_manager.filter(
+                **{'{0}__in'.format(field.attname): values}
+            ).exclude(pk__in=pks).values_list(field.attname, flat=True))
+            valid = []
+            for record, instance in items:
+                value = getattr(instance, field.attname)
+                if value in existing:
+                    self.fail(collection, record, ValueError(
+                        "{0} {1} already exists".format(field.name, value)
+                    ))
+                    continue
+                existing.add(value)
+                valid.append((record, instance))
+            items = valid
+        return items
+
+    def fill_pks(self, model, instances):
+        """Set the primary keys of instances written with ``bulk_create``,
+        on databases not returning them, through their unique slugs"""
+        missing = [i for i in instances if i.pk is None]
+        for chunk in chunks(missing, 500):
+            pks = dict(model._default_manager.filter(
+                slug__in=[i.slug for i in chunk]
+            ).values_list('slug', 'pk'))
+            for i in chunk:
+                i.pk = pks.get(i.slug)
+
+    def write(self, collection, items, write):
+        """Write a chunk of instances within a transaction, attempting
+        again on integrity errors, as when the same slug is allocated
+        to instances written concurrently by other workers
+
+        On PostgreSQL, the attempts following the first one hold an
+        exclusive lock on the collection until they are committed, while
+        first attempts share it: slugs are allocated again once the
+        chunks being written by the other workers are committed, and
+        are not raced for once more.
+
+        :param items: list of (record, instance) tuples
+        :param write: the function writing the chunk
+        :return: the result of ``write``
+        """
+        for attempt in range(1, self.write_attempts + 1):
+            try:
+                with transaction.atomic():
+                    self.lock(collection, shared=attempt == 1)
+                    return write()
+            except IntegrityError:
+                if attempt == self.write_attempts:
+                    raise
+                for record, instance in items:
+                    # allocate the slugs and keys again
+                    instance.pk = None
+                    instance.slug = ''
+
+    def lock(self, collection, shared=False):
+        """Lock the writes of a collection across the workers, until
+        the end of the current transaction; on PostgreSQL only
+
+        :param shared: whether other workers may hold the lock
+            at the same time, but for an exclusive lock
+        """
+        if connection.vendor != 'postgresql':
+            return
+        key = zlib.crc32(collection.encode('utf-8'))
+        function = 'pg_advisory_xact_lock'
+        if shared:
+            function += '_shared'
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT {0}(%s)'.format(function), [key])
+
+    def import_chunk(self, collection, records):
+        """Import a chunk of records of areas, organizations,
+        persons or posts"""
+        model = self.models[collection]
+        items = self.build_chunk(collection, records)
+
+        errors = instances_errors(i for r, i in items)
+        valid = []
+        for (record, instance), e in zip(items, errors):
+            if e:
+                self.fail(collection, record, ValidationError(e))
+            else:
+                valid.append((record, instance))
+        items = self.check_unique(collection, valid)
+        if not items:
+            return
+
+        new = [(r, i) for r, i in items if i.pk is None]
+        changed = [(r, i) for r, i in items if i.pk is not None]
+        instances = [i for r, i in new]
+
+        def write():
+            model.objects.bulk_create(instances)
+            self.fill_pks(model, instances)
+            self.update_changed(collection, changed)
+            self.import_related(collection, items)
+            self.mark(collection, new, changed)
+
+        try:
+            self.write(collection, new, write)
+        except Exception as e:
+            for record, instance in items:
+                self.fail(collection, record, e)
+            return
+        self.created(collection, new, changed)
+
+    def import_memberships(self, records):
+        """Import a chunk of records of memberships,
+        with ``Membership.objects.bulk_load``"""
+        from popolo.models import ItemOutcome, Membership
+
+        items = self.build_chunk('memberships', records)
+        new = [(r, i) for r, i in items if i.pk is None]
+
+        # changed memberships are validated as the other instances,
+        # and are not checked again for overlaps
+        changed = []
+        errors = instances_errors(i for r, i in items if i.pk is not None)
+        for (record, instance), e in zip(
+            [(r, i) for r, i in items if i.pk is not None], errors
+        ):
+            if e:
+                self.fail('memberships', record, ValidationError(e))
+            else:
+                changed.append((record, instance))
+
+        def write():
+            outcomes = Membership.objects.bulk_load([i for r, i in new])
+            created, failed = [], []
+            for (record, instance), outcome in zip(new, outcomes):
+                if outcome.status == ItemOutcome.FAILED:
+                    failed.append((record, outcome.error))
+                else:
+                    created.append((record, instance))
+            self.fill_pks(Membership, [i for r, i in created])
+            self.update_changed('memberships', changed)
+            self.import_related('memberships', created + changed)
+            self.mark('memberships', created, changed, len(failed))
+            return created, failed
+
+        try:
+            created, failed = self.write('memberships', new, write)
+        except Exception as e:
+            for record, instance in new + changed:
+                self.fail('memberships', record, e)
+            return
+        for record, error in failed:
+            self.fail('memberships', record, error)
+        self.created('memberships', created, changed)
+
+    def created(self, collection, items, changed=()):
+        self.count(collection, 'created', len(items))
+        if changed:
+            self.count(collection, 'updated', len(changed))
+        self.id_map.set_many(collection, (
+            (r['id'], i.pk, self.record_hash(r) if self.diff else None)
+            for r, i in itertools.chain(items, changed)
+            if r.get('id') is not None
+        ))
+
+    @staticmethod
+    def record_hash(record):
+        """Return the hash of a record, compared by diff imports"""
+        return hashlib.sha1(
+            json.dumps(record, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+
+    def updated_fields(self, collection):
+        """Return the names of the fields written when the changes
+        of a record are applied: the ones set out of the records,
+        the dates and their keys"""
+        names = set(self.fields[collection])
+        names.update(f for f, c in self.references[collection].values())
+        names.update((
+            'member_organization', 'start_date', 'end_date',
+            'start_key', 'end_key', 'updated_at'
+        ))
+        return [
+            f.name for f in self.models[collection]._meta.concrete_fields
+            if f.name in names
+        ]
+
+    def update_changed(self, collection, items):
+        """Write the changes of records imported before, with bulk
+        updates, replacing their identifiers, other names, contact
+        details, links and sources"""
+        if not items:
+            return
+        now = timezone.now()
+        instances = [i for r, i in items]
+        for instance in instances:
+            if hasattr(instance, 'updated_at'):
+                instance.updated_at = now
+        bulk_update(instances, self.updated_fields(collection))
+        self.delete_related(collection, [i.pk for i in instances])
+
+    def delete_related(self, collection, pks):
+        """Delete the identifiers, other names, contact details and the
+        relations to links and sources of some rows, with a query
+        for each relation"""
+        from django.contrib.contenttypes.fields import GenericRelation
+        from popolo.utils.content_types import get_content_type
+
+        model = self.models[collection]
+        content_type = get_content_type(model)
+        for field in model._meta.get_fields():
+            if not isinstance(field, GenericRelation) or field.name not in (
+                'identifiers', 'other_names', 'contact_details',
+                'links', 'sources'
+            ):
+                continue
+            field.related_model._default_manager.filter(**{
+                field.content_type_field_name: content_type,
+                '{0}__in'.format(field.object_id_field_name): pks,
+            }).delete()
+
+    def delete_missing(self, seen):
+        """Delete the rows of the records imported before, but missing
+        from the export, memberships first, and remove them from the
+        ids map
+
+        :param seen: the ``IdMap`` of the ids of the export
+        """
+        for collection in reversed(self.collections):
+            model = self.models[collection]
+            for chunk in chunks(self.id_map.items(collection), 500):
+                present = seen.get_many(collection, [s for s, pk in chunk])
+                missing = [(s, pk) for s, pk in chunk if s not in present]
+                if not missing:
+                    continue
+                with transaction.atomic():
+                    model._default_manager.filter(
+                        pk__in=[pk for s, pk in missing]
+                    ).delete()
+                self.id_map.delete_many(collection, [s for s, pk in missing])
+                self.count(collection, 'deleted', len(missing))
+
+    def link_parents(self, collection, path):
+        """Set the parents coming after their children in the export,
+        with bulk updates"""
+        model = self.models[collection]
+        records = (r for r in self.read_spool(path) if r.get('parent_id'))
+        for chunk in chunks(records, self.batch_size):
+            pks = self.id_map.get_many(collection, [r.get('id') for r in chunk])
+            parent_pks = self.id_map.get_many(
+                collection, [r['parent_id'] for r in chunk]
+            )
+            instances = []
+            for record in chunk:
+                pk = pks.get(six.text_type(record.get('id')))
+                parent_pk = parent_pks.get(six.text_type(record['parent_id']))
+                if pk is None:
+                    continue
+                if parent_pk is None:
+                    logger.warning(
+                        "Unknown parent %s of %s %s", record['parent_id'],
+                        SINGULAR[collection], record.get('id')
+                    )
+                    continue
+                instances.append(model(pk=pk, parent_id=parent_pk))
+            bulk_update(instances, ['parent'])
+
+    #
+    # related records
+    #
+
+    def import_related(self, collection, items):
+        """Import identifiers, other names, contact details, links
+        and sources of a chunk of new instances"""
+        from popolo.models import ContactDetail, Identifier, Link, Source
+
+        model = self.models[collection]
+        objects = [i for r, i in items]
+        relations = set(f.name for f in model._meta.get_fields())
+
+        def rows(key, row):
+            return [
+                [row(x) for x in r.get(key) or []] for r, i in items
+            ]
+
+        outcomes = []
+        if 'identifiers' in relations:
+            outcomes.extend(Identifier.objects.bulk_upsert_for(
+                objects, rows('identifiers', self.identifier_row)
+            ))
+        if 'other_names' in relations:
+            self.add_other_names(objects, rows('other_names', dict))
+        if 'contact_details' in relations:
+            outcomes.extend(ContactDetail.objects.bulk_add_for(
+                objects, rows('contact_details', self.contact_detail_row)
+            ))
+        if 'links' in relations:
+            outcomes.extend(Link.objects.bulk_add_for(
+                objects, rows('links', self.url_row)
+            ))
+        if 'sources' in relations:
+            outcomes.extend(Source.objects.bulk_add_for(
+                objects, rows('sources', self.url_row)
+            ))
+
+        for object_outcomes in outcomes:
+            for o in object_outcomes:
+                if o.error is not None:
+                    logger.warning(
+                        "Could not import %s of %s: %s",
+                        o.item, SINGULAR[collection], o.error
+                    )
+
+    @staticmethod
+    def identifier_row(data):
+        return dict(
+            (k, data[k]) for k in (
+                'identifier', 'scheme', 'start_date', 'end_date', 'source'
+            ) if data.get(k) is not None
+        )
+
+    @staticmethod
+    def contact_detail_row(data):
+        from popolo.models import ContactDetail
+
+        row = dict(
+            (k, data[k]) for k in ('label', 'value', 'note')
+            if data.get(k) is not None
+        )
+        contact_type = data.get('type') or ''
+        row['contact_type'] = getattr(
+            ContactDetail.CONTACT_TYPES, contact_type.lower(),
+            contact_type.upper()
+        )
+        return row
+
+    @staticmethod
+    def url_row(data):
+        return dict(
+            (k, data[k]) for k in ('url', 'note') if data.get(k) is not None
+        )
+
+    def add_other_names(self, objects, rows):
+        """Create the other names of new objects, with ``bulk_create``"""
+        from popolo.models import OtherName, prepare_dateframeable
+        from popolo.utils.content_types import get_content_type
+
+        names = []
+        for obj, obj_rows in zip(objects, rows):
+            content_type = get_content_type(obj)
+            for row in obj_rows:
+                name = OtherName(
+                    content_type=content_type, object_id=obj.pk, **dict(
+                        (k, row[k]) for k in (
+                            'name', 'note', 'start_date', 'end_date'
+                        ) if row.get(k) is not None
+                    )
+                )
+                try:
+                    prepare_dateframeable(name)
+                except Exception as e:
+                    logger.warning("Could not import %s: %s", row, e)
+                    continue
+                names.append(name)
+        OtherName.objects.bulk_create(names)
@@ -0,0 +1,163 @@
+"""Incremental readers of Popolo JSON exports.
+
+Two layouts are read, record by record, without loading the whole
+file in memory:
+
+* the Popolo JSON export, a single object whose keys are collections
+  (``persons``, ``organizations``, ``memberships``, ``posts``,
+  ``areas``), each an array of records; other keys are skipped;
+* NDJSON, a record per line, the collection being the ``_type`` key
+  of the record, in the singular form (``person``, ``organization``,
+  ...).
+
+Records are decoded one at a time with ``json.JSONDecoder.raw_decode``,
+out of a buffer refilled as needed, so that the memory footprint
+depends on the size of a record, not on the size of the file.
+"""
+import io
+import json
+
+COLLECTIONS = {
+    'area': 'areas',
+    'organization': 'organizations',
+    'person': 'persons',
+    'post': 'posts',
+    'membership': 'memberships',
+}
+
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+
+
+class PopoloJSONError(ValueError):
+    pass
+
+
+class _Buffer(object):
+    """A text buffer over a file, refilled on demand"""
+
+    def __init__(self, fp, chunk_size):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.text = u''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        if self.eof:
+            return False
+        data = self.fp.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        # drop the consumed text, so that the buffer does not grow
+        self.text = self.text[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character, or None at the end"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return None
+
+    def expect(self, chars):
+        c = self.peek()
+        if c is None or c not in chars:
+            raise PopoloJSONError(
+                "Expected one of {0!r}, found {1!r} at offset {2}".format(
+                    chars, c, self.pos
+                )
+            )
+        self.pos += 1
+        return c
+
+    def decode(self):
+        """Decode the JSON value starting at the next non-whitespace
+        character"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.text, self.pos)
+            except ValueError as e:
+                if self.fill():
+                    continue
+                raise PopoloJSONError(str(e))
+            # a value ending with the buffer (ex: a number) may be truncated
+            if end == len(self.text) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_export(fp, chunk_size=65536):
+    """Yield the records of a Popolo JSON export
+
+    :param fp: a text file, or file-like object
+    :param chunk_size: the number of characters read at once
+    :return: generator of (collection, record) tuples
+    """
+    buf = _Buffer(fp, chunk_size)
+    collections = set(COLLECTIONS.values())
+
+    buf.expect('{')
+    if buf.peek() == '}':
+        return
+    while True:
+        key = buf.decode()
+        buf.expect(':')
+        if key in collections and buf.peek() == '[':
+            buf.expect('[')
+            if buf.peek() == ']':
+                buf.expect(']')
+            else:
+                while True:
+                    yield key, buf.decode()
+                    if buf.expect(',]') == ']':
+                        break
+        else:
+            buf.decode()
+        if buf.expect(',}') == '}':
+            break
+
+
+def iter_ndjson(fp):
+    """Yield the records of a NDJSON file
+
+    :param fp: a text file, or file-like object
+    :return: generator of (collection, record) tuples
+    """
+    for n, line in enumerate(fp, 1):
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        collection = COLLECTIONS.get(record.pop('_type', None))
+        if collection is None:
+            raise PopoloJSONError(
+                "Unknown or missing _type at line {0}".format(n)
+            )
+        yield collection, record
+
+
+def iter_records(filename, format=None):
+    """Yield the records of a Popolo JSON export, or NDJSON file
+
+    :param filename: the path of the file
+    :param format: ``json`` or ``ndjson``; by default NDJSON is
+        expected for the ``.ndjson`` and ``.jsonl`` extensions
+    :return: generator of (collection, record) tuples
+    """
+    if format is None:
+        format = 'ndjson' if filename.endswith(NDJSON_EXTENSIONS) else 'json'
+    with io.open(filename, encoding='utf-8') as fp:
+        if format == 'ndjson':
+            for item in iter_ndjson(fp):
+                yield item
+        else:
+            for item in iter_export(fp):
+                yield item
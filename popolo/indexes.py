@@ -0,0 +1,158 @@
+"""In-process indexes of the validity intervals of Dateframeable models.
+
+An index is built lazily, on first usage, out of the ``start_key``
+and ``end_key`` values of all the rows of a model, and is kept
+up to date through the ``post_save`` and ``post_delete`` signals,
+once the transactions of the changes are committed, so that rows
+rolled back are never indexed::
+
+    from popolo.indexes import get_index
+
+    idx = get_index(Membership)
+    idx.active_at('2015-04-23')
+    > [12, 14, 231]
+    idx.overlapping('2015', '2016-06')
+    > [12, 14, 231, 304]
+
+The answers are the same as those of the ``current`` queryset method,
+and of a range query on dates, but are computed in O(log n + k), without
+hitting the database.
+
+``bulk_create`` and ``update`` on the querysets of Dateframeable models
+invalidate the index of the model, as they do not emit signals
+(see ``DateframeableQuerySet``); ``invalidate_index`` must be called
+explicitly after other changes, as raw SQL.
+"""
+import threading
+from datetime import datetime
+
+from django.db.models.signals import post_save, post_delete
+
+from popolo.utils import PartialDate
+from popolo.utils.bulk import on_commit
+from popolo.utils.intervals import IntervalIndex, start_key, end_key
+
+
+class DateframeableIndex(object):
+    """The interval index of the rows of a Dateframeable model
+    """
+
+    def __init__(self, model):
+        """Initialize the index and connect it to the model's signals
+
+        :param model: a Dateframeable model class
+        """
+        self.model = model
+        self._index = None
+        self._lock = threading.RLock()
+
+        uid = 'popolo_dateframeable_index_{0}'.format(model._meta.label_lower)
+        post_save.connect(
+            self._post_save, sender=model, weak=False, dispatch_uid=uid
+        )
+        post_delete.connect(
+            self._post_delete, sender=model, weak=False, dispatch_uid=uid
+        )
+
+    def build(self):
+        """Build the index, reading the date keys of all rows
+
+        :return: the IntervalIndex instance
+        """
+        rows = self.model._default_manager.values_list(
+            'pk', 'start_key', 'end_key'
+        ).iterator()
+        with self._lock:
+            self._index = IntervalIndex(rows)
+            return self._index
+
+    def invalidate(self):
+        """Drop the index, that is going to be rebuilt on next usage"""
+        with self._lock:
+            self._index = None
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                return self.build()
+            return self._index
+
+    def active_at(self, moment=None):
+        """Return the ids of the rows active at the given moment
+        (see ``DateframeableQuerySet.current``)
+
+        :param moment: a date in '%Y-%m-%d' format, now if not specified
+        :return: list of ids
+        """
+        if moment is None:
+            moment = datetime.strftime(datetime.now(), '%Y-%m-%d')
+        with self._lock:
+            return self.index.stab(PartialDate.of(moment).key)
+
+    def overlapping(self, start_date=None, end_date=None):
+        """Return the ids of the rows whose validity overlaps
+        the given dates interval, touching intervals included
+
+        :param start_date: the start of the interval, null for -inf
+        :param end_date: the end of the interval, null for +inf
+        :return: list of ids
+        """
+        with self._lock:
+            return self.index.overlapping(
+                start_key(start_date), end_key(end_date)
+            )
+
+    def _add(self, pk, start, end):
+        with self._lock:
+            if self._index is not None:
+                self._index.add(pk, start, end)
+
+    def _remove(self, pk):
+        with self._lock:
+            if self._index is not None:
+                self._index.remove(pk)
+
+    def _post_save(self, sender, instance, using='default', **kwargs):
+        pk, start, end = instance.pk, instance.start_key, instance.end_key
+        on_commit(lambda: self._add(pk, start, end), using=using)
+
+    def _post_delete(self, sender, instance, using='default', **kwargs):
+        pk = instance.pk
+        on_commit(lambda: self._remove(pk), using=using)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(model):
+    """Return the interval index of a Dateframeable model,
+    creating it on first call
+
+    :param model: a Dateframeable model class
+    :return: a DateframeableIndex instance
+    """
+    with _indexes_lock:
+        try:
+            return _indexes[model]
+        except KeyError:
+            idx = _indexes[model] = DateframeableIndex(model)
+            return idx
+
+
+def invalidate_index(model, using='default'):
+    """Invalidate the interval index of a model, if it was created,
+    after changes that do not emit signals, such as ``bulk_create``,
+    once the current transaction is committed
+
+    :param model: a Dateframeable model class
+    :param using: the database alias of the changes
+    """
+    def invalidate():
+        with _indexes_lock:
+            idx = _indexes.get(model)
+        if idx is not None:
+            idx.invalidate()
+
+    on_commit(invalidate, using=using)
@@ -8,6 +8,11 @@ from popolo.importers.popolo_json import PopoloJSONImporter
 
 
 class Command(PopoloJSONImporter, BaseCommand):
+    help = "Import a Popolo JSON, or NDJSON, export. Records are not " \
+           "matched to existing rows, so the tables must be empty, " \
+           "unless the import continues previous ones (--diff with an " \
+           "existing ids map, --resume), or --append is given"
+
     def __init__(self, *args, **kwargs):
         # django-popolo has restricted lengths for various fields,
         # whereas PopIt has no such aritrary limits; so, for the
@@ -20,6 +25,42 @@ class Command(PopoloJSONImporter, BaseCommand):
     # https://docs.djangoproject.com/en/1.8/howto/custom-management-commands/
     def add_arguments(self, parser):
         parser.add_argument('args', nargs='+')
+        parser.add_argument(
+            '--format', choices=('json', 'ndjson'),
+            help="The format of the export, by default NDJSON for the "
+                 ".ndjson and .jsonl extensions, Popolo JSON otherwise"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="The number of records written at once"
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help="The number of threads importing the records of "
+                 "a stage concurrently; a single one is used on SQLite"
+        )
+        parser.add_argument(
+            '--checkpoint', metavar='DIR',
+            help="A directory where the progress of the import is "
+                 "recorded, to resume it if interrupted"
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help="Continue the import recorded in the --checkpoint "
+                 "directory, skipping the records already imported"
+        )
+        parser.add_argument(
+            '--diff', metavar='FILE',
+            help="The ids map of the previous imports, with the hashes "
+                 "of their records: only new and changed records are "
+                 "written, and the ones missing from the export deleted"
+        )
+
+        parser.add_argument(
+            '--append', action='store_true',
+            help="Import into tables already having rows, creating "
+                 "new rows for all the records"
+        )
 
     def handle(self, *args, **options):
 
@@ -29,7 +70,39 @@ class Command(PopoloJSONImporter, BaseCommand):
 
         popit_export_filename = args[0]
 
-        self.import_from_export_json(popit_export_filename)
+        if options['resume'] and not options['checkpoint']:
+            raise CommandError("--resume requires a --checkpoint directory")
+
+        self.batch_size = options['batch_size']
+        self.workers = options['workers']
+        self.checkpoint = options['checkpoint']
+        self.resume = options['resume']
+        self.diff = options['diff']
+        self.append = options['append']
+        try:
+            stats = self.import_from_export_json(
+                popit_export_filename, format=options['format']
+            )
+        except ValueError as e:
+            raise CommandError(e)
+        for collection, counts in stats.items():
+            self.stdout.write("{0}: {1}".format(collection, ", ".join(
+                "{0} {1}".format(v, k) for k, v in counts.items()
+            )))
+        if self.diff:
+            self.stdout.write(
+                "total: {0} inserted, {1} updated, {2} deleted".format(*[
+                    sum(counts[k] for counts in stats.values())
+                    for k in ('created', 'updated', 'deleted')
+                ])
+            )
+        for stage, (records, seconds) in self.timings.items():
+            self.stdout.write(
+                "stage {0}: {1} records in {2:.2f}s "
+                "({3:.0f} records/s)".format(
+                    stage, records, seconds, records / max(seconds, 1e-6)
+                )
+            )
 
     # ------------------------------------------------------------------------
     # This overridden method deals with an awkward incompatability
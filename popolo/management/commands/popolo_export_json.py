@@ -0,0 +1,47 @@
+from __future__ import print_function
+
+from django.core.management.base import BaseCommand
+
+from popolo.exporters.popolo_json import PopoloJSONExporter
+
+
+class Command(BaseCommand):
+    help = "Export areas, organizations, persons, posts and memberships " \
+           "as Popolo JSON, or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'filename',
+            help="The path of the export, or - for the standard output"
+        )
+        parser.add_argument(
+            '--format', choices=('json', 'ndjson'),
+            help="The format of the export, by default NDJSON for the "
+                 ".ndjson and .jsonl extensions, Popolo JSON otherwise"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="The number of instances read at once"
+        )
+        parser.add_argument(
+            '--collections', nargs='+',
+            choices=PopoloJSONExporter.collections,
+            help="The collections to be exported, by default all of them"
+        )
+
+    def handle(self, *args, **options):
+        exporter = PopoloJSONExporter(batch_size=options['batch_size'])
+        if options['filename'] == '-':
+            # records are written with their own line endings
+            self.stdout.ending = ''
+            exporter.export(
+                self.stdout, options['format'] or 'json',
+                options['collections']
+            )
+        else:
+            counts = exporter.export_to_file(
+                options['filename'], options['format'],
+                options['collections']
+            )
+            for collection, n in counts.items():
+                self.stdout.write("{0}: {1} exported".format(collection, n))
@@ -0,0 +1,39 @@
+from __future__ import print_function
+
+from django.core.management.base import BaseCommand, CommandError
+
+from popolo.exporters.snapshot import SnapshotExporter
+
+
+class Command(BaseCommand):
+    help = "Export flat tables of memberships, ownerships, electoral " \
+           "results and areas, as Parquet or CSV files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directory', help="The directory of the files"
+        )
+        parser.add_argument(
+            '--format', choices=('parquet', 'csv'),
+            help="The format of the files, by default Parquet when "
+                 "pyarrow is installed, CSV otherwise"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help="The number of rows written at once"
+        )
+        parser.add_argument(
+            '--tables', nargs='+', choices=list(SnapshotExporter.tables),
+            help="The tables to be exported, by default all of them"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            exporter = SnapshotExporter(
+                batch_size=options['batch_size'], format=options['format']
+            )
+        except ImportError as e:
+            raise CommandError(e)
+        files = exporter.export(options['directory'], options['tables'])
+        for table, (path, n) in files.items():
+            self.stdout.write("{0}: {1} rows in {2}".format(table, n, path))
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 06:33
+from __future__ import unicode_literals
+
+from datetime import datetime
+
+from django.db import migrations, models
+
+DATEFRAMEABLE_MODELS = (
+    'Area', 'AreaRelationship', 'Classification', 'ClassificationRel',
+    'ContactDetail', 'ElectoralEvent', 'Identifier', 'Membership',
+    'Organization', 'OtherName', 'Ownership', 'Person',
+    'PersonalRelationship', 'Post',
+)
+
+
+def date_key(date_string):
+    """Return the sort key of a partial date, or None if invalid
+
+    The key is the proleptic Gregorian ordinal of the first day of the
+    date, shifted left by two bits, combined with its precision: 0 for
+    years, 1 for months, 2 for days. It is computed as
+    ``PartialDate.key`` was when this migration was written, and is
+    copied here, so that the migration does not change with the
+    application code.
+    """
+    for fmt, precision in (
+        ('%Y-%m-%d', 2),
+        ('%Y-%m', 1),
+        ('%Y', 0),
+    ):
+        try:
+            ordinal = datetime.strptime(date_string, fmt).toordinal()
+        except ValueError:
+            continue
+        return ordinal << 2 | precision
+    return None
+
+
+def fill_date_keys(apps, schema_editor):
+    """Compute the date keys of existing rows.
+
+    Rows with null dates already hold the default sentinel keys;
+    the others are updated with a query for each distinct date,
+    rows with invalid dates are left with the sentinels.
+    """
+    for model_name in DATEFRAMEABLE_MODELS:
+        model = apps.get_model('popolo', model_name)
+        for date_field, key_field in (
+            ('start_date', 'start_key'),
+            ('end_date', 'end_key'),
+        ):
+            dates = model.objects.exclude(
+                **{'{0}__isnull'.format(date_field): True}
+            ).exclude(
+                **{date_field: ''}
+            ).values_list(date_field, flat=True).distinct()
+            for d in list(dates):
+                key = date_key(d)
+                if key is None:
+                    continue
+                model.objects.filter(**{date_field: d}).update(
+                    **{key_field: key}
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('popolo', '0004_auto_20180406_1942'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='area',
+            name='end_key',
+            field=models.IntegerField(db_index=True, default=14608240, editable=False, help_text='The sortable key of the end date, used in queries', verbose_name='end key'),
+        ),
+        migrations.AddField(
+            model_name='area',
+            name='start_key',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The sortable key of the start date, used in queries', verbose_name='start key'),
+        ),
+        migrations.AddField(
+            model_name='arearelationship',
+            name='end_key',
+            field=models.IntegerField(db_index=True, default=14608240, editable=False, help_text='The sortable key of the end date, used in queries', verbose_name='end key'),
+        ),
+        migrations.AddField(
+            model_name='arearelationship',
+            name='start_key',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The sortable key of the start date, used in queries', verbose_name='start key'),
+        ),
+        migrations.AddField(
+            model_name='classification',
+            name='end_key',
+            field=models.IntegerField(db_index=True, default=14608240, editable=False, help_text='The sortable key of the end date, used in queries', verbose_name='end key'),
+        ),
+        migrations.AddField(
+            model_name='classification',
+            name='start_key',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The sortable key of the start date, used in queries', verbose_name='start key'),
+        ),
+        migrations.AddField(
+            model_name='classificationrel',
+            name='end_key',
+            field=models.IntegerField(db_index=True, default=14608240, editable=False, help_text='The sortable key of the end date, used in queries', verbose_name='end key'),
+        ),
+        migrations.AddField(
+            model_name='classificationrel',
+            name='start_key',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The sortable key of the start date, used in queries', verbose_name='start key'),
+        ),
+        migrations.AddField(
+            model_name='contactdetail',
+            name='end_key',
+            field=models.IntegerField(db_index=True, default=14608240, editable=False, help_text='The sortable key of the end date, used in queries', verbose_name='end key'),
+        ),
+        migrations.AddField(
+            model_name='contactdetail',
+            name='start_key',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The sortable key of the start date, used in queries', verbose_name='start key'),
+        ),
+        migrations.AddField(
+            model_name='electoralevent',
+            name='end_key',
+            field=models.IntegerField(db_index=True, default=14608240, editable=False, help_text='The sortable key of the end date, used in queries', verbose_name='end key'),
+        ),
+        migrations.AddField(
+            model_name='electoralevent',
+            name='start_key',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The sortable key of the start date, used in queries', verbose_name='start key'),
+        ),
+        migrations.AddField(
+            model_name='identifier',
+            name='end_key',
+            field=models.IntegerField(db_index=True, default=14608240, editable=False, help_text='The sortable key of the end date, used in queries', verbose_name='end key'),
+        ),
+        migrations.AddField(
+            model_name='identifier',
+            name='start_key',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The sortable key of the start date, used in queries', verbose_name='start key'),
+        ),
+        migrations.AddField(
+            model_name='membership',
+            name='end_key',
+            field=models.IntegerField(db_index=True, default=14608240, editable=False, help_text='The sortable key of the end date, used in queries', verbose_name='end key'),
+        ),
+        migrations.AddField(
+            model_name='membership',
+            name='start_key',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The sortable key of the start date, used in queries', verbose_name='start key'),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='end_key',
+            field=models.IntegerField(db_index=True, default=14608240, editable=False, help_text='The sortable key of the end date, used in queries', verbose_name='end key'),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='start_key',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The sortable key of the start date, used in queries', verbose_name='start key'),
+        ),
+        migrations.AddField(
+            model_name='othername',
+            name='end_key',
+            field=models.IntegerField(db_index=True, default=14608240, editable=False, help_text='The sortable key of the end date, used in queries', verbose_name='end key'),
+        ),
+        migrations.AddField(
+            model_name='othername',
+            name='start_key',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The sortable key of the start date, used in queries', verbose_name='start key'),
+        ),
+        migrations.AddField(
+            model_name='ownership',
+            name='end_key',
+            field=models.IntegerField(db_index=True, default=14608240, editable=False, help_text='The sortable key of the end date, used in queries', verbose_name='end key'),
+        ),
+        migrations.AddField(
+            model_name='ownership',
+            name='start_key',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The sortable key of the start date, used in queries', verbose_name='start key'),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='end_key',
+            field=models.IntegerField(db_index=True, default=14608240, editable=False, help_text='The sortable key of the end date, used in queries', verbose_name='end key'),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='start_key',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The sortable key of the start date, used in queries', verbose_name='start key'),
+        ),
+        migrations.AddField(
+            model_name='personalrelationship',
+            name='end_key',
+            field=models.IntegerField(db_index=True, default=14608240, editable=False, help_text='The sortable key of the end date, used in queries', verbose_name='end key'),
+        ),
+        migrations.AddField(
+            model_name='personalrelationship',
+            name='start_key',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The sortable key of the start date, used in queries', verbose_name='start key'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='end_key',
+            field=models.IntegerField(db_index=True, default=14608240, editable=False, help_text='The sortable key of the end date, used in queries', verbose_name='end key'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='start_key',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The sortable key of the start date, used in queries', verbose_name='start key'),
+        ),
+        migrations.RunPython(fill_date_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 06:34
+from __future__ import unicode_literals
+
+import django.core.validators
+from django.db import migrations, models
+import popolo.behaviors.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('popolo', '0005_dateframeable_date_keys'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='area',
+            name='end_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item ends', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='area',
+            name='start_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item starts', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='start date'),
+        ),
+        migrations.AlterField(
+            model_name='arearelationship',
+            name='end_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item ends', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='arearelationship',
+            name='start_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item starts', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='start date'),
+        ),
+        migrations.AlterField(
+            model_name='classification',
+            name='end_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item ends', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='classification',
+            name='start_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item starts', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='start date'),
+        ),
+        migrations.AlterField(
+            model_name='classificationrel',
+            name='end_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item ends', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='classificationrel',
+            name='start_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item starts', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='start date'),
+        ),
+        migrations.AlterField(
+            model_name='contactdetail',
+            name='end_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item ends', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='contactdetail',
+            name='start_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item starts', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='start date'),
+        ),
+        migrations.AlterField(
+            model_name='electoralevent',
+            name='end_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item ends', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='electoralevent',
+            name='start_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item starts', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='start date'),
+        ),
+        migrations.AlterField(
+            model_name='identifier',
+            name='end_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item ends', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='identifier',
+            name='start_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item starts', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='start date'),
+        ),
+        migrations.AlterField(
+            model_name='membership',
+            name='end_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item ends', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='membership',
+            name='start_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item starts', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='start date'),
+        ),
+        migrations.AlterField(
+            model_name='organization',
+            name='end_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item ends', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='organization',
+            name='start_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item starts', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='start date'),
+        ),
+        migrations.AlterField(
+            model_name='othername',
+            name='end_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item ends', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='othername',
+            name='start_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item starts', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='start date'),
+        ),
+        migrations.AlterField(
+            model_name='ownership',
+            name='end_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item ends', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='ownership',
+            name='start_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item starts', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='start date'),
+        ),
+        migrations.AlterField(
+            model_name='person',
+            name='end_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item ends', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='person',
+            name='start_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item starts', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='start date'),
+        ),
+        migrations.AlterField(
+            model_name='personalrelationship',
+            name='end_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item ends', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='personalrelationship',
+            name='start_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item starts', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='start date'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='end_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item ends', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='start_date',
+            field=models.CharField(blank=True, db_index=True, help_text='The date when the validity of the item starts', max_length=10, null=True, validators=[django.core.validators.RegexValidator(message='Date has wrong format', regex='^[0-9]{4}(-[0-9]{2}){0,2}$'), popolo.behaviors.models.validate_partial_date], verbose_name='start date'),
+        ),
+        migrations.AlterIndexTogether(
+            name='arearelationship',
+            index_together=set([('source_area', 'classification')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='identifier',
+            index_together=set([('content_type', 'object_id', 'scheme')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='membership',
+            index_together=set([('organization', 'post', 'person', 'start_date')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='othername',
+            index_together=set([('content_type', 'object_id', 'othername_type')]),
+        ),
+    ]
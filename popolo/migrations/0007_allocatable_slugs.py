@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 06:49
+from __future__ import unicode_literals
+
+from django.db import migrations
+import django.utils.text
+import popolo.behaviors.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('popolo', '0006_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='area',
+            name='slug',
+            field=popolo.behaviors.models.AllocatableAutoSlugField(editable=False, max_length=255, populate_from=popolo.behaviors.models.get_slug_source, slugify=django.utils.text.slugify, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='electoralevent',
+            name='slug',
+            field=popolo.behaviors.models.AllocatableAutoSlugField(editable=False, max_length=255, populate_from=popolo.behaviors.models.get_slug_source, slugify=django.utils.text.slugify, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='electoralresult',
+            name='slug',
+            field=popolo.behaviors.models.AllocatableAutoSlugField(editable=False, max_length=255, populate_from=popolo.behaviors.models.get_slug_source, slugify=django.utils.text.slugify, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='membership',
+            name='slug',
+            field=popolo.behaviors.models.AllocatableAutoSlugField(editable=False, max_length=255, populate_from=popolo.behaviors.models.get_slug_source, slugify=django.utils.text.slugify, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='organization',
+            name='slug',
+            field=popolo.behaviors.models.AllocatableAutoSlugField(editable=False, max_length=255, populate_from=popolo.behaviors.models.get_slug_source, slugify=django.utils.text.slugify, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='ownership',
+            name='slug',
+            field=popolo.behaviors.models.AllocatableAutoSlugField(editable=False, max_length=255, populate_from=popolo.behaviors.models.get_slug_source, slugify=django.utils.text.slugify, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='person',
+            name='slug',
+            field=popolo.behaviors.models.AllocatableAutoSlugField(editable=False, max_length=255, populate_from=popolo.behaviors.models.get_slug_source, slugify=django.utils.text.slugify, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='slug',
+            field=popolo.behaviors.models.AllocatableAutoSlugField(editable=False, max_length=255, populate_from=popolo.behaviors.models.get_slug_source, slugify=django.utils.text.slugify, unique=True),
+        ),
+    ]
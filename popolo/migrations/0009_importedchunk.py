@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 07:58
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('popolo', '0008_drop_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checkpoint', models.CharField(help_text='The token of the checkpoint of the import', max_length=32, verbose_name='checkpoint')),
+                ('collection', models.CharField(help_text='The collection of the records, ex: persons', max_length=32, verbose_name='collection')),
+                ('number', models.PositiveIntegerField(help_text='The number of the chunk in its collection', verbose_name='number')),
+                ('counts', models.TextField(help_text='The counts of the chunk added to the stats, as JSON', verbose_name='counts')),
+                ('ids', models.TextField(help_text='The source ids and primary keys of the records, as JSON', verbose_name='ids')),
+                ('unresolved', models.BooleanField(default=False, help_text='Whether parents of the records were not resolved', verbose_name='unresolved')),
+            ],
+            options={
+                'verbose_name': 'Imported chunk',
+                'verbose_name_plural': 'Imported chunks',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='importedchunk',
+            unique_together=set([('checkpoint', 'collection', 'number')]),
+        ),
+    ]
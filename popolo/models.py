@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
+from collections import namedtuple, OrderedDict
 from datetime import datetime
 
 from django.contrib.contenttypes.models import ContentType
 from django.db.models import Q
-from popolo.utils import PartialDatesInterval, PartialDate
+from popolo.utils import PartialDatesInterval, PartialDate, LRUCache
 
+from popolo.utils.bulk import bulk_update
 from popolo.validators import validate_percentage
+from popolo.validation import defer
 
 try:
     from django.contrib.contenttypes.fields import GenericRelation, \
@@ -24,11 +27,12 @@ except ImportError:
     pass
 
 from django.core.validators import RegexValidator
-from django.db import models, IntegrityError, transaction
+from django.db import models, DatabaseError, IntegrityError, transaction, \
+    connection
 from model_utils import Choices
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 
 from popolo.behaviors.models import (
@@ -41,7 +45,8 @@ from popolo.querysets import (
     OrganizationQuerySet, PersonQuerySet,
     PersonalRelationshipQuerySet, ElectoralEventQuerySet,
     ElectoralResultQuerySet, AreaQuerySet, IdentifierQuerySet,
-    AreaRelationshipQuerySet, ClassificationQuerySet)
+    AreaRelationshipQuerySet, ClassificationQuerySet,
+    SourceQuerySet, LinkQuerySet)
 
 
 class ContactDetailsShortcutsMixin(object):
@@ -54,8 +59,270 @@ class ContactDetailsShortcutsMixin(object):
         return c
 
     def add_contact_details(self, contacts):
-        for c in contacts:
-            self.add_contact_detail(**c)
+        """add contact details, skip those that generate exceptions
+
+        The values of the existing contact details are fetched once,
+        and the new contact details are created in bulk,
+        with ``ContactDetail.objects.bulk_add_for``.
+        Exceptions are gathered in a pipe-separated array and returned.
+
+        :param contacts: list of dicts with ``add_contact_detail`` arguments
+        :return:
+        """
+        exceptions = [
+            str(o.error)
+            for o in ContactDetail.objects.bulk_add_for([self], [contacts])[0]
+            if o.status == ItemOutcome.FAILED
+        ]
+
+        if len(exceptions):
+            raise Exception(' | '.join(exceptions))
+
+
+class BulkResolver(object):
+    """Base class resolving in memory the addition of dateframeable items
+    to an object, with the rules of the shortcut methods, and writing
+    the results with bulk queries.
+
+    Existing items are passed to the constructor, so that they can be
+    fetched once, and are grouped by ``group_field``; new items are built
+    by the ``factory`` callable, out of the item keyword arguments.
+
+    Items to create and to update are accumulated, until ``write``
+    is called.
+
+    Items are written with bulk queries; when these fail, as for an
+    integrity error or a value too long, they are saved one at a time,
+    so that only the failing items are lost, as with the shortcut
+    methods.
+    """
+
+    #: the field grouping the items compared to each other
+    group_field = None
+
+    #: the fields that can be changed by the resolution
+    fields = ()
+
+    def __init__(self, instances, factory):
+        """Initialize the resolver
+
+        :param instances: the existing items of the object
+        :param factory: callable returning a new, unsaved, item
+            out of keyword arguments
+        """
+        self.factory = factory
+        self.groups = {}
+        for i in sorted(instances, key=lambda x: x.pk):
+            self.groups.setdefault(
+                getattr(i, self.group_field), []
+            ).append(i)
+        self.created = []
+        self.updated = OrderedDict()
+
+    def _save(self, i, **values):
+        """Change the values of the item in memory, performing
+        the checks done when saving it, and restoring the previous values
+        if a check fails"""
+        previous = dict((k, getattr(i, k)) for k in self.fields)
+        for k, v in values.items():
+            setattr(i, k, v)
+        try:
+            prepare_dateframeable(i)
+        except Exception:
+            for k, v in previous.items():
+                setattr(i, k, v)
+            raise
+        if i.pk is not None:
+            self.updated[i.pk] = i
+
+    def _create(self, group, kwargs):
+        kwargs = dict(kwargs)
+        kwargs[self.group_field] = group
+        i = self.factory(**kwargs)
+        prepare_dateframeable(i)
+        self.created.append(i)
+        self.groups.setdefault(group, []).append(i)
+        return i
+
+    def _add(self, **item):
+        raise NotImplementedError
+
+    def add(self, item):
+        """Resolve the addition of an item
+
+        :param item: dict with the shortcut method arguments
+        :return: an ItemOutcome instance
+        """
+        try:
+            status, instance = self._add(**item)
+        except Exception as e:
+            return ItemOutcome(item, ItemOutcome.FAILED, None, e)
+        return ItemOutcome(item, status, instance, None)
+
+    def write(self, batch_size=None):
+        """Insert the new items and update the changed ones,
+        within a transaction
+
+        :param batch_size: the maximum number of rows written by a query
+        :return: the exceptions of the items that could not be written
+            (see ``write_all``)
+        """
+        return self.write_all([self], batch_size=batch_size)
+
+    @classmethod
+    def write_all(cls, resolvers, batch_size=None):
+        """Write the items of many resolvers, within a transaction
+
+        When the bulk queries fail, the items are saved one at a time
+        instead, each within a savepoint.
+
+        :param resolvers: resolvers of this class
+        :param batch_size: the maximum number of rows written by a query
+        :return: dict of the exceptions of the items that could not
+            be written, by ``id`` of their instances
+        """
+        created = []
+        updated = []
+        for r in resolvers:
+            created.extend(r.created)
+            updated.extend(r.updated.values())
+        errors = {}
+        try:
+            with transaction.atomic():
+                if created:
+                    type(created[0]).objects.bulk_create(
+                        created, batch_size=batch_size
+                    )
+                if updated:
+                    bulk_update(updated, cls.fields, batch_size=batch_size)
+        except DatabaseError:
+            for i in created:
+                # primary keys set by the rolled back bulk_create
+                i.pk = None
+            for i in created + updated:
+                try:
+                    with transaction.atomic():
+                        i.save()
+                except Exception as e:
+                    errors[id(i)] = e
+        for r in resolvers:
+            r.created = []
+            r.updated = OrderedDict()
+        return errors
+
+    @staticmethod
+    def failed(outcomes, errors):
+        """Mark as failed the outcomes of the items whose instances
+        could not be written
+
+        :param outcomes: list of ItemOutcome
+        :param errors: the exceptions returned by ``write_all``
+        :return: list of ItemOutcome
+        """
+        return [
+            ItemOutcome(
+                o.item, ItemOutcome.FAILED, None, errors[id(o.instance)]
+            ) if id(o.instance) in errors else o
+            for o in outcomes
+        ]
+
+
+class OtherNamesResolver(BulkResolver):
+    """Resolve the addition of other names to an object,
+    with the rules of ``OtherNamesShortcutsMixin.add_other_name``
+    """
+    group_field = 'othername_type'
+    fields = (
+        'name', 'note', 'source', 'start_date', 'end_date',
+        'start_key', 'end_key'
+    )
+
+    @staticmethod
+    def _by_end_date_desc(names):
+        """Sort names as ``order_by('-end_date')`` does in the database"""
+        dated = sorted(
+            [n for n in names if n.end_date is not None],
+            key=lambda n: n.end_date, reverse=True
+        )
+        undated = [n for n in names if n.end_date is None]
+        if connection.features.nulls_order_largest:
+            return undated + dated
+        return dated + undated
+
+    def _add(
+        self, name, othername_type='ALT',
+        overwrite_overlapping=False,
+        extend_overlapping=True,
+        **kwargs
+    ):
+        kwargs['name'] = name
+
+        if 'start_date' not in kwargs and 'end_date' not in kwargs:
+            return ItemOutcome.CREATED, self._create(othername_type, kwargs)
+
+        new_int = PartialDatesInterval(
+            start=kwargs.get('start_date', None),
+            end=kwargs.get('end_date', None)
+        )
+
+        for n in self._by_end_date_desc(self.groups.get(othername_type, [])):
+            n_int = PartialDatesInterval(
+                start=n.start_date,
+                end=n.end_date
+            )
+            overlap = PartialDate.intervals_overlap(new_int, n_int)
+            if overlap < 0:
+                continue
+
+            if n.name != name:
+                if overlap > 0:
+                    if overwrite_overlapping:
+                        values = dict(
+                            (k, v) for k, v in kwargs.items()
+                            if k in ('note', 'source')
+                        )
+                        values.update(
+                            name=name,
+                            start_date=kwargs.get('start_date', None),
+                            end_date=kwargs.get('end_date', None)
+                        )
+                        self._save(n, **values)
+                        return ItemOutcome.OVERWRITTEN, n
+                    else:
+                        raise OverlappingIntervalError(
+                            n,
+                            "Name could not be created, "
+                            "due to overlapping dates ({0} : {1})".format(
+                                new_int, n_int
+                            )
+                        )
+            else:
+                if extend_overlapping:
+                    if new_int.start.date is None or \
+                       n_int.start.date is None:
+                        start_date = None
+                    else:
+                        start_date = min(n.start_date, new_int.start.date)
+
+                    if new_int.end.date is None or \
+                       n_int.end.date is None:
+                        end_date = None
+                    else:
+                        end_date = max(n.end_date, new_int.end.date)
+
+                    self._save(n, start_date=start_date, end_date=end_date)
+                    return ItemOutcome.EXTENDED, n
+                else:
+                    raise OverlappingIntervalError(
+                        n,
+                        "Name could not be created, "
+                        "due to overlapping dates ({0} : {1})".format(
+                            new_int, n_int
+                        )
+                    )
+
+        return ItemOutcome.CREATED, self._create(othername_type, kwargs)
+
 
 class OtherNamesShortcutsMixin(object):
 
@@ -217,6 +484,142 @@ class OtherNamesShortcutsMixin(object):
         for n in names:
             self.add_other_name(**n)
 
+    def bulk_add_other_names(self, names):
+        """add other names, with the rules of ``add_other_name``,
+        fetching the existing names with a single query,
+        and writing the changes in a single transaction
+
+        Names are grouped by ``othername_type`` and resolved in order,
+        each one seeing the effects of the previous ones; names that
+        generate exceptions are skipped.
+
+        Overwriting an overlapping name replaces its value, dates,
+        and ``note`` and ``source``, when given.
+
+        When the bulk writes fail, names are saved one at a time, and
+        the ones failing to be written are reported as failed.
+
+        :param names: list of dicts with ``add_other_name`` arguments
+        :return: list of ItemOutcome, one for each name
+        """
+        resolver = OtherNamesResolver(
+            self.other_names.all(),
+            lambda **kwargs: OtherName(content_object=self, **kwargs)
+        )
+        outcomes = [resolver.add(n) for n in names]
+        return resolver.failed(outcomes, resolver.write())
+
+
+class IdentifiersResolver(BulkResolver):
+    """Resolve the addition of identifiers to an object,
+    with the rules of ``IdentifierShortcutsMixin.add_identifier``
+    """
+    group_field = 'scheme'
+    fields = (
+        'identifier', 'source', 'start_date', 'end_date',
+        'start_key', 'end_key'
+    )
+
+    def _add(
+        self, identifier, scheme,
+        overwrite_overlapping=False,
+        merge_overlapping=False,
+        extend_overlapping=True,
+        same_scheme_values_criterion=False,
+        **kwargs
+    ):
+        kwargs['identifier'] = identifier
+
+        same_scheme_identifiers = self.groups.get(scheme, [])
+        if not same_scheme_identifiers:
+            return ItemOutcome.CREATED, self._create(scheme, kwargs)
+
+        new_int = PartialDatesInterval(
+            start=kwargs.get('start_date', None),
+            end=kwargs.get('end_date', None)
+        )
+
+        status, instance = None, None
+        for i in list(same_scheme_identifiers):
+            i_int = PartialDatesInterval(
+                start=i.start_date,
+                end=i.end_date
+            )
+            overlap = PartialDate.intervals_overlap(new_int, i_int)
+            if overlap < 0:
+                continue
+
+            if i.identifier != identifier:
+                if not same_scheme_values_criterion and overlap > 0:
+                    if overwrite_overlapping:
+                        self._save(
+                            i,
+                            start_date=kwargs['start_date'],
+                            end_date=kwargs['end_date'],
+                            identifier=kwargs['identifier'],
+                            source=kwargs['source']
+                        )
+                        return ItemOutcome.OVERWRITTEN, i
+                    else:
+                        raise OverlappingIntervalError(
+                            i,
+                            "Identifier could not be created, "
+                            "due to overlapping dates ({0} : {1})".format(
+                                new_int, i_int
+                            )
+                        )
+            else:
+                if i_int == new_int:
+                    status = status or ItemOutcome.UNCHANGED
+                    instance = instance or i
+                    continue
+
+                if extend_overlapping:
+                    if new_int.start.date is None or \
+                       i_int.start.date is None:
+                        start_date = None
+                    else:
+                        start_date = min(i.start_date, new_int.start.date)
+
+                    if new_int.end.date is None or \
+                       i_int.end.date is None:
+                        end_date = None
+                    else:
+                        end_date = max(i.end_date, new_int.end.date)
+
+                    self._save(i, start_date=start_date, end_date=end_date)
+                    return ItemOutcome.EXTENDED, i
+                elif merge_overlapping:
+                    values = {}
+                    nonnull_start_dates = [
+                        d for d in [new_int.start.date, i_int.start.date]
+                        if d is not None
+                    ]
+                    if len(nonnull_start_dates):
+                        values['start_date'] = min(nonnull_start_dates)
+
+                    nonnull_end_dates = [
+                        d for d in [new_int.end.date, i_int.end.date]
+                        if d is not None
+                    ]
+                    if len(nonnull_end_dates):
+                        values['end_date'] = max(nonnull_end_dates)
+
+                    self._save(i, **values)
+                    status, instance = ItemOutcome.MERGED, i
+                else:
+                    raise OverlappingIntervalError(
+                        i,
+                        "Identifier with same scheme could not be created, "
+                        "due to overlapping dates ({0} : {1})".format(
+                            new_int, i_int
+                        )
+                    )
+
+        if status is None:
+            return ItemOutcome.CREATED, self._create(scheme, kwargs)
+        return status, instance
+
 
 class IdentifierShortcutsMixin(object):
 
@@ -398,24 +801,42 @@ class IdentifierShortcutsMixin(object):
     def add_identifiers(self, identifiers, update=True):
         """ add identifiers and skip those that generate exceptions
 
-        Exceptions generated when dates overlap are gathered in a
-        pipe-separated array and returned.
+        Exceptions generated when dates overlap, or when writing
+        an identifier fails, are gathered in a pipe-separated array
+        and returned; the other identifiers are added anyway.
 
         :param identifiers:
         :param update:
         :return:
         """
-        exceptions = []
-        for i in identifiers:
-            try:
-                self.add_identifier(**i)
-            except Exception as e:
-                exceptions.append(str(e))
-                pass
+        exceptions = [
+            str(o.error) for o in self.bulk_add_identifiers(identifiers)
+            if o.status == ItemOutcome.FAILED
+        ]
 
         if len(exceptions):
             raise Exception(' | '.join(exceptions))
 
+    def bulk_add_identifiers(self, identifiers):
+        """ add identifiers, with the rules of ``add_identifier``,
+        fetching the existing identifiers with a single query,
+        and writing the changes in a single transaction
+
+        Items are resolved in order, each one seeing the effects of
+        the previous ones; items that generate exceptions are skipped.
+        When the bulk writes fail, items are saved one at a time, and
+        the ones failing to be written are reported as failed.
+
+        :param identifiers: list of dicts with ``add_identifier`` arguments
+        :return: list of ItemOutcome, one for each item
+        """
+        resolver = IdentifiersResolver(
+            self.identifiers.all(),
+            lambda **kwargs: Identifier(content_object=self, **kwargs)
+        )
+        outcomes = [resolver.add(i) for i in identifiers]
+        return resolver.failed(outcomes, resolver.write())
+
 
 class ClassificationShortcutsMixin(object):
 
@@ -460,24 +881,142 @@ class ClassificationShortcutsMixin(object):
         pipe-separated array and returned.
 
         :param classifications: classifications to be added (list of dicts)
-        :param update: if successive colliding classifications should update
         :return:
         """
-        exceptions = []
-        for i in classifications:
-            try:
-                self.add_classification(**i)
-            except Exception as e:
-                exceptions.append(str(e))
-                pass
+        exceptions = [
+            str(o.error)
+            for o in self.bulk_add_classifications(classifications)
+            if o.status == ItemOutcome.FAILED
+        ]
 
         if len(exceptions):
             raise Exception(' | '.join(exceptions))
 
+    def bulk_add_classifications(self, classifications):
+        """ add classifications, with the rules of ``add_classification``
+
+        Classifications are looked up by scheme, code and descr with
+        ``Classification.objects.ids_for``, using a process-wide cache
+        and a single query for the misses, and creating the missing ones;
+        the object's classifications are fetched once, and the new
+        relations are written with ``bulk_create``.
+
+        :param classifications: list of dicts with ``add_classification``
+            arguments
+        :return: list of ItemOutcome, one for each item, having the
+            ClassificationRel as instance
+        """
+        outcomes = []
+        keys = []
+        defaults = {}
+        for item in classifications:
+            try:
+                key, kwargs = _classification_key(**item)
+            except Exception as e:
+                outcomes.append(ItemOutcome(item, ItemOutcome.FAILED, None, e))
+                keys.append(None)
+                continue
+            defaults.setdefault(key, kwargs)
+            outcomes.append(None)
+            keys.append(key)
+
+        with transaction.atomic():
+            errors = {}
+            ids = Classification.objects.ids_for(
+                [k for k in keys if k is not None],
+                defaults=defaults, errors=errors
+            )
+
+            rels = dict(
+                (r.classification_id, r) for r in self.classifications.all()
+            )
+            new_rels = []
+            for n, key in enumerate(keys):
+                if key is None:
+                    continue
+                item = classifications[n]
+                if key in errors:
+                    outcomes[n] = ItemOutcome(
+                        item, ItemOutcome.FAILED, None, errors[key]
+                    )
+                elif ids[key] in rels:
+                    outcomes[n] = ItemOutcome(
+                        item, ItemOutcome.UNCHANGED, rels[ids[key]], None
+                    )
+                else:
+                    r = ClassificationRel(
+                        content_object=self, classification_id=ids[key]
+                    )
+                    rels[ids[key]] = r
+                    new_rels.append(r)
+                    outcomes[n] = ItemOutcome(
+                        item, ItemOutcome.CREATED, r, None
+                    )
+
+            if new_rels:
+                ClassificationRel.objects.bulk_create(new_rels)
+
+        return outcomes
+
+
+def _classification_key(scheme, code=None, descr=None, **kwargs):
+    """Return the (scheme, code, descr) key of a classification item,
+    and the remaining arguments, with the checks of ``add_classification``
+    """
+    if code is None and descr is None:
+        raise Exception(
+            "At least one between descr "
+            "and code must take value"
+        )
+    return (scheme, code, descr), kwargs
+
+
+# (scheme, code, descr) -> Classification id, shared by the process;
+# entries are evicted when classifications are deleted, or changed
+classifications_cache = LRUCache(maxsize=10000)
+
 
 class Error(Exception):
     pass
 
+class ItemOutcome(
+    namedtuple('ItemOutcome', ['item', 'status', 'instance', 'error'])
+):
+    """The outcome of the addition of an item in a bulk operation
+
+    Attributes:
+        item -- the item, as passed to the bulk operation
+        status -- what happened to the item, one of the status constants
+        instance -- the instance created or changed, if any
+        error -- the exception raised, when status is FAILED
+
+    """
+    CREATED = 'created'
+    OVERWRITTEN = 'overwritten'
+    EXTENDED = 'extended'
+    MERGED = 'merged'
+    UNCHANGED = 'unchanged'
+    FAILED = 'failed'
+
+    __slots__ = ()
+
+
+def _raise_failures(outcomes):
+    """Raise the errors of the failed items, other than overlaps,
+    as a pipe-separated array
+
+    :param outcomes: list of ItemOutcome
+    """
+    exceptions = [
+        str(o.error) for o in outcomes
+        if o.status == ItemOutcome.FAILED and
+        not isinstance(o.error, OverlappingIntervalError)
+    ]
+
+    if len(exceptions):
+        raise Exception(' | '.join(exceptions))
+
+
 class OverlappingIntervalError(Error):
     """Raised when date intervals overlap
 
@@ -510,8 +1049,23 @@ class LinkShortcutsMixin(object):
         return l
 
     def add_links(self, links):
-        for l in links:
-            self.add_link(**l)
+        """add links, skip those that generate exceptions
+
+        Links are resolved by URL with ``Link.objects.bulk_add_for``,
+        and the new relations are created in bulk.
+        Exceptions are gathered in a pipe-separated array and returned.
+
+        :param links: list of dicts with ``add_link`` arguments
+        :return:
+        """
+        exceptions = [
+            str(o.error)
+            for o in Link.objects.bulk_add_for([self], [links])[0]
+            if o.status == ItemOutcome.FAILED
+        ]
+
+        if len(exceptions):
+            raise Exception(' | '.join(exceptions))
 
 
 class SourceShortcutsMixin(object):
@@ -529,8 +1083,23 @@ class SourceShortcutsMixin(object):
         return s
 
     def add_sources(self, sources):
-        for s in sources:
-            self.add_source(**s)
+        """add sources, skip those that generate exceptions
+
+        Sources are resolved by URL with ``Source.objects.bulk_add_for``,
+        and the new relations are created in bulk.
+        Exceptions are gathered in a pipe-separated array and returned.
+
+        :param sources: list of dicts with ``add_source`` arguments
+        :return:
+        """
+        exceptions = [
+            str(o.error)
+            for o in Source.objects.bulk_add_for([self], [sources])[0]
+            if o.status == ItemOutcome.FAILED
+        ]
+
+        if len(exceptions):
+            raise Exception(' | '.join(exceptions))
 
 
 @python_2_unicode_compatible
@@ -735,39 +1304,18 @@ class Person(
         :return: Membership, if just created
         """
 
-        # new  dates interval as PartialDatesInterval instance
-        new_int = PartialDatesInterval(
-            start=kwargs.get('start_date', None),
-            end=kwargs.get('end_date', None)
-        )
-
-        is_overlapping = False
-
         allow_overlap = kwargs.pop('allow_overlap', False)
 
-        # loop over memberships to the same org
-        same_org_memberships = self.memberships.filter(
+        # memberships to the same org, crossing the new dates interval;
+        # touching intervals are considered non overlapping
+        overlapping = self.memberships.filter(
             organization=organization,
             post__isnull=True
+        ).overlapping(
+            kwargs.get('start_date', None), kwargs.get('end_date', None)
         )
-        for i in same_org_memberships:
-
-            # existing identifier interval as PartialDatesInterval instance
-            i_int = PartialDatesInterval(
-                start=i.start_date,
-                end=i.end_date
-            )
 
-            # compute overlap days
-            #  > 0 means crossing
-            # == 0 means touching (considered non overlapping)
-            #  < 0 meand not overlapping
-            overlap = PartialDate.intervals_overlap(new_int, i_int)
-
-            if overlap > 0:
-                is_overlapping = True
-
-        if not is_overlapping or allow_overlap:
+        if allow_overlap or not overlapping.exists():
             m = self.memberships.create(
                 organization=organization,
                 **kwargs
@@ -777,11 +1325,16 @@ class Person(
     def add_memberships(self, memberships):
         """Add multiple *blank* memberships to person.
 
+        Memberships are created with ``Membership.objects.bulk_load``,
+        overlapping ones are skipped, as in ``add_membership``;
+        other exceptions are gathered in a pipe-separated array and raised.
+
         :param memberships: list of Membership dicts
         :return: None
         """
-        for m in memberships:
-            self.add_membership(**m)
+        _raise_failures(Membership.objects.bulk_load(
+            [dict(m, person=self) for m in memberships]
+        ))
 
     def add_role(self, post, **kwargs):
         """add person's role (membership through post) in an Organization
@@ -818,40 +1371,18 @@ class Person(
             org = kwargs.pop('organization')
 
 
-        # new  dates interval as PartialDatesInterval instance
-        new_int = PartialDatesInterval(
-            start=kwargs.get('start_date', None),
-            end=kwargs.get('end_date', None)
-        )
-
-        is_overlapping = False
-
         allow_overlap = kwargs.pop('allow_overlap', False)
 
-        # loop over memberships to the same org and post
-        same_org_post_memberships = self.memberships.filter(
+        # memberships to the same org and post, crossing the new dates
+        # interval; touching intervals are considered non overlapping
+        overlapping = self.memberships.filter(
             organization=org,
             post=post
+        ).overlapping(
+            kwargs.get('start_date', None), kwargs.get('end_date', None)
         )
-        for i in same_org_post_memberships:
-
-            # existing identifier interval as PartialDatesInterval instance
-            i_int = PartialDatesInterval(
-                start=i.start_date,
-                end=i.end_date
-            )
-
-            # compute overlap days
-            #  > 0 means crossing
-            # == 0 means touching (end date == start date)
-            #  < 0 means not touching
-            # dates only overlap if crossing
-            overlap = PartialDate.intervals_overlap(new_int, i_int)
-
-            if overlap > 0:
-                is_overlapping = True
 
-        if not is_overlapping or allow_overlap:
+        if allow_overlap or not overlapping.exists():
             m = self.memberships.create(
                 post=post,
                 organization=org,
@@ -863,11 +1394,22 @@ class Person(
     def add_roles(self, roles):
         """Add multiple roles to person.
 
+        Memberships are created with ``Membership.objects.bulk_load``,
+        overlapping ones are skipped, as in ``add_role``;
+        other exceptions are gathered in a pipe-separated array and raised.
+
         :param memberships: list of Role dicts
         :return: None
         """
+        rows = []
         for r in roles:
-            self.add_role(**r)
+            if 'organization' in r and r['post'].organization_id is not None:
+                raise Exception(
+                    "Post needs to be generic, "
+                    "i.e. not linked to an organization"
+                )
+            rows.append(dict(r, person=self))
+        _raise_failures(Membership.objects.bulk_load(rows))
 
     def add_role_on_behalf_of(self, post, behalf_organization, **kwargs):
         """add a role (post) in an Organization on behhalf of the given
@@ -1257,11 +1799,25 @@ class Organization(
     def add_members(self, members):
         """add multiple *blank* members to this organization
 
+        Memberships are created with ``Membership.objects.bulk_load``,
+        exceptions are gathered in a pipe-separated array and raised.
+
         :param members: list of Person/Organization to be added as members
         :return:
         """
+        rows = []
         for m in members:
-            self.add_member(m)
+            if isinstance(m, Person):
+                rows.append({'person': m})
+            elif isinstance(m, Organization):
+                rows.append({'member_organization': m})
+            else:
+                raise Exception(_(
+                    "Member must be Person or Organization"
+                ))
+        _raise_failures(Membership.objects.bulk_load(
+            [dict(r, organization=self, allow_overlap=True) for r in rows]
+        ))
 
     def add_membership(self, organization, **kwargs):
         """add this organization as member to the given `organization`
@@ -1624,6 +2180,9 @@ class Membership(
             self.member.name, self.organization.name, self.label
         )
 
+    # foreign keys used by slug_source, fetched in bulk by bulk_create
+    slug_source_fields = ('person', 'member_organization', 'organization')
+
     label = models.CharField(
         _("label"),
         max_length=256, blank=True, null=True,
@@ -1746,6 +2305,9 @@ class Membership(
     class Meta:
         verbose_name = _("Membership")
         verbose_name_plural = _("Memberships")
+        index_together = [
+            ('organization', 'post', 'person', 'start_key'),
+        ]
 
     try:
         # PassTrhroughManager was removed in django-model-utils 2.4,
@@ -1786,6 +2348,11 @@ class Ownership(
             self.owner.name, self.organization.name, self.percentage*100
         )
 
+    # foreign keys used by slug_source, fetched in bulk by bulk_create
+    slug_source_fields = (
+        'owner_person', 'owner_organization', 'organization'
+    )
+
 
     # person or organization that is a member of the organization
     organization = models.ForeignKey(
@@ -2355,6 +2922,9 @@ class AreaRelationship(
     class Meta:
         verbose_name = _("Area relationship")
         verbose_name_plural = _("Area relationships")
+        index_together = [
+            ('source_area', 'classification'),
+        ]
 
     try:
         # PassTrhroughManager was removed in django-model-utils 2.4,
@@ -2595,6 +3165,11 @@ class ElectoralResult(
 
         return " ".join(map(str, fields))
 
+    # foreign keys used by slug_source, fetched in bulk by bulk_create
+    slug_source_fields = (
+        'event', 'organization', 'constituency', 'list', 'candidate'
+    )
+
     event = models.ForeignKey(
         'ElectoralEvent',
         related_name='results',
@@ -2791,6 +3366,9 @@ class OtherName(Dateframeable, GenericRelatable, models.Model):
     class Meta:
         verbose_name = _("Other name")
         verbose_name_plural = _("Other names")
+        index_together = [
+            ('content_type', 'object_id', 'othername_type'),
+        ]
 
     try:
         # PassTrhroughManager was removed in django-model-utils 2.4,
@@ -2830,6 +3408,9 @@ class Identifier(Dateframeable, GenericRelatable, models.Model):
     class Meta:
         verbose_name = _("Identifier")
         verbose_name_plural = _("Identifiers")
+        index_together = [
+            ('content_type', 'object_id', 'scheme'),
+        ]
 
     try:
         # PassTrhroughManager was removed in django-model-utils 2.4,
@@ -2883,6 +3464,13 @@ class Link(models.Model):
         verbose_name = _("Link")
         verbose_name_plural = _("Links")
 
+    try:
+        # PassTrhroughManager was removed in django-model-utils 2.4,
+        # see issue #22
+        objects = PassThroughManager.for_queryset_class(LinkQuerySet)()
+    except:
+        objects = LinkQuerySet.as_manager()
+
     def __str__(self):
         return self.url
 
@@ -2929,6 +3517,13 @@ class Source(models.Model):
         verbose_name = _("Source")
         verbose_name_plural = _("Sources")
 
+    try:
+        # PassTrhroughManager was removed in django-model-utils 2.4,
+        # see issue #22
+        objects = PassThroughManager.for_queryset_class(SourceQuerySet)()
+    except:
+        objects = SourceQuerySet.as_manager()
+
     def __str__(self):
         return self.url
 
@@ -3076,6 +3671,59 @@ class Event(Timestampable, SourceShortcutsMixin, models.Model):
         unique_together = ('name', 'start_date',)
 
 
+@python_2_unicode_compatible
+class ImportedChunk(models.Model):
+    """
+    A chunk of records written by a checkpointed import, inserted in
+    the same transaction as the rows of the chunk, so that a chunk
+    committed right before the import was interrupted, and missing
+    from the checkpoint, is not written again when resuming
+    (see ``popolo.importers.checkpoint``).
+    """
+    checkpoint = models.CharField(
+        _("checkpoint"),
+        max_length=32,
+        help_text=_("The token of the checkpoint of the import")
+    )
+
+    collection = models.CharField(
+        _("collection"),
+        max_length=32,
+        help_text=_("The collection of the records, ex: persons")
+    )
+
+    number = models.PositiveIntegerField(
+        _("number"),
+        help_text=_("The number of the chunk in its collection")
+    )
+
+    counts = models.TextField(
+        _("counts"),
+        help_text=_("The counts of the chunk added to the stats, as JSON")
+    )
+
+    ids = models.TextField(
+        _("ids"),
+        help_text=_(
+            "The source ids and primary keys of the records, as JSON"
+        )
+    )
+
+    unresolved = models.BooleanField(
+        _("unresolved"),
+        default=False,
+        help_text=_("Whether parents of the records were not resolved")
+    )
+
+    def __str__(self):
+        return "{0} {1}".format(self.collection, self.number)
+
+    class Meta:
+        verbose_name = _('Imported chunk')
+        verbose_name_plural = _('Imported chunks')
+        unique_together = ('checkpoint', 'collection', 'number')
+
+
 #
 # signals
 #
@@ -3106,11 +3754,9 @@ def copy_person_date_fields(sender, **kwargs):
         obj.end_date = obj.death_date
 
 
-# all Dateframeable instances need to have dates properly sorted
-@receiver(pre_save)
+# all Dateframeable instances need to have dates properly sorted,
+# the receiver is connected to Dateframeable models in PopoloConfig.ready
 def verify_start_end_dates_order(sender, **kwargs):
-    if not issubclass(sender, Dateframeable):
-        return
     obj = kwargs['instance']
     if obj.start_date and obj.end_date and obj.start_date > obj.end_date:
         raise Exception(_(
@@ -3139,17 +3785,69 @@ def verify_ownership_has_org_and_owner(sender, **kwargs):
             "An owner, either a Person or an Organization, must be specified."
         ))
 
-# all main instances are validated before being saved
-@receiver(pre_save, sender=Person)
-@receiver(pre_save, sender=Organization)
-@receiver(pre_save, sender=Post)
-@receiver(pre_save, sender=Membership)
-@receiver(pre_save, sender=Ownership)
-@receiver(pre_save, sender=ElectoralEvent)
-@receiver(pre_save, sender=ElectoralResult)
-@receiver(pre_save, sender=Area)
+
+# all main instances are validated before being saved,
+# or at the end of a ``popolo.validation.deferred`` block;
+# the receiver is connected to VALIDATED_MODELS in PopoloConfig.ready
+VALIDATED_MODELS = (
+    Person, Organization, Post, Membership, Ownership,
+    ElectoralEvent, ElectoralResult, Area
+)
+
+
 def validate_fields(sender, **kwargs):
     obj = kwargs['instance']
-    obj.full_clean()
+    if not defer(obj):
+        obj.full_clean()
+
+
+# the sortable keys of Dateframeable instances are computed last,
+# when dates have been copied and validated;
+# the receiver is connected to Dateframeable models in PopoloConfig.ready
+def update_dateframeable_keys(sender, **kwargs):
+    kwargs['instance'].update_date_keys()
+
+
+def prepare_dateframeable(instance):
+    """Perform the checks and updates of the ``pre_save`` receivers
+    of Dateframeable models, on an instance that's going to
+    be written bypassing ``save``, as in ``bulk_create``
+
+    Birth and death dates of persons, founding and dissolution dates
+    of organizations are copied into start and end dates, too.
+
+    :param instance: a Dateframeable instance
+    """
+    if isinstance(instance, Person):
+        copy_person_date_fields(type(instance), instance=instance)
+    elif isinstance(instance, Organization):
+        copy_organization_date_fields(type(instance), instance=instance)
+    verify_start_end_dates_order(type(instance), instance=instance)
+    instance.update_date_keys()
+
+
+@receiver(post_delete, sender=Classification)
+def evict_deleted_classification(sender, **kwargs):
+    obj = kwargs['instance']
+    classifications_cache.discard((obj.scheme, obj.code, obj.descr))
+
+
+@receiver(post_save, sender=Classification)
+def evict_changed_classifications(sender, **kwargs):
+    # the previous values of a changed classification are not known
+    if not kwargs['created']:
+        classifications_cache.clear()
+
+
+@receiver(post_delete, sender=Source)
+@receiver(post_delete, sender=Link)
+def evict_deleted_url(sender, **kwargs):
+    sender.objects.get_queryset().cache.discard(kwargs['instance'].url)
 
 
+@receiver(post_save, sender=Source)
+@receiver(post_save, sender=Link)
+def evict_changed_urls(sender, **kwargs):
+    # the previous url of a changed row is not known
+    if not kwargs['created']:
+        sender.objects.get_queryset().cache.clear()
@@ -0,0 +1,97 @@
+"""Prefetching of the generic relations of heterogeneous objects.
+
+``prefetch_related`` works on the instances of a single model; the
+identifiers, other names, contact details, links, sources and
+classifications of a mixed list of persons, organizations and areas
+(ex: the results of a search) are instead fetched with::
+
+    from popolo import prefetch
+
+    prefetch.generic(results, 'identifiers', 'sources')
+    results[0].identifiers.all()  # no query
+
+Objects are grouped by content type, and each relation is fetched with
+one query for each content type (and each 500 objects); the rows of the
+relations pointing to another model (``links``, ``sources``,
+``classifications``) are fetched together with it, through
+``select_related``.
+
+The results are attached to the objects as the ones of
+``prefetch_related``, so that ``.all()`` on the relation managers
+does not hit the database; filtering the managers still does.
+"""
+from collections import OrderedDict
+
+from django.contrib.contenttypes.fields import GenericRelation
+from django.core.exceptions import FieldDoesNotExist
+
+from popolo.utils.bulk import chunks
+from popolo.utils.content_types import get_content_type
+
+
+def generic(objects, *relations):
+    """Fetch the generic relations of objects of any model, attaching
+    them in place
+
+    Objects of models lacking a relation are skipped for it.
+
+    :param objects: the model instances, saved
+    :param relations: the names of the generic relations,
+        ex: ``identifiers``
+    :return: the list of the objects
+    :raise ValueError: if a relation is not a ``GenericRelation``
+    """
+    objects = list(objects)
+    by_model = OrderedDict()
+    for obj in objects:
+        if obj is not None and obj.pk is not None:
+            by_model.setdefault(type(obj), []).append(obj)
+
+    for model, model_objects in by_model.items():
+        content_type = get_content_type(model)
+        for relation in relations:
+            try:
+                field = model._meta.get_field(relation)
+            except FieldDoesNotExist:
+                continue
+            if not isinstance(field, GenericRelation):
+                raise ValueError("{0}.{1} is not a generic relation".format(
+                    model.__name__, relation
+                ))
+            _prefetch(field, content_type, model_objects)
+    return objects
+
+
+def _prefetch(field, content_type, objects):
+    related_model = field.related_model
+    # the targets of relation models, as LinkRel.link
+    targets = [
+        f.name for f in related_model._meta.fields
+        if f.many_to_one and f.name != field.content_type_field_name
+    ]
+    queryset = related_model._default_manager.filter(**{
+        field.content_type_field_name: content_type,
+    }).select_related(*targets)
+
+    rows = {}
+    to_pk = objects[0]._meta.pk.to_python
+    # keep below the limits of variables of a query
+    for chunk in chunks(objects, 500):
+        for row in queryset.filter(**{
+            '{0}__in'.format(field.object_id_field_name): [
+                o.pk for o in chunk
+            ]
+        }):
+            rows.setdefault(
+                to_pk(getattr(row, field.object_id_field_name)), []
+            ).append(row)
+
+    for obj in objects:
+        if not hasattr(obj, '_prefetched_objects_cache'):
+            obj._prefetched_objects_cache = {}
+        # the previous results, if any, are replaced
+        obj._prefetched_objects_cache.pop(field.attname, None)
+        cached = getattr(obj, field.name).get_queryset()
+        cached._result_cache = rows.get(obj.pk, [])
+        cached._prefetch_done = True
+        obj._prefetched_objects_cache[field.attname] = cached
@@ -1,10 +1,50 @@
-from django.db.models import Q
+import operator
+from collections import OrderedDict
+from functools import reduce
+
+from django.db.models import F, Q
 
 __author__ = 'guglielmo'
 
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction, IntegrityError
+from django.utils.translation import ugettext_lazy as _
 from datetime import datetime
 
+from popolo.indexes import invalidate_index
+from popolo.utils import PartialDate, PartialDateException, LRUCache
+from popolo.utils.bulk import chunks, fetch_related, set_on_commit
+from popolo.utils.content_types import get_content_type
+from popolo.utils.intervals import start_key, end_key
+
+
+def _generic_targets(objects):
+    """Return the keys of objects, as targets of generic relations
+
+    :param objects: saved model instances, of any model
+    :return: a tuple with the list of (content type id, object id) keys,
+        one for each object, an OrderedDict mapping the distinct keys
+        to content types, and the Q filter selecting the related rows
+    """
+    keys = []
+    content_types = OrderedDict()
+    for obj in objects:
+        if obj.pk is None:
+            raise ValueError(
+                "Generic relations can only be added to saved objects"
+            )
+        ct = get_content_type(obj)
+        keys.append((ct.id, obj.pk))
+        content_types[(ct.id, obj.pk)] = ct
+
+    object_ids = OrderedDict()
+    for ct_id, pk in content_types:
+        object_ids.setdefault(ct_id, []).append(pk)
+    q = Q()
+    for ct_id, pks in object_ids.items():
+        q |= Q(content_type_id=ct_id, object_id__in=pks)
+    return keys, content_types, q
+
 
 class DateframeableQuerySet(models.query.QuerySet):
     """
@@ -19,25 +59,105 @@ class DateframeableQuerySet(models.query.QuerySet):
     named ``start_date`` and ``end_date``, respectively,
     whose validation pattern is: "^[0-9]{4}(-[0-9]{2}){0,2}$",
     in order to represent partial dates.
+
+    Filters are applied on the ``start_key`` and ``end_key`` integer
+    fields, shadowing the dates, where null dates are stored
+    as the minimum and maximum keys.
+
+    ``bulk_create`` and ``update`` (thus ``popolo.utils.bulk.bulk_update``)
+    send no signal, and invalidate the interval index of the model
+    (see ``popolo.indexes``) once the transaction is committed;
+    ``update`` also updates the keys of the dates it changes.
     """
 
+    #: the fields whose changes move rows in the interval indexes
+    index_fields = frozenset([
+        'start_date', 'end_date', 'start_key', 'end_key'
+    ])
+
+    def bulk_create(self, objs, batch_size=None):
+        objs = super(DateframeableQuerySet, self).bulk_create(
+            objs, batch_size=batch_size
+        )
+        invalidate_index(self.model, using=self.db)
+        return objs
+
+    #: (date field, key field, key function) of the dates
+    date_keys = (
+        ('start_date', 'start_key', start_key),
+        ('end_date', 'end_key', end_key),
+    )
+
+    @staticmethod
+    def _date_key(date_field, get_key, value):
+        try:
+            return get_key(value)
+        except PartialDateException:
+            raise ValidationError(
+                {date_field: u'date seems not to be correct %s' % value}
+            )
+
+    def update(self, **kwargs):
+        """Update the rows, and the keys of the dates being updated
+
+        Keys of literal dates are computed and updated together with
+        them; when dates are set with expressions (ex: ``F``, ``Case``),
+        keys are computed out of the updated rows, with a query for
+        each distinct date, within the same transaction.
+
+        :raise ValidationError: if one of the dates is not valid
+        """
+        computed = []
+        for date_field, key_field, get_key in self.date_keys:
+            if date_field not in kwargs or key_field in kwargs:
+                continue
+            value = kwargs[date_field]
+            if hasattr(value, 'resolve_expression'):
+                computed.append((date_field, key_field, get_key))
+            else:
+                kwargs[key_field] = self._date_key(
+                    date_field, get_key, value
+                )
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            pks = computed and list(self.values_list('pk', flat=True))
+            n = super(DateframeableQuerySet, self).update(**kwargs)
+            for date_field, key_field, get_key in computed:
+                self._update_keys(pks, date_field, key_field, get_key)
+        if self.index_fields.intersection(kwargs):
+            invalidate_index(self.model, using=self.db)
+        return n
+
+    def _update_keys(self, pks, date_field, key_field, get_key):
+        """Update the keys of a date of some rows, out of the dates
+        stored in the database"""
+        manager = self.model._default_manager.db_manager(self.db)
+        for chunk in chunks(pks, 500):
+            rows = manager.filter(pk__in=chunk)
+            for d in set(rows.values_list(date_field, flat=True)):
+                rows.filter(**{date_field: d}).update(**{
+                    key_field: self._date_key(date_field, get_key, d)
+                })
+
+    @staticmethod
+    def _moment_key(moment):
+        if moment is None:
+            moment = datetime.strftime(datetime.now(), '%Y-%m-%d')
+        return PartialDate.of(moment).key
+
     def past(self, moment=None):
         """
         Return a QuerySet containing the *past* instances of the model
         (i.e. those having an end date which is in the past).
         """
-        if moment is None:
-            moment = datetime.strftime(datetime.now(), '%Y-%m-%d')
-        return self.filter(end_date__lte=moment)
+        return self.filter(end_key__lte=self._moment_key(moment))
 
     def future(self, moment=None):
         """
         Return a QuerySet containing the *future* instances of the model
         (i.e. those having a start date which is in the future).
         """
-        if moment is None:
-            moment = datetime.strftime(datetime.now(), '%Y-%m-%d')
-        return self.filter(start_date__gte=moment)
+        return self.filter(start_key__gte=self._moment_key(moment))
 
     def current(self, moment=None):
         """
@@ -48,37 +168,360 @@ class DateframeableQuerySet(models.query.QuerySet):
         (i.e. those for which the moment date-time lies within their
         associated time range).
         """
-        if moment is None:
-            moment = datetime.strftime(datetime.now(), '%Y-%m-%d')
+        moment_key = self._moment_key(moment)
+        return self.filter(start_key__lte=moment_key, end_key__gte=moment_key)
 
-        return self.filter(
-            ( Q(start_date__lte=moment) | Q(start_date__isnull=True) ) &
-            ( Q(end_date__gte=moment) | Q(end_date__isnull=True) )
-        )
+    def overlapping(self, start_date=None, end_date=None):
+        """
+        Return a QuerySet containing the instances whose date range
+        overlaps the given one, i.e. those for which
+        ``PartialDate.intervals_overlap`` would be greater than zero;
+        touching ranges are not overlapping.
+
+        The check is a single condition on the ``start_key`` and
+        ``end_key`` fields, where the ordinal of a date is ``key // 4``:
+        ``ordinal < n`` is ``key < 4 * n`` and ``ordinal > n`` is
+        ``key >= 4 * (n + 1)``.
+
+        @start_date - the start of the range, None if open
+        @end_date - the end of the range, None if open
+        """
+        start = PartialDate.of(start_date).ordinal if start_date else None
+        end = PartialDate.of(end_date).ordinal if end_date else None
+
+        # both starts, or both ends, open: overlap is huge
+        conditions = []
+        if start is None:
+            conditions.append(Q(start_key=PartialDate.MIN_KEY))
+        if end is None:
+            conditions.append(Q(end_key=PartialDate.MAX_KEY))
+
+        # otherwise min(end, row end) > max(start, row start),
+        # open dates being the max and min ordinals
+        latest = start or 0
+        earliest = end or (PartialDate.MAX_KEY >> 2)
+        if earliest > latest:
+            conditions.append(
+                Q(start_key__lt=earliest << 2) &
+                Q(end_key__gte=(latest + 1) << 2) &
+                Q(start_key__lt=F('end_key') - F('end_key') % 4)
+            )
+
+        if not conditions:
+            return self.none()
+        return self.filter(reduce(operator.or_, conditions))
+
+
+class PermalinkableQuerySet(models.query.QuerySet):
+    """Queryset of Permalinkable models, allocating the unique slugs
+    of the instances created with ``bulk_create``
+    """
 
+    def bulk_create(self, objs, batch_size=None):
+        """Allocate the slugs of the instances with a single query
+        (see ``popolo.utils.bulk.unique_slugs``), then insert them
 
-class PersonQuerySet(DateframeableQuerySet):
+        Slugs are generated as saving the instances one after the other
+        would, out of their ``slug_source``, or out of the given slugs;
+        instances already having the ``_slug_allocated`` attribute set
+        are left alone. The related instances used by ``slug_source``,
+        listed in the ``slug_source_fields`` model attribute, are fetched
+        with one query per related model, when not already loaded.
+        """
+        objs = list(objs)
+        pending = [
+            o for o in objs if not getattr(o, '_slug_allocated', False)
+        ]
+        if pending:
+            fetch_related(
+                [o for o in pending if not o.slug],
+                getattr(self.model, 'slug_source_fields', ()),
+                using=self.db
+            )
+            self.model._meta.get_field('slug').allocate(
+                pending, using=self.db
+            )
+        for o in pending:
+            o._slug_allocated = True
+        try:
+            return super(PermalinkableQuerySet, self).bulk_create(
+                objs, batch_size=batch_size
+            )
+        finally:
+            # later saves generate slugs as usual
+            for o in pending:
+                del o._slug_allocated
+
+
+class PersonQuerySet(PermalinkableQuerySet, DateframeableQuerySet):
     pass
 
 
-class OrganizationQuerySet(DateframeableQuerySet):
+class OrganizationQuerySet(PermalinkableQuerySet, DateframeableQuerySet):
     pass
 
 
-class PostQuerySet(DateframeableQuerySet):
+class PostQuerySet(PermalinkableQuerySet, DateframeableQuerySet):
     pass
 
 
-class MembershipQuerySet(DateframeableQuerySet):
+class MembershipQuerySet(PermalinkableQuerySet, DateframeableQuerySet):
+
+    def bulk_load(self, rows, batch_size=500):
+        """Create memberships in bulk, with the rejections of the
+        single-row methods, but a constant number of queries per chunk
+
+        Each row is a dict of Membership field values, as passed to
+        ``Person.add_membership`` or ``Organization.add_member``; if the
+        organization is missing, the one of the post is used, as in
+        ``Person.add_role``. Rows can also be unsaved Membership
+        instances, with an optional ``allow_overlap`` attribute.
+        Rows are processed in chunks of ``batch_size``, and for each
+        chunk:
+
+        * member and organization presence, field values and date order
+          are validated in memory, as ``save`` does, while related
+          instances are checked to exist with one query per related model;
+        * memberships of a person are rejected when they overlap
+          existing or previous memberships to the same organization
+          and post, unless the row has ``allow_overlap``;
+          overlaps are computed in memory, out of one query;
+        * memberships are inserted with ``bulk_create``, allocating
+          their slugs with a single query, and no signal is sent.
+
+        :param rows: iterable of dicts
+        :param batch_size: the number of rows processed in a chunk
+        :return: list of ItemOutcome, one for each row
+        """
+        outcomes = []
+        for chunk in chunks(rows, batch_size):
+            outcomes.extend(self._bulk_load_chunk(chunk))
+        return outcomes
+
+    def _bulk_load_chunk(self, rows):
+        from popolo.models import ItemOutcome, OverlappingIntervalError, \
+            Post, prepare_dateframeable
+        from popolo.utils.intervals import overlaps_one_to_many
+
+        outcomes = [None] * len(rows)
+        memberships = {}
+        allow_overlap = {}
+
+        def fail(n, e):
+            outcomes[n] = ItemOutcome(rows[n], ItemOutcome.FAILED, None, e)
+            memberships.pop(n, None)
+
+        for n, row in enumerate(rows):
+            if isinstance(row, self.model):
+                allow_overlap[n] = getattr(row, 'allow_overlap', False)
+                memberships[n] = row
+                continue
+            kwargs = dict(row)
+            allow_overlap[n] = kwargs.pop('allow_overlap', False)
+            try:
+                memberships[n] = self.model(**kwargs)
+            except Exception as e:
+                fail(n, e)
+
+        # organizations of specific posts
+        post_ids = set(
+            m.post_id for m in memberships.values()
+            if m.organization_id is None and m.post_id is not None
+        )
+        if post_ids:
+            post_organizations = dict(
+                Post.objects.filter(pk__in=post_ids).values_list(
+                    'pk', 'organization_id'
+                )
+            )
+            for n, m in list(memberships.items()):
+                if m.organization_id is None and m.post_id is not None:
+                    if post_organizations.get(m.post_id) is None:
+                        fail(n, Exception(
+                            "Post needs to be specific, "
+                            "i.e. linked to an organization"
+                        ))
+                    else:
+                        m.organization_id = post_organizations[m.post_id]
+
+        # the checks of the pre_save receivers, and full_clean,
+        # related instances and slugs excluded
+        relations = [f for f in self.model._meta.fields if f.is_relation]
+        exclude = [f.name for f in relations] + ['slug']
+        for n, m in list(memberships.items()):
+            try:
+                if m.person_id is None and m.member_organization_id is None:
+                    raise Exception(_(
+                        "A member, either a Person or an Organization, "
+                        "must be specified."
+                    ))
+                if m.organization_id is None:
+                    raise Exception(_(
+                        "An Organization, must be specified."
+                    ))
+                m.clean_fields(exclude=exclude)
+                m.clean()
+                prepare_dateframeable(m)
+            except Exception as e:
+                fail(n, e)
+
+        # related instances, with one query per related model
+        related_ids = {}
+        for f in relations:
+            related_ids.setdefault(f.related_model, set()).update(
+                getattr(m, f.attname) for m in memberships.values()
+            )
+        existing_ids = {}
+        for model, ids in related_ids.items():
+            ids.discard(None)
+            existing_ids[model] = set(
+                model._default_manager.filter(pk__in=ids).values_list(
+                    'pk', flat=True
+                )
+            ) if ids else set()
+        for n, m in list(memberships.items()):
+            for f in relations:
+                value = getattr(m, f.attname)
+                if value is not None and \
+                        value not in existing_ids[f.related_model]:
+                    fail(n, ValidationError({
+                        f.name: f.error_messages['invalid'] % {
+                            'model': f.related_model._meta.verbose_name,
+                            'pk': value,
+                            'field': f.remote_field.field_name,
+                            'value': value,
+                        }
+                    }))
+                    break
+
+        # overlaps of the memberships of the same person
+        # to the same organization and post
+        def group(m):
+            return m.person_id, m.organization_id, m.post_id
+
+        groups = {}
+        checked = set(group(m) for m in memberships.values() if m.person_id)
+        if checked:
+            for m in self.filter(
+                person_id__in=set(g[0] for g in checked),
+                organization_id__in=set(g[1] for g in checked)
+            ):
+                if group(m) in checked:
+                    groups.setdefault(group(m), []).append(m)
+
+        def ordinal(d):
+            return PartialDate.of(d).ordinal if d else None
+
+        for n in sorted(memberships):
+            m = memberships[n]
+            if not m.person_id:
+                continue
+            others = groups.setdefault(group(m), [])
+            if not allow_overlap[n] and others:
+                overlaps = overlaps_one_to_many(
+                    ordinal(m.start_date), ordinal(m.end_date),
+                    [ordinal(o.start_date) for o in others],
+                    [ordinal(o.end_date) for o in others]
+                )
+                overlapping = [
+                    o for o, overlap in zip(others, overlaps) if overlap > 0
+                ]
+                if overlapping:
+                    fail(n, OverlappingIntervalError(
+                        overlapping[0],
+                        "Membership could not be created, "
+                        "due to overlapping dates"
+                    ))
+                    continue
+            others.append(m)
+
+        accepted = [memberships[n] for n in sorted(memberships)]
+        with transaction.atomic(using=self.db):
+            self.bulk_create(accepted)
+
+        for n in memberships:
+            outcomes[n] = ItemOutcome(
+                rows[n], ItemOutcome.CREATED, memberships[n], None
+            )
+        return outcomes
+
+
+class OwnershipQuerySet(PermalinkableQuerySet, DateframeableQuerySet):
     pass
 
 
-class OwnershipQuerySet(DateframeableQuerySet):
-    pass
+class ContactDetailQuerySet(DateframeableQuerySet):
 
+    def bulk_add_for(self, objects, rows, batch_size=500):
+        """Add contact details to many objects, with the rules of
+        ``add_contact_detail``: a contact is added to an object
+        only if the object has no contact with the same value
 
-class ContactDetailQuerySet(DateframeableQuerySet):
-    pass
+        Objects are processed in chunks of ``batch_size``; for each chunk
+        the existing contact values are fetched with one query, and the
+        new contacts are created with ``bulk_create``.
+
+        :param objects: saved instances, of any model, or a queryset
+        :param rows: for each object, the list of dicts
+            with ``add_contact_detail`` arguments
+        :param batch_size: the number of objects processed in a chunk
+        :return: for each object, the list of ItemOutcome of its rows
+        """
+        from popolo.models import ItemOutcome, prepare_dateframeable
+
+        objects = list(objects)
+        rows = [list(r) for r in rows]
+        if len(objects) != len(rows):
+            raise ValueError(
+                "The number of objects and of rows lists must be the same"
+            )
+
+        outcomes = []
+        for chunk in chunks(range(len(objects)), batch_size):
+            keys, content_types, q = _generic_targets(
+                [objects[n] for n in chunk]
+            )
+            values = set(r.get('value') for n in chunk for r in rows[n])
+
+            # the oldest contact wins, when a value is repeated
+            existing = {}
+            for c in self.filter(q, value__in=values).order_by('-pk'):
+                existing[(c.content_type_id, c.object_id, c.value)] = c
+
+            new = []
+            for n, key in zip(chunk, keys):
+                object_outcomes = []
+                for row in rows[n]:
+                    try:
+                        kwargs = dict(row)
+                        value = kwargs.pop('value')
+                        if key + (value,) in existing:
+                            object_outcomes.append(ItemOutcome(
+                                row, ItemOutcome.UNCHANGED,
+                                existing[key + (value,)], None
+                            ))
+                            continue
+                        c = self.model(
+                            content_type=content_types[key],
+                            object_id=key[1], value=value, **kwargs
+                        )
+                        prepare_dateframeable(c)
+                    except Exception as e:
+                        object_outcomes.append(ItemOutcome(
+                            row, ItemOutcome.FAILED, None, e
+                        ))
+                        continue
+                    existing[key + (value,)] = c
+                    new.append(c)
+                    object_outcomes.append(ItemOutcome(
+                        row, ItemOutcome.CREATED, c, None
+                    ))
+                outcomes.append(object_outcomes)
+
+            if new:
+                self.bulk_create(new)
+
+        return outcomes
 
 
 class OtherNameQuerySet(DateframeableQuerySet):
@@ -89,15 +532,15 @@ class PersonalRelationshipQuerySet(DateframeableQuerySet):
     pass
 
 
-class ElectoralEventQuerySet(DateframeableQuerySet):
+class ElectoralEventQuerySet(PermalinkableQuerySet, DateframeableQuerySet):
     pass
 
 
-class ElectoralResultQuerySet(DateframeableQuerySet):
+class ElectoralResultQuerySet(PermalinkableQuerySet, DateframeableQuerySet):
     pass
 
 
-class AreaQuerySet(DateframeableQuerySet):
+class AreaQuerySet(PermalinkableQuerySet, DateframeableQuerySet):
 
     def municipalities(self):
         return self.filter(
@@ -144,7 +587,321 @@ class AreaRelationshipQuerySet(DateframeableQuerySet):
 
 
 class IdentifierQuerySet(DateframeableQuerySet):
-    pass
+
+    def bulk_upsert_for(self, objects, rows, batch_size=500):
+        """Add identifiers to many objects, with the rules of
+        ``IdentifierShortcutsMixin.add_identifier``
+
+        Objects are processed in chunks of ``batch_size``; for each chunk
+        the existing identifiers of all objects, having the schemes used
+        in the rows, are fetched with one query, the rows are resolved
+        in memory, and the changes are written with bulk queries,
+        within a transaction.
+
+        :param objects: saved instances, of any model having identifiers
+        :param rows: for each object, the list of dicts
+            with ``add_identifier`` arguments
+        :param batch_size: the number of objects processed in a chunk
+        :return: for each object, the list of ItemOutcome of its rows
+        """
+        from popolo.models import IdentifiersResolver
+
+        objects = list(objects)
+        rows = [list(r) for r in rows]
+        if len(objects) != len(rows):
+            raise ValueError(
+                "The number of objects and of rows lists must be the same"
+            )
+
+        outcomes = []
+        for chunk in chunks(range(len(objects)), batch_size):
+            keys, content_types, q = _generic_targets(
+                [objects[n] for n in chunk]
+            )
+            schemes = set(r.get('scheme') for n in chunk for r in rows[n])
+
+            existing = dict((k, []) for k in content_types)
+            if schemes:
+                for i in self.filter(q, scheme__in=schemes):
+                    existing[(i.content_type_id, i.object_id)].append(i)
+
+            resolvers = OrderedDict()
+            for key, ct in content_types.items():
+                resolvers[key] = IdentifiersResolver(
+                    existing[key],
+                    lambda ct=ct, pk=key[1], **kwargs: self.model(
+                        content_type=ct, object_id=pk, **kwargs
+                    )
+                )
+            chunk_outcomes = [
+                [resolvers[key].add(r) for r in rows[n]]
+                for n, key in zip(chunk, keys)
+            ]
+            errors = IdentifiersResolver.write_all(resolvers.values())
+            outcomes.extend(
+                IdentifiersResolver.failed(o, errors) for o in chunk_outcomes
+            )
+
+        return outcomes
+
 
 class ClassificationQuerySet(DateframeableQuerySet):
-    pass
+
+    def _ids_by_key(self, keys):
+        """Fetch the ids of the classifications having the given
+        (scheme, code, descr) keys, with one query"""
+        wanted = set(keys)
+        filters = Q(scheme__in=set(k[0] for k in wanted))
+        for n, field in ((1, 'code'), (2, 'descr')):
+            values = set(k[n] for k in wanted)
+            q = Q(**{'{0}__in'.format(field): values - set([None])})
+            if None in values:
+                q |= Q(**{'{0}__isnull'.format(field): True})
+            filters &= q
+        return dict(
+            ((scheme, code, descr), pk)
+            for pk, scheme, code, descr in self.filter(filters).values_list(
+                'pk', 'scheme', 'code', 'descr'
+            ) if (scheme, code, descr) in wanted
+        )
+
+    def ids_for(self, keys, defaults=None, errors=None):
+        """Return the ids of the classifications with the given keys,
+        creating the missing ones
+
+        Ids are looked up in the process-wide ``classifications_cache``
+        first, then with a single query; missing classifications are
+        created with ``bulk_create``. The cache is filled when the
+        current transaction is committed.
+
+        :param keys: iterable of (scheme, code, descr) tuples
+        :param defaults: dict mapping keys to dicts with the values
+            of the other fields of the classifications to be created
+        :param errors: dict, filled with the exceptions raised building
+            the classifications that could not be created;
+            if not given, exceptions are raised
+        :return: dict mapping keys to ids
+        """
+        from popolo.models import classifications_cache, \
+            prepare_dateframeable
+
+        defaults = defaults or {}
+        ids = {}
+        misses = []
+        for k in keys:
+            if k in ids or k in misses:
+                continue
+            pk = classifications_cache.get(k)
+            if pk is None:
+                misses.append(k)
+            else:
+                ids[k] = pk
+        if not misses:
+            return ids
+
+        found = self._ids_by_key(misses)
+        new = []
+        for k in misses:
+            if k in found:
+                continue
+            try:
+                c = self.model(
+                    scheme=k[0], code=k[1], descr=k[2],
+                    **defaults.get(k, {})
+                )
+                prepare_dateframeable(c)
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors[k] = e
+                continue
+            new.append(c)
+
+        if new:
+            try:
+                with transaction.atomic(using=self.db):
+                    self.bulk_create(new)
+            except IntegrityError:
+                # created in the meanwhile, by someone else
+                for c in new:
+                    self.get_or_create(
+                        scheme=c.scheme, code=c.code, descr=c.descr,
+                        defaults=defaults.get((c.scheme, c.code, c.descr))
+                    )
+            found = self._ids_by_key(misses)
+
+        set_on_commit(classifications_cache, found.items(), using=self.db)
+        ids.update(found)
+        return ids
+
+
+class URLQuerySet(models.query.QuerySet):
+    """
+    A custom ``QuerySet`` for models identified by an URL, such as
+    Source and Link, assigned to objects of any model through
+    a relation model, e.g. SourceRel.
+
+    URLs are resolved to ids through a process-wide LRU cache,
+    defined in subclasses; the cache is filled when the current
+    transaction is committed.
+    """
+
+    cache = None
+
+    def _ids_by_url(self, urls):
+        """Fetch the ids of the rows having the given URLs, with one
+        query; the oldest row wins, when an URL is repeated"""
+        found = {}
+        for pk, url in self.filter(url__in=set(urls)).order_by(
+            '-pk'
+        ).values_list('pk', 'url'):
+            found[url] = pk
+        return found
+
+    def ids_for(self, urls, defaults=None, errors=None):
+        """Return the ids of the rows having the given URLs,
+        creating the missing ones
+
+        :param urls: iterable of URLs
+        :param defaults: dict mapping URLs to dicts with the values
+            of the other fields of the rows to be created
+        :param errors: dict, filled with the exceptions raised building
+            the rows that could not be created;
+            if not given, exceptions are raised
+        :return: dict mapping URLs to ids
+        """
+        defaults = defaults or {}
+        ids = {}
+        misses = []
+        for url in urls:
+            if url in ids or url in misses:
+                continue
+            pk = self.cache.get(url)
+            if pk is None:
+                misses.append(url)
+            else:
+                ids[url] = pk
+        if not misses:
+            return ids
+
+        found = self._ids_by_url(misses)
+        new = []
+        for url in misses:
+            if url in found:
+                continue
+            try:
+                new.append(self.model(url=url, **defaults.get(url, {})))
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors[url] = e
+        if new:
+            self.bulk_create(new)
+            found = self._ids_by_url(misses)
+
+        set_on_commit(self.cache, found.items(), using=self.db)
+        ids.update(found)
+        return ids
+
+    def bulk_add_for(self, objects, rows, batch_size=500):
+        """Assign rows to many objects, with the rules of
+        ``add_source`` and ``add_link``
+
+        Objects are processed in chunks of ``batch_size``; for each chunk
+        URLs are resolved with ``ids_for``, the existing relations are
+        fetched with one query, and the new relations are created
+        with ``bulk_create``, within a transaction.
+
+        :param objects: saved instances, of any model
+        :param rows: for each object, the list of dicts with ``url``
+            and the values of the other fields
+        :param batch_size: the number of objects processed in a chunk
+        :return: for each object, the list of ItemOutcome of its rows,
+            having the relations as instances
+        """
+        from popolo.models import ItemOutcome
+
+        objects = list(objects)
+        rows = [list(r) for r in rows]
+        if len(objects) != len(rows):
+            raise ValueError(
+                "The number of objects and of rows lists must be the same"
+            )
+
+        fk = self.model._meta.get_field('related_objects').field
+        rel_model = fk.model
+
+        outcomes = []
+        for chunk in chunks(range(len(objects)), batch_size):
+            keys, content_types, q = _generic_targets(
+                [objects[n] for n in chunk]
+            )
+
+            urls = []
+            defaults = {}
+            for n in chunk:
+                for row in rows[n]:
+                    if 'url' in row:
+                        kwargs = dict(row)
+                        url = kwargs.pop('url')
+                        defaults.setdefault(url, kwargs)
+                        urls.append(url)
+
+            with transaction.atomic(using=self.db):
+                errors = {}
+                ids = self.ids_for(urls, defaults=defaults, errors=errors)
+                rels = dict(
+                    ((r.content_type_id, r.object_id, getattr(r, fk.attname)), r)
+                    for r in rel_model.objects.filter(
+                        q, **{'{0}__in'.format(fk.attname): set(ids.values())}
+                    )
+                )
+
+                new_rels = []
+                for n, key in zip(chunk, keys):
+                    object_outcomes = []
+                    for row in rows[n]:
+                        if 'url' not in row:
+                            object_outcomes.append(ItemOutcome(
+                                row, ItemOutcome.FAILED, None,
+                                KeyError('url')
+                            ))
+                            continue
+                        url = row['url']
+                        if url in errors:
+                            object_outcomes.append(ItemOutcome(
+                                row, ItemOutcome.FAILED, None, errors[url]
+                            ))
+                            continue
+                        rel_key = key + (ids[url],)
+                        if rel_key in rels:
+                            object_outcomes.append(ItemOutcome(
+                                row, ItemOutcome.UNCHANGED, rels[rel_key],
+                                None
+                            ))
+                            continue
+                        r = rel_model(
+                            content_type=content_types[key], object_id=key[1],
+                            **{fk.attname: ids[url]}
+                        )
+                        rels[rel_key] = r
+                        new_rels.append(r)
+                        object_outcomes.append(ItemOutcome(
+                            row, ItemOutcome.CREATED, r, None
+                        ))
+                    outcomes.append(object_outcomes)
+
+                if new_rels:
+                    rel_model.objects.bulk_create(new_rels)
+
+        return outcomes
+
+
+class SourceQuerySet(URLQuerySet):
+    # url -> Source id
+    cache = LRUCache(maxsize=10000)
+
+
+class LinkQuerySet(URLQuerySet):
+    # url -> Link id
+    cache = LRUCache(maxsize=10000)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Implements tests of the map of the content types of the popolo models.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from popolo import prefetch
+from popolo.models import (
+    Area, ContactDetail, Identifier, Link, Organization, Person
+)
+from popolo.utils import content_types
+
+
+class ContentTypesTestCase(TestCase):
+
+    def setUp(self):
+        self.person = Person.objects.create(name='Persona')
+        self.organization = Organization.objects.create(name='Org')
+
+    def content_type_queries(self, queries):
+        return [
+            q['sql'] for q in queries
+            if 'django_content_type' in q['sql']
+        ]
+
+    def test_get_content_type(self):
+        content_types.clear()
+        ContentType.objects.clear_cache()
+        # all popolo models are fetched with a single query
+        with self.assertNumQueries(1):
+            ct = content_types.get_content_type(Person)
+            content_types.get_content_type(self.organization)
+            content_types.get_content_type_id(Area)
+        self.assertEqual(ct, ContentType.objects.get_for_model(Person))
+        self.assertEqual(
+            content_types.get_content_type_id(self.organization),
+            ContentType.objects.get_for_model(Organization).id
+        )
+
+    def test_other_models(self):
+        self.assertEqual(
+            content_types.get_content_type(ContentType),
+            ContentType.objects.get_for_model(ContentType)
+        )
+
+    def test_clear(self):
+        content_types.warm()
+        # as after a migration of the default database
+        content_types.clear(using='default')
+        ContentType.objects.clear_cache()
+        with self.assertNumQueries(1):
+            content_types.get_content_type(Person)
+
+    def test_no_content_type_queries(self):
+        content_types.clear()
+        ContentType.objects.clear_cache()
+        content_types.warm()
+        objects = [self.person, self.organization]
+        with CaptureQueriesContext(connection) as queries:
+            self.person.add_identifier('P1', 'TEST')
+            self.person.add_other_name('Persona Bis')
+            self.person.add_link('http://example.com/p1')
+            self.organization.add_source('http://example.com/o1')
+            self.organization.add_classification('TEST', code='1')
+            Identifier.objects.bulk_upsert_for(
+                objects, [[{'identifier': 'X', 'scheme': 'BULK'}]] * 2
+            )
+            ContactDetail.objects.bulk_add_for(objects, [[{
+                'contact_type': 'EMAIL', 'value': 'info@example.com',
+                'label': 'email',
+            }]] * 2)
+            Link.objects.bulk_add_for(
+                objects, [[{'url': 'http://example.com/bulk'}]] * 2
+            )
+            prefetch.generic(objects, 'identifiers', 'links')
+        self.assertEqual(self.content_type_queries(queries), [])
+        self.assertEqual(self.person.identifiers.count(), 2)
+        self.assertEqual(self.organization.contact_details.count(), 1)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Implements tests of the Popolo JSON exporter.
+"""
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import six
+
+from popolo.exporters.popolo_json import PopoloJSONExporter
+from popolo.importers.popolo_json import PopoloJSONImporter
+from popolo.models import Area, Membership, Organization, Person, Post
+from popolo.tests.test_importers import EXPORT
+
+
+class PopoloJSONExporterTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        path = os.path.join(self.tmpdir, 'import.json')
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(six.text_type(json.dumps(EXPORT)))
+        logging.disable(logging.WARNING)
+        PopoloJSONImporter().import_from_export_json(path)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.tmpdir)
+
+    def export(self, **kwargs):
+        out = six.StringIO()
+        PopoloJSONExporter(**kwargs).export(out)
+        return json.loads(out.getvalue())
+
+    def test_export(self):
+        data = self.export(batch_size=1)
+        self.assertEqual(
+            list(data), ['areas', 'organizations', 'persons', 'posts',
+                         'memberships']
+        )
+        self.assertEqual(len(data['persons']), 2)
+
+        mario = Person.objects.get(name='Mario Rossi')
+        p = [p for p in data['persons'] if p['id'] == str(mario.pk)][0]
+        self.assertEqual(p['birth_date'], '1950-01-01')
+        self.assertEqual(p['identifiers'], [
+            {'identifier': 'RSSMRA50A01H501U', 'scheme': 'CF'}
+        ])
+        self.assertEqual(p['other_names'], [{'name': 'Super Mario'}])
+        self.assertEqual(p['contact_details'], [
+            {'type': 'email', 'value': 'm@example.com'}
+        ])
+        self.assertEqual(p['links'], [
+            {'url': 'http://example.com/mario', 'note': 'home'}
+        ])
+
+        partito = Organization.objects.get(name='Partito')
+        m = [
+            m for m in data['memberships']
+            if m.get('member', {}).get('id') == str(partito.pk)
+        ][0]
+        self.assertEqual(m['member']['@type'], 'Organization')
+        self.assertNotIn('person_id', m)
+
+    def test_queries_per_chunk(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                PopoloJSONExporter(batch_size=100).export(
+                    six.StringIO(), collections=['persons']
+                )
+            return len(queries)
+
+        n = count_queries()
+        for i in range(10):
+            Person.objects.create(name='Persona {0}'.format(i))
+        self.assertEqual(count_queries(), n)
+
+    def test_roundtrip(self):
+        path = os.path.join(self.tmpdir, 'export.ndjson')
+        counts = PopoloJSONExporter().export_to_file(path)
+        self.assertEqual(counts['memberships'], 3)
+
+        for model in (Membership, Post, Person, Organization, Area):
+            model.objects.all().delete()
+        stats = PopoloJSONImporter().import_from_export_json(path)
+        self.assertEqual(
+            [stats[c]['created'] for c in stats], [3, 3, 2, 1, 3]
+        )
+        self.assertEqual(
+            Organization.objects.get(name='Camera dei deputati').parent.name,
+            'Parlamento'
+        )
+        self.assertEqual(
+            Person.objects.get(name='Mario Rossi').identifiers.get().scheme,
+            'CF'
+        )
+
+    def test_command(self):
+        out = six.StringIO()
+        call_command(
+            'popolo_export_json', '-', format='ndjson',
+            collections=['persons'], stdout=out
+        )
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['_type'], 'person')
@@ -0,0 +1,539 @@
+# -*- coding: utf-8 -*-
+"""
+Implements tests of the Popolo JSON importer.
+"""
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from django.core.management import call_command, CommandError
+from unittest import skipIf, skipUnless
+
+from django.db import connection
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import six
+
+from popolo.importers.idmap import IdMap
+from popolo.indexes import get_index
+from popolo.importers.pipeline import Pipeline
+from popolo.importers.popolo_json import PopoloJSONImporter
+from popolo.importers.reader import iter_export, PopoloJSONError
+from popolo.models import Area, Identifier, ImportedChunk, Membership, \
+    Organization, OtherName, Person, Post
+
+
+EXPORT = {
+    'meta': {'version': 1, 'tags': [1, 2, 3]},
+    # memberships come before the persons and organizations they refer to
+    'memberships': [
+        {
+            'id': 'm1', 'person_id': 'p1', 'organization_id': 'o2',
+            'post_id': 'post1', 'start_date': '2013-03-15',
+            'sources': [{'url': 'http://example.com/m1'}],
+        },
+        {
+            'id': 'm2', 'member': {'@type': 'Organization', 'id': 'o1'},
+            'organization_id': 'o2', 'start_date': '2014',
+        },
+        {
+            'id': 'm3', 'member': {'@type': 'Person', 'id': 'p2'},
+            'organization_id': 'o1', 'role': 'Presidente',
+        },
+        # unknown person
+        {'id': 'm4', 'person_id': 'p99', 'organization_id': 'o1'},
+    ],
+    'persons': [
+        {
+            'id': 'p1', 'name': u'Mario Rossi', 'birth_date': '1950-01-01',
+            'email': 'mario@example.com',
+            'identifiers': [
+                {'identifier': 'RSSMRA50A01H501U', 'scheme': 'CF'}
+            ],
+            'other_names': [{'name': 'Super Mario'}],
+            'contact_details': [{'type': 'email', 'value': 'm@example.com'}],
+            'links': [{'url': 'http://example.com/mario', 'note': 'home'}],
+        },
+        {'id': 'p2', 'name': u'Nicolò Bianchi', 'death_date': '2010'},
+        # a repeated id
+        {'id': 'p2', 'name': u'Nicolò Bianchi'},
+        # an invalid date
+        {'id': 'p3', 'name': u'Giovanna Verdi', 'birth_date': '1950-13'},
+    ],
+    'organizations': [
+        {
+            'id': 'o1', 'name': 'Partito', 'founding_date': '1990',
+            'area_id': 'a1',
+        },
+        {
+            'id': 'o2', 'name': 'Camera dei deputati', 'parent_id': 'o3',
+            'sources': [{'url': 'http://example.com/camera'}],
+        },
+        {'id': 'o3', 'name': 'Parlamento'},
+    ],
+    'posts': [
+        {'id': 'post1', 'label': 'Deputato', 'organization_id': 'o2'},
+    ],
+    'areas': [
+        {'id': 'a1', 'name': 'Lazio', 'identifier': '12', 'parent_id': 'a2'},
+        {'id': 'a2', 'name': 'Italia', 'identifier': 'IT'},
+        {'id': 'a3', 'name': 'Roma'},
+    ],
+}
+
+
+class ReaderTestCase(TestCase):
+
+    def test_iter_export(self):
+        text = json.dumps(EXPORT)
+        for chunk_size in (1, 7, 65536):
+            records = list(iter_export(io.StringIO(text), chunk_size))
+            self.assertEqual(
+                [r['id'] for c, r in records if c == 'persons'],
+                ['p1', 'p2', 'p2', 'p3']
+            )
+            self.assertEqual(len(records), 15)
+            self.assertEqual(records[0][1], EXPORT[records[0][0]][0])
+
+    def test_iter_export_empty_and_invalid(self):
+        self.assertEqual(list(iter_export(io.StringIO(u'{}'))), [])
+        self.assertEqual(
+            list(iter_export(io.StringIO(u'{"persons": []}'))), []
+        )
+        with self.assertRaises(PopoloJSONError):
+            list(iter_export(io.StringIO(u'{"persons": [{"id": 1}')))
+        with self.assertRaises(PopoloJSONError):
+            list(iter_export(io.StringIO(u'["persons"]')))
+
+
+class IdMapTestCase(TestCase):
+
+    def test_spill(self):
+        id_map = IdMap(max_memory=10)
+        try:
+            id_map.set_many('persons', [(n, n * 10) for n in range(8)])
+            self.assertFalse(id_map.spilled)
+            id_map.set_many('areas', [('a', 1), ('b', 2), ('c', 3)])
+            self.assertTrue(id_map.spilled)
+            self.assertEqual(len(id_map), 11)
+            self.assertEqual(id_map.get('persons', 3), 30)
+            self.assertEqual(id_map.get('persons', 'a'), None)
+            self.assertEqual(
+                id_map.get_many('areas', ['a', 'c', 'd']),
+                {'a': 1, 'c': 3}
+            )
+        finally:
+            id_map.close()
+
+    def test_persistent(self):
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, 'ids.sqlite3')
+        try:
+            id_map = IdMap(path=path)
+            id_map.set_many('persons', [('p1', 1), ('p2', 2)])
+            id_map.close()
+            id_map = IdMap(path=path)
+            self.assertEqual(id_map.get('persons', 'p2'), 2)
+            self.assertEqual(len(id_map), 2)
+            id_map.close()
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class PipelineTestCase(SimpleTestCase):
+
+    def test_partitions_keep_order(self):
+        processed = []
+        threads = {}
+
+        def process(task):
+            partition, n = task
+            processed.append(task)
+            threads.setdefault(partition, set()).add(
+                threading.current_thread().name
+            )
+
+        tasks = [(n % 3, (n % 3, n)) for n in range(30)]
+        tasks += [(None, (-1, n)) for n in range(30, 40)]
+        Pipeline(workers=3).run(iter(tasks), process)
+
+        self.assertEqual(sorted(processed), sorted(t for p, t in tasks))
+        for partition in range(3):
+            numbers = [n for p, n in processed if p == partition]
+            self.assertEqual(numbers, sorted(numbers))
+            # a partition is processed by a single worker
+            self.assertEqual(len(threads[partition]), 1)
+
+    def test_single_worker(self):
+        processed = []
+        Pipeline().run([(None, 1), ('a', 2)], processed.append)
+        self.assertEqual(processed, [1, 2])
+
+    def test_error(self):
+        def process(task):
+            if task == 5:
+                raise ValueError(task)
+
+        with self.assertRaises(ValueError):
+            Pipeline(workers=2).run(((None, n) for n in range(100)), process)
+
+
+class ImporterTestMixin(object):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # failures are logged as warnings
+        logging.disable(logging.WARNING)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.tmpdir)
+
+    def write_export(self, name='export.json'):
+        path = os.path.join(self.tmpdir, name)
+        with io.open(path, 'w', encoding='utf-8') as f:
+            if name.endswith('.json'):
+                f.write(six.text_type(json.dumps(EXPORT)))
+            else:
+                for collection in ('memberships', 'persons', 'areas',
+                                   'organizations', 'posts'):
+                    for record in EXPORT[collection]:
+                        record = dict(record, _type=collection[:-1])
+                        f.write(six.text_type(json.dumps(record)) + u'\n')
+        return path
+
+    def check_import(self, stats):
+        def counts(collection):
+            return dict(
+                (k, stats[collection][k])
+                for k in ('created', 'skipped', 'failed')
+            )
+
+        self.assertEqual(counts('persons'), {
+            'created': 2, 'skipped': 1, 'failed': 1
+        })
+        self.assertEqual(counts('memberships'), {
+            'created': 3, 'skipped': 0, 'failed': 1
+        })
+        self.assertEqual(stats['areas']['created'], 3)
+
+        p = Person.objects.get(name='Mario Rossi')
+        self.assertEqual(p.start_date, '1950-01-01')
+        self.assertEqual(p.identifiers.get().identifier, 'RSSMRA50A01H501U')
+        self.assertEqual(p.other_names.get().name, 'Super Mario')
+        self.assertEqual(p.contact_details.get().contact_type, 'EMAIL')
+        self.assertEqual(p.links.get().link.note, 'home')
+
+        camera = Organization.objects.get(name='Camera dei deputati')
+        self.assertEqual(camera.parent.name, 'Parlamento')
+        self.assertEqual(camera.sources.count(), 1)
+        self.assertEqual(
+            Organization.objects.get(name='Partito').area.parent.name,
+            'Italia'
+        )
+        self.assertEqual(Area.objects.get(name='Roma').identifier, 'a3')
+
+        m = Membership.objects.get(person=p)
+        self.assertEqual(m.post, Post.objects.get(label='Deputato'))
+        self.assertEqual(m.organization, camera)
+        self.assertEqual(m.sources.count(), 1)
+        self.assertEqual(
+            Membership.objects.get(member_organization__name='Partito')
+            .organization, camera
+        )
+        self.assertEqual(
+            Membership.objects.get(person__name=u'Nicolò Bianchi').role,
+            'Presidente'
+        )
+
+
+
+class PopoloJSONImporterTestCase(ImporterTestMixin, TestCase):
+
+    def test_import_from_export_json(self):
+        importer = PopoloJSONImporter(batch_size=2)
+        self.check_import(importer.import_from_export_json(self.write_export()))
+
+    @skipIf(
+        connection.vendor == 'postgresql',
+        "workers commit outside of the test transaction, "
+        "see ConcurrentImportTestCase"
+    )
+    def test_import_with_workers(self):
+        # a single worker is used on SQLite
+        importer = PopoloJSONImporter(batch_size=2, workers=2)
+        self.check_import(importer.import_from_export_json(self.write_export()))
+        self.assertEqual(list(importer.timings), [
+            'areas', 'organizations', 'persons, posts', 'memberships'
+        ])
+        self.assertEqual(importer.timings['persons, posts'][0], 4)
+
+    def test_resume(self):
+        checkpoint = os.path.join(self.tmpdir, 'checkpoint')
+        path = self.write_export()
+
+        class Interrupted(PopoloJSONImporter):
+            def import_chunk(self, collection, records):
+                if collection == 'persons' and records[0]['id'] == 'p3':
+                    raise RuntimeError("interrupted")
+                super(Interrupted, self).import_chunk(collection, records)
+
+        importer = Interrupted(batch_size=2, checkpoint=checkpoint)
+        with self.assertRaises(RuntimeError):
+            importer.import_from_export_json(path)
+        self.assertEqual(Person.objects.count(), 2)
+        self.assertTrue(os.path.exists(os.path.join(checkpoint, 'state.json')))
+
+        with self.assertRaises(ValueError):
+            PopoloJSONImporter(
+                checkpoint=checkpoint, resume=True
+            ).import_from_export_json(self.write_export('other.json'))
+
+        # the batch size of the interrupted import is used
+        importer = PopoloJSONImporter(
+            batch_size=100, checkpoint=checkpoint, resume=True
+        )
+        self.check_import(importer.import_from_export_json(path))
+        self.assertEqual(list(importer.timings), [
+            'persons, posts', 'memberships'
+        ])
+        self.assertEqual(importer.timings['persons, posts'][0], 2)
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_resume_after_commit(self):
+        checkpoint = os.path.join(self.tmpdir, 'checkpoint')
+        path = self.write_export()
+
+        class Interrupted(PopoloJSONImporter):
+            def created(self, collection, items, changed=()):
+                # the chunk is committed, the checkpoint is not saved
+                if collection == 'memberships':
+                    raise RuntimeError("interrupted")
+                super(Interrupted, self).created(collection, items, changed)
+
+        importer = Interrupted(batch_size=2, checkpoint=checkpoint)
+        with self.assertRaises(RuntimeError):
+            importer.import_from_export_json(path)
+        self.assertEqual(Membership.objects.count(), 2)
+        self.assertEqual(
+            ImportedChunk.objects.filter(collection='memberships').count(), 1
+        )
+
+        importer = PopoloJSONImporter(checkpoint=checkpoint, resume=True)
+        self.check_import(importer.import_from_export_json(path))
+        self.assertEqual(Membership.objects.count(), 3)
+        self.assertEqual(importer.timings['memberships'][0], 2)
+        self.assertFalse(ImportedChunk.objects.exists())
+
+    def test_populated_tables(self):
+        path = self.write_export()
+        PopoloJSONImporter().import_from_export_json(path)
+
+        # the rows would be duplicated
+        with self.assertRaises(ValueError):
+            PopoloJSONImporter().import_from_export_json(path)
+        with self.assertRaises(CommandError):
+            call_command(
+                'popolo_create_from_popit', path, stdout=six.StringIO()
+            )
+        self.assertEqual(Person.objects.count(), 2)
+
+        PopoloJSONImporter(append=True).import_from_export_json(path)
+        self.assertEqual(Person.objects.count(), 4)
+
+    def test_diff(self):
+        id_map = os.path.join(self.tmpdir, 'ids.sqlite3')
+        path = self.write_export()
+        self.check_import(
+            PopoloJSONImporter(diff=id_map).import_from_export_json(path)
+        )
+        updated_at = Person.objects.get(name='Mario Rossi').updated_at
+
+        stats = PopoloJSONImporter(diff=id_map).import_from_export_json(path)
+        self.assertEqual(stats['persons'], {
+            'created': 0, 'updated': 0, 'unchanged': 2, 'deleted': 0,
+            'skipped': 1, 'failed': 1
+        })
+        self.assertEqual(stats['memberships']['unchanged'], 3)
+        self.assertEqual(
+            Person.objects.get(name='Mario Rossi').updated_at, updated_at
+        )
+
+        export = json.loads(json.dumps(EXPORT))
+        export['persons'][0]['name'] = 'Mario Bianchi'
+        export['persons'][1:3] = [{'id': 'p4', 'name': 'Anna Neri'}]
+        del export['memberships'][2]
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(six.text_type(json.dumps(export)))
+
+        out = six.StringIO()
+        call_command(
+            'popolo_create_from_popit', path, diff=id_map, stdout=out
+        )
+        self.assertIn(
+            'persons: 1 created, 1 updated, 0 unchanged, 1 deleted, '
+            '0 skipped, 1 failed', out.getvalue()
+        )
+        self.assertIn('total: 1 inserted, 1 updated, 2 deleted', out.getvalue())
+        self.assertEqual(
+            sorted(Person.objects.values_list('name', flat=True)),
+            ['Anna Neri', 'Mario Bianchi']
+        )
+        p = Person.objects.get(name='Mario Bianchi')
+        self.assertGreater(p.updated_at, updated_at)
+        self.assertEqual(p.identifiers.count(), 1)
+        self.assertEqual(p.other_names.count(), 1)
+        self.assertEqual(p.memberships.count(), 1)
+        self.assertEqual(Membership.objects.count(), 2)
+
+    def test_import_from_ndjson_spilling_ids(self):
+        importer = PopoloJSONImporter(batch_size=2, max_memory_ids=3)
+        self.check_import(
+            importer.import_from_export_json(self.write_export('e.ndjson'))
+        )
+
+    def test_truncate(self):
+        path = os.path.join(self.tmpdir, 'export.json')
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(six.text_type(json.dumps({'persons': [
+                {'id': 'p1', 'name': 'Mario Rossi', 'honorific_prefix': 'x' * 40}
+            ]})))
+
+        stats = PopoloJSONImporter().import_from_export_json(path)
+        self.assertEqual(stats['persons']['failed'], 1)
+
+        stats = PopoloJSONImporter(truncate='yes').import_from_export_json(path)
+        self.assertEqual(stats['persons']['created'], 1)
+        self.assertEqual(Person.objects.get().honorific_prefix, 'x' * 32)
+
+    def test_command(self):
+        out = six.StringIO()
+        call_command(
+            'popolo_create_from_popit', self.write_export(), stdout=out
+        )
+        self.assertIn('persons: 2 created, 1 skipped, 1 failed', out.getvalue())
+        self.assertIn('stage memberships: 4 records', out.getvalue())
+        self.assertEqual(Person.objects.count(), 2)
+
+
+class ImporterIndexesTestCase(TransactionTestCase):
+    """Interval indexes agree with the database after an import,
+    written with bulk queries"""
+
+    models = (Person, Organization, Membership, Identifier, OtherName)
+
+    def setUp(self):
+        # indexes are process-wide, and tables are emptied between tests
+        for model in self.models:
+            get_index(model).invalidate()
+        self.tmpdir = tempfile.mkdtemp()
+        logging.disable(logging.WARNING)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.tmpdir)
+
+    def import_export(self, export, id_map):
+        path = os.path.join(self.tmpdir, 'export.json')
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(six.text_type(json.dumps(export)))
+        PopoloJSONImporter(diff=id_map).import_from_export_json(path)
+
+    def assertIndexesConsistent(self):
+        for model in self.models:
+            for moment in ('1960-01-01', '2012-01-01', '2015-01-01'):
+                self.assertEqual(
+                    sorted(get_index(model).active_at(moment)),
+                    sorted(
+                        model.objects.current(moment).values_list(
+                            'id', flat=True
+                        )
+                    )
+                )
+
+    def test_import(self):
+        # the indexes are built before the import
+        self.assertIndexesConsistent()
+        id_map = os.path.join(self.tmpdir, 'ids.sqlite3')
+        self.import_export(EXPORT, id_map)
+        self.assertIndexesConsistent()
+
+        export = json.loads(json.dumps(EXPORT))
+        export['persons'][1]['death_date'] = '2013'
+        export['memberships'][0]['end_date'] = '2014-01-01'
+        self.import_export(export, id_map)
+        self.assertIndexesConsistent()
+
+
+@skipUnless(
+    connection.vendor == 'postgresql',
+    "chunks are written concurrently on PostgreSQL only"
+)
+class ConcurrentImportTestCase(ImporterTestMixin, TransactionTestCase):
+    """Imports with many workers, each with its own connection;
+    run with ``POPOLO_DB_ENGINE=postgresql`` (see ``runtests.py``)"""
+
+    def test_import_from_export_json(self):
+        importer = PopoloJSONImporter(batch_size=2, workers=2)
+        self.check_import(importer.import_from_export_json(self.write_export()))
+        self.assertEqual(importer.timings['persons, posts'][0], 4)
+
+    def write_large_export(self):
+        export = {
+            # few names, so that chunks written concurrently
+            # allocate the same slugs
+            'persons': [
+                {'id': 'p{0}'.format(n), 'name': 'Persona {0}'.format(n % 3)}
+                for n in range(60)
+            ],
+            # parents in later chunks, written by other workers
+            'organizations': [
+                dict(
+                    {'id': 'o{0}'.format(n), 'name': 'Org {0}'.format(n % 2)},
+                    **({'parent_id': 'o{0}'.format(n + 7)} if n < 23 else {})
+                ) for n in range(30)
+            ],
+            # memberships without ids, partitioned by person
+            'memberships': [
+                {
+                    'person_id': 'p{0}'.format(n % 60),
+                    'organization_id': 'o{0}'.format(n % 30),
+                    'start_date': '{0}'.format(1990 + n // 60),
+                    'end_date': '{0}-06'.format(1990 + n // 60),
+                } for n in range(240)
+            ],
+        }
+        path = os.path.join(self.tmpdir, 'export.json')
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(six.text_type(json.dumps(export)))
+        return path
+
+    def test_import_with_workers(self):
+        importer = PopoloJSONImporter(batch_size=5, workers=4)
+        stats = importer.import_from_export_json(self.write_large_export())
+
+        self.assertEqual(importer.workers, 4)
+        self.assertEqual(stats['persons']['created'], 60)
+        self.assertEqual(stats['organizations']['created'], 30)
+        self.assertEqual(stats['memberships']['created'], 240)
+        self.assertEqual(stats['memberships']['failed'], 0)
+
+        for model in (Person, Organization, Membership):
+            slugs = model.objects.values_list('slug', flat=True)
+            self.assertEqual(len(set(slugs)), len(slugs))
+        self.assertEqual(
+            Organization.objects.filter(parent__isnull=False).count(), 23
+        )
+        # memberships of each person, written in order by a worker
+        self.assertEqual(
+            set(
+                Person.objects.annotate(n=Count('memberships')).values_list(
+                    'n', flat=True
+                )
+            ),
+            set([4])
+        )
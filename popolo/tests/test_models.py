@@ -5,13 +5,23 @@ Implements tests specific to the popolo module.
 Run with "manage.py test popolo, or with python".
 """
 from datetime import datetime, timedelta
-from django.test import TestCase
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import pre_save
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.text import slugify
 from popolo.behaviors.tests import TimestampableTests, DateframeableTests, \
     PermalinkableTests
 from popolo.models import Person, Organization, Post, ContactDetail, Area, \
     Membership, Ownership, PersonalRelationship, ElectoralEvent, \
     ElectoralResult, Language, Identifier, OverlappingIntervalError, \
-    Classification, ClassificationRel, Source, SourceRel, Link, LinkRel
+    Classification, ClassificationRel, Source, SourceRel, Link, LinkRel, \
+    ItemOutcome, OtherName, classifications_cache
+from popolo.indexes import get_index
+from popolo.utils import PartialDate
+from popolo.validation import deferred, is_deferred, validate_instances
 from faker import Factory
 
 faker = Factory.create('it_IT')  # a factory to create fake names for tests
@@ -39,6 +49,22 @@ class ContactDetailTestsMixin(object):
         i.add_contact_details(contacts)
         self.assertEqual(i.contact_details.count(), 2)
 
+    def test_add_contact_details_skips_existing_values(self):
+        i = self.create_instance()
+        email = faker.email()
+        i.add_contact_detail(
+            contact_type=ContactDetail.CONTACT_TYPES.email, value=email
+        )
+        i.add_contact_details([
+            {'contact_type': ContactDetail.CONTACT_TYPES.email,
+             'value': email},
+            {'contact_type': ContactDetail.CONTACT_TYPES.phone,
+             'value': '555 1234'},
+            {'contact_type': ContactDetail.CONTACT_TYPES.phone,
+             'value': '555 1234'},
+        ])
+        self.assertEqual(i.contact_details.count(), 2)
+
 
 class OtherNameTestsMixin(object):
 
@@ -151,6 +177,94 @@ class OtherNameTestsMixin(object):
             ])
             self.assertEqual(p.other_names.count(), 2)
 
+    def test_bulk_add_other_names(self):
+        p = self.create_instance()
+        p.add_other_name(
+            name='Old name', othername_type='FOR',
+            start_date='1950-01-01', end_date='1970-01-01'
+        )
+
+        outcomes = p.bulk_add_other_names([
+            {
+                'name': 'Older name', 'othername_type': 'FOR',
+                'end_date': '1950-01-01'
+            },
+            {
+                'name': 'Old name', 'othername_type': 'FOR',
+                'start_date': '1970-01-01', 'end_date': '1980-01-01'
+            },
+            {
+                'name': 'Wrong name', 'othername_type': 'FOR',
+                'start_date': '1975-01-01', 'end_date': '1990-01-01'
+            },
+            {
+                'name': 'Wrong name', 'othername_type': 'ALT',
+                'start_date': '1975-01-01', 'end_date': '1990-01-01'
+            },
+            {'name': 'Nickname'},
+        ])
+        self.assertEqual(
+            [o.status for o in outcomes],
+            [
+                ItemOutcome.CREATED, ItemOutcome.EXTENDED,
+                ItemOutcome.FAILED, ItemOutcome.CREATED,
+                ItemOutcome.CREATED
+            ]
+        )
+        self.assertIsInstance(outcomes[2].error, OverlappingIntervalError)
+        self.assertEqual(p.other_names.count(), 4)
+        n = p.other_names.get(name='Old name')
+        self.assertEqual(n.end_date, '1980-01-01')
+        self.assertEqual(n.end_key, PartialDate.of('1980-01-01').key)
+
+    def test_bulk_add_other_names_write_errors(self):
+        p = self.create_instance()
+        outcomes = p.bulk_add_other_names([
+            {'name': 'Nickname', 'othername_type': 'ALT'},
+            {'name': None, 'othername_type': 'FOR'},
+        ])
+        self.assertEqual(
+            [o.status for o in outcomes],
+            [ItemOutcome.CREATED, ItemOutcome.FAILED]
+        )
+        self.assertEqual(p.other_names.get().name, 'Nickname')
+
+    def test_bulk_add_other_names_overwrite(self):
+        p = self.create_instance()
+        p.add_other_name(
+            name='Old name', othername_type='FOR',
+            start_date='1950-01-01', end_date='1970-01-01'
+        )
+
+        outcomes = p.bulk_add_other_names([
+            {
+                'name': 'New name', 'othername_type': 'FOR',
+                'start_date': '1960-01-01', 'source': 'http://example.com',
+                'overwrite_overlapping': True
+            },
+        ])
+        self.assertEqual(outcomes[0].status, ItemOutcome.OVERWRITTEN)
+        n = p.other_names.get()
+        self.assertEqual(n.name, 'New name')
+        self.assertEqual(n.start_date, '1960-01-01')
+        self.assertEqual(n.end_date, None)
+        self.assertEqual(n.source, 'http://example.com')
+
+    def test_bulk_add_other_names_queries(self):
+        p = self.create_instance()
+        names = [
+            {
+                'name': faker.city(),
+                'othername_type': 'FOR',
+                'start_date': '{0}-01-01'.format(1950 + n),
+                'end_date': '{0}-12-31'.format(1950 + n),
+            } for n in range(30)
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            p.bulk_add_other_names(names)
+        self.assertLessEqual(len(ctx.captured_queries), 5)
+        self.assertEqual(p.other_names.count(), 30)
+
 
 class IdentifierTestsMixin(object):
 
@@ -585,6 +699,115 @@ class IdentifierTestsMixin(object):
         ])
         self.assertEqual(p.identifiers.count(), 2)
 
+    def test_bulk_add_identifiers_outcomes(self):
+        p = self.create_instance()
+        p.add_identifier(
+            identifier='A', scheme='ISTAT_CODE_COM',
+            start_date='1995-01-01', end_date='2006-01-01'
+        )
+
+        outcomes = p.bulk_add_identifiers([
+            {
+                'identifier': 'A',
+                'scheme': 'ISTAT_CODE_COM',
+                'start_date': '2006-01-01',
+                'end_date': '2010-01-01'
+            },
+            {
+                'identifier': 'B',
+                'scheme': 'ISTAT_CODE_COM',
+                'start_date': '2010-01-01',
+            },
+            {
+                'identifier': 'C',
+                'scheme': 'ISTAT_CODE_COM',
+                'start_date': '2012-01-01',
+            },
+            {
+                'identifier': 'B',
+                'scheme': 'ISTAT_CODE_COM',
+                'start_date': '2010-01-01',
+            },
+            {
+                'identifier': 'D',
+                'scheme': 'CF',
+                'start_date': '2010-01-01',
+                'end_date': '2009-01-01',
+            },
+        ])
+        self.assertEqual(
+            [o.status for o in outcomes],
+            [
+                ItemOutcome.EXTENDED, ItemOutcome.CREATED,
+                ItemOutcome.FAILED, ItemOutcome.UNCHANGED,
+                ItemOutcome.FAILED
+            ]
+        )
+        self.assertIsInstance(outcomes[2].error, OverlappingIntervalError)
+        self.assertIs(outcomes[3].instance, outcomes[1].instance)
+
+        self.assertEqual(p.identifiers.count(), 2)
+        a = p.identifiers.get(identifier='A')
+        self.assertEqual(a.start_date, '1995-01-01')
+        self.assertEqual(a.end_date, '2010-01-01')
+        self.assertEqual(a.end_key, PartialDate.of('2010-01-01').key)
+        b = p.identifiers.get(identifier='B')
+        self.assertEqual(b.start_key, PartialDate.of('2010-01-01').key)
+
+    def test_bulk_add_identifiers_overwrite(self):
+        p = self.create_instance()
+        p.add_identifier(
+            identifier='A', scheme='ISTAT_CODE_COM',
+            start_date='1995-01-01', end_date='2006-01-01'
+        )
+
+        outcomes = p.bulk_add_identifiers([
+            {
+                'identifier': 'B',
+                'scheme': 'ISTAT_CODE_COM',
+                'start_date': '2000-01-01',
+                'end_date': '2010-01-01',
+                'source': 'http://www.example.com',
+                'overwrite_overlapping': True
+            },
+        ])
+        self.assertEqual(outcomes[0].status, ItemOutcome.OVERWRITTEN)
+        self.assertEqual(p.identifiers.count(), 1)
+        self.assertEqual(p.identifiers.get().identifier, 'B')
+
+    def test_bulk_add_identifiers_queries(self):
+        p = self.create_instance()
+        identifiers = [
+            {
+                'identifier': faker.numerify('OP_######'),
+                'scheme': 'SCHEME_{0}'.format(n % 5),
+                'start_date': '{0}-01-01'.format(1990 + n),
+                'end_date': '{0}-12-31'.format(1990 + n),
+            } for n in range(50)
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            p.bulk_add_identifiers(identifiers)
+        self.assertLessEqual(len(ctx.captured_queries), 5)
+        self.assertEqual(p.identifiers.count(), 50)
+
+    def test_bulk_add_identifiers_write_errors(self):
+        p = self.create_instance()
+        # the null identifier fails the bulk insert, then its own save
+        outcomes = p.bulk_add_identifiers([
+            {'identifier': 'A', 'scheme': 'CF'},
+            {'identifier': None, 'scheme': 'OP'},
+            {'identifier': 'B', 'scheme': 'OP_ID'},
+        ])
+        self.assertEqual(
+            [o.status for o in outcomes],
+            [ItemOutcome.CREATED, ItemOutcome.FAILED, ItemOutcome.CREATED]
+        )
+        self.assertIsNotNone(outcomes[1].error)
+        self.assertEqual(
+            sorted(p.identifiers.values_list('identifier', flat=True)),
+            ['A', 'B']
+        )
+
 
 class ClassificationTestsMixin(object):
 
@@ -662,6 +885,38 @@ class ClassificationTestsMixin(object):
         self.assertEqual(isinstance(p.classifications.first(), ClassificationRel), True)
         self.assertEqual(p.classifications.count(), 1)
 
+    def test_bulk_add_classifications(self):
+        p = self.create_instance()
+        scheme = faker.text(max_nb_chars=12)
+        p.add_classification(scheme=scheme, code='01', descr='First')
+        Classification.objects.create(scheme=scheme, code='02', descr=None)
+
+        outcomes = p.bulk_add_classifications([
+            {'scheme': scheme, 'code': '01', 'descr': 'First'},
+            {'scheme': scheme, 'code': '02'},
+            {'scheme': scheme, 'code': '03', 'descr': 'Third'},
+            {'scheme': scheme, 'code': '03', 'descr': 'Third'},
+            {'scheme': scheme, 'descr': 'Fourth'},
+            {'scheme': scheme},
+        ])
+        self.assertEqual(
+            [o.status for o in outcomes],
+            [
+                ItemOutcome.UNCHANGED, ItemOutcome.CREATED,
+                ItemOutcome.CREATED, ItemOutcome.UNCHANGED,
+                ItemOutcome.CREATED, ItemOutcome.FAILED
+            ]
+        )
+        self.assertEqual(p.classifications.count(), 4)
+        self.assertEqual(
+            Classification.objects.filter(scheme=scheme).count(), 4
+        )
+        self.assertEqual(
+            p.classifications.filter(
+                classification__code='02', classification__descr__isnull=True
+            ).count(), 1
+        )
+
     def test_add_classificatio_no_descr_no_code_fails(self):
         p = self.create_instance()
         with self.assertRaises(Exception):
@@ -778,6 +1033,20 @@ class PersonTestCase(
         p.add_membership(o)
         self.assertEqual(p.memberships.count(), 1)
 
+    def test_add_membership_overlap_check_is_a_single_query(self):
+        p = self.create_instance(name=faker.name(), birth_date=faker.year())
+        o = Organization.objects.create(name=faker.company())
+        for year in range(1980, 2000):
+            p.add_membership(
+                o, start_date=str(year), end_date='{0}-06'.format(year)
+            )
+        self.assertEqual(p.memberships.count(), 20)
+
+        with CaptureQueriesContext(connection) as ctx:
+            m = p.add_membership(o, start_date='1990-03', end_date='1991')
+        self.assertIsNone(m)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
     def test_add_membership_with_date(self):
         p = self.create_instance(name=faker.name(), birth_date=faker.year())
         o = Organization.objects.create(name=faker.company())
@@ -1633,3 +1902,545 @@ class AreaTestCase(
         self.assertEqual(a.end_date, '2014-04-23')
         self.assertEqual(a1.start_date, '2014-04-23')
 
+
+
+class DateframeableIndexTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.index = get_index(Person)
+        self.index.invalidate()
+
+    def create_person(self):
+        start_date = faker.date() if faker.boolean(80) else None
+        end_date = faker.date() if faker.boolean(80) else None
+        if start_date and end_date and start_date > end_date:
+            start_date, end_date = end_date, start_date
+        return Person.objects.create(
+            name=faker.name(), start_date=start_date, end_date=end_date
+        )
+
+    def assertIndexConsistent(self):
+        for n in range(10):
+            moment = faker.date()
+            self.assertEqual(
+                sorted(self.index.active_at(moment)),
+                sorted(
+                    Person.objects.current(moment).values_list('id', flat=True)
+                )
+            )
+
+    def test_active_at(self):
+        for n in range(30):
+            self.create_person()
+        self.assertIndexConsistent()
+
+    def test_overlapping(self):
+        for n in range(30):
+            self.create_person()
+        self.assertEqual(
+            sorted(self.index.overlapping('2000', '2010-06')),
+            sorted(
+                Person.objects.filter(
+                    Q(start_date__lte='2010-06') | Q(start_date__isnull=True),
+                    Q(end_date__gte='2000') | Q(end_date__isnull=True)
+                ).values_list('id', flat=True)
+            )
+        )
+
+    def test_index_is_updated_on_save_and_delete(self):
+        persons = [self.create_person() for n in range(10)]
+        self.assertIndexConsistent()
+
+        persons[0].delete()
+        persons[1].end_date = persons[1].start_date
+        persons[1].save()
+        self.create_person()
+        self.assertIndexConsistent()
+
+    def test_rolled_back_changes_are_not_indexed(self):
+        persons = [self.create_person() for n in range(10)]
+        self.assertIndexConsistent()
+
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                persons[0].delete()
+                persons[1].start_date = '1900'
+                persons[1].end_date = '1901'
+                persons[1].save()
+                Person.objects.create(name=faker.name())
+                raise ValueError
+        self.assertEqual(
+            sorted(self.index.overlapping('1900', '1901')),
+            sorted(
+                Person.objects.overlapping('1900', '1901').values_list(
+                    'id', flat=True
+                )
+            )
+        )
+        self.assertIndexConsistent()
+
+
+
+class BulkWritesIndexTestCase(TransactionTestCase):
+    """Interval indexes are kept up to date by the bulk writes,
+    which send no ``post_save`` signal"""
+
+    def setUp(self):
+        # indexes are process-wide, and tables are emptied between tests
+        for model in (Identifier, OtherName, ContactDetail):
+            get_index(model).invalidate()
+        self.person = Person.objects.create(name=faker.name())
+
+    def assertIndexConsistent(self, model, moment):
+        self.assertEqual(
+            sorted(get_index(model).active_at(moment)),
+            sorted(model.objects.current(moment).values_list('id', flat=True))
+        )
+
+    def test_add_identifiers(self):
+        self.person.add_identifier(
+            identifier='A', scheme='CF', start_date='2000-01-01'
+        )
+        self.assertIndexConsistent(Identifier, '2005-01-01')
+        self.person.add_identifiers([
+            {
+                'identifier': 'B', 'scheme': 'OP',
+                'start_date': '2001-01-01', 'end_date': '2010-01-01'
+            },
+            {'identifier': 'A', 'scheme': 'CF', 'end_date': '2003-01-01'},
+        ])
+        self.assertIndexConsistent(Identifier, '2005-01-01')
+        self.assertIndexConsistent(Identifier, '2002-01-01')
+
+    def test_add_other_names(self):
+        get_index(OtherName).active_at('2005-01-01')
+        self.person.bulk_add_other_names([
+            {'name': faker.name(), 'start_date': '2000-01-01'},
+            {'name': faker.name(), 'end_date': '2001-01-01'},
+        ])
+        self.assertIndexConsistent(OtherName, '2005-01-01')
+        self.assertIndexConsistent(OtherName, '1999-01-01')
+
+    def test_add_contact_details(self):
+        self.assertEqual(get_index(ContactDetail).active_at(), [])
+        self.person.add_contact_details([
+            {'contact_type': ContactDetail.CONTACT_TYPES.email,
+             'value': faker.email()},
+            {'contact_type': ContactDetail.CONTACT_TYPES.phone,
+             'value': faker.phone_number(), 'end_date': '2000-01-01'},
+        ])
+        self.assertEqual(len(get_index(ContactDetail).active_at()), 1)
+        self.assertIndexConsistent(ContactDetail, '1999-01-01')
+
+
+class IdentifierQuerySetTestCase(TestCase):
+
+    def test_bulk_upsert_for(self):
+        persons = [Person.objects.create(name=faker.name()) for n in range(3)]
+        org = Organization.objects.create(name=faker.company())
+        persons[0].add_identifier(
+            identifier='A', scheme='CF',
+            start_date='2000-01-01', end_date='2005-01-01'
+        )
+        org.add_identifier(identifier='ORG', scheme='CF')
+
+        outcomes = Identifier.objects.bulk_upsert_for(
+            persons + [org],
+            [
+                [
+                    {
+                        'identifier': 'A', 'scheme': 'CF',
+                        'start_date': '2005-01-01', 'end_date': '2010-01-01'
+                    },
+                    {
+                        'identifier': 'B', 'scheme': 'CF',
+                        'start_date': '2008-01-01'
+                    },
+                ],
+                [
+                    {'identifier': 'A', 'scheme': 'CF'},
+                    {'identifier': 'A', 'scheme': 'OP'},
+                ],
+                [],
+                [{'identifier': 'ORG', 'scheme': 'CF'}],
+            ],
+            batch_size=2
+        )
+        self.assertEqual(
+            [[o.status for o in r] for r in outcomes],
+            [
+                [ItemOutcome.EXTENDED, ItemOutcome.FAILED],
+                [ItemOutcome.CREATED, ItemOutcome.CREATED],
+                [],
+                [ItemOutcome.UNCHANGED],
+            ]
+        )
+        self.assertEqual(
+            persons[0].identifiers.get(identifier='A').end_date, '2010-01-01'
+        )
+        self.assertEqual(persons[1].identifiers.count(), 2)
+        self.assertEqual(persons[2].identifiers.count(), 0)
+        self.assertEqual(org.identifiers.count(), 1)
+
+    def test_bulk_upsert_for_queries(self):
+        persons = [Person.objects.create(name=faker.name()) for n in range(20)]
+        for p in persons:
+            p.add_identifier(identifier=faker.numerify('OP_######'), scheme='OP')
+        rows = [
+            [
+                {'identifier': faker.numerify('CF_######'), 'scheme': 'CF'},
+                {'identifier': faker.numerify('OP_######'), 'scheme': 'OP'},
+            ] for p in persons
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            outcomes = Identifier.objects.bulk_upsert_for(persons, rows)
+        self.assertLessEqual(len(ctx.captured_queries), 5)
+        self.assertEqual(
+            set(o.status for r in outcomes for o in r),
+            set([ItemOutcome.CREATED, ItemOutcome.FAILED])
+        )
+        self.assertEqual(Identifier.objects.filter(scheme='CF').count(), 20)
+
+    def test_bulk_upsert_for_mismatch(self):
+        with self.assertRaises(ValueError):
+            Identifier.objects.bulk_upsert_for(
+                [Person.objects.create(name=faker.name())], []
+            )
+
+
+class ClassificationsCacheTestCase(TransactionTestCase):
+
+    def tearDown(self):
+        classifications_cache.clear()
+
+    def test_ids_for_uses_cache(self):
+        keys = [('ATECO', '01.1', None), ('ATECO', '01.2', 'Crops')]
+        ids = Classification.objects.ids_for(keys)
+        self.assertEqual(Classification.objects.count(), 2)
+        self.assertEqual(
+            ids[keys[1]],
+            Classification.objects.get(code='01.2', descr='Crops').id
+        )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(Classification.objects.ids_for(keys), ids)
+
+    def test_cache_eviction(self):
+        key = ('ATECO', '01.1', None)
+        ids = Classification.objects.ids_for([key])
+        Classification.objects.get(pk=ids[key]).delete()
+        self.assertNotIn(key, classifications_cache)
+
+        ids = Classification.objects.ids_for([key])
+        c = Classification.objects.get(pk=ids[key])
+        c.descr = 'Crops'
+        c.save()
+        self.assertEqual(len(classifications_cache), 0)
+
+    def test_bulk_add_classifications_queries(self):
+        o = Organization.objects.create(name=faker.company())
+        items = [
+            {'scheme': 'ATECO', 'code': '{0:02d}'.format(n)}
+            for n in range(20)
+        ]
+        o.add_classifications(items)
+
+        o = Organization.objects.create(name=faker.company())
+        with CaptureQueriesContext(connection) as ctx:
+            o.add_classifications(items)
+        self.assertLessEqual(len(ctx.captured_queries), 4)
+        self.assertEqual(o.classifications.count(), 20)
+
+
+class SourceQuerySetTestCase(TestCase):
+
+    def test_bulk_add_for(self):
+        persons = [Person.objects.create(name=faker.name()) for n in range(3)]
+        org = Organization.objects.create(name=faker.company())
+        url = faker.uri()
+        persons[0].add_source(url=url)
+        other_url = faker.uri()
+
+        outcomes = Source.objects.bulk_add_for(
+            persons + [org],
+            [
+                [{'url': url}, {'url': other_url, 'note': 'Other'}],
+                [{'url': url}, {'url': url}],
+                [{'note': 'No url'}],
+                [{'url': other_url}],
+            ]
+        )
+        self.assertEqual(
+            [[o.status for o in r] for r in outcomes],
+            [
+                [ItemOutcome.UNCHANGED, ItemOutcome.CREATED],
+                [ItemOutcome.CREATED, ItemOutcome.UNCHANGED],
+                [ItemOutcome.FAILED],
+                [ItemOutcome.CREATED],
+            ]
+        )
+        self.assertEqual(Source.objects.count(), 2)
+        self.assertEqual(Source.objects.get(url=other_url).note, 'Other')
+        self.assertEqual(persons[0].sources.count(), 2)
+        self.assertEqual(persons[1].sources.count(), 1)
+        self.assertEqual(persons[2].sources.count(), 0)
+        self.assertEqual(org.sources.get().source.url, other_url)
+
+
+class URLsCacheTestCase(TransactionTestCase):
+
+    def tearDown(self):
+        Source.objects.get_queryset().cache.clear()
+        Link.objects.get_queryset().cache.clear()
+
+    def test_bulk_add_for_uses_cache(self):
+        urls = [faker.uri() for n in range(10)]
+        persons = [Person.objects.create(name=faker.name()) for n in range(5)]
+        rows = [[{'url': u} for u in urls] for p in persons]
+        Link.objects.bulk_add_for(persons[:1], rows[:1])
+
+        # URLs are not looked up, the relations are fetched and inserted
+        with CaptureQueriesContext(connection) as ctx:
+            Link.objects.bulk_add_for(persons[1:], rows[1:])
+        self.assertFalse(
+            [q for q in ctx.captured_queries if 'popolo_link"' in q['sql']]
+        )
+        self.assertLessEqual(len(ctx.captured_queries), 3)
+        self.assertEqual(Link.objects.count(), 10)
+        self.assertEqual(LinkRel.objects.count(), 50)
+
+    def test_cache_eviction(self):
+        url = faker.uri()
+        ids = Source.objects.ids_for([url])
+        Source.objects.get(pk=ids[url]).delete()
+        self.assertNotIn(url, Source.objects.get_queryset().cache)
+        self.assertNotEqual(Source.objects.ids_for([url]), ids)
+
+
+class ContactDetailQuerySetTestCase(TestCase):
+
+    def test_bulk_add_for(self):
+        for n in range(3):
+            Person.objects.create(name=faker.name())
+        persons = Person.objects.order_by('pk')
+        email = faker.email()
+        persons[0].add_contact_detail(
+            contact_type=ContactDetail.CONTACT_TYPES.email, value=email
+        )
+        rows = [
+            [
+                {'contact_type': ContactDetail.CONTACT_TYPES.email,
+                 'value': email},
+                {'contact_type': ContactDetail.CONTACT_TYPES.phone,
+                 'value': faker.phone_number()},
+            ],
+            [
+                {'contact_type': ContactDetail.CONTACT_TYPES.email,
+                 'value': email},
+                {'contact_type': ContactDetail.CONTACT_TYPES.email},
+            ],
+            [],
+        ]
+
+        with CaptureQueriesContext(connection) as ctx:
+            outcomes = ContactDetail.objects.bulk_add_for(persons, rows)
+        self.assertLessEqual(len(ctx.captured_queries), 3)
+        self.assertEqual(
+            [[o.status for o in r] for r in outcomes],
+            [
+                [ItemOutcome.UNCHANGED, ItemOutcome.CREATED],
+                [ItemOutcome.CREATED, ItemOutcome.FAILED],
+                [],
+            ]
+        )
+        self.assertEqual(persons[0].contact_details.count(), 2)
+        self.assertEqual(persons[1].contact_details.get().value, email)
+        self.assertEqual(persons[2].contact_details.count(), 0)
+
+
+class MembershipBulkLoadTestCase(TestCase):
+
+    def test_bulk_load(self):
+        p = Person.objects.create(name='Mario Rossi')
+        o = Organization.objects.create(name='Camera dei deputati')
+        po = Post.objects.create(label='Deputato', organization=o)
+        generic = Post.objects.create(label='Presidente')
+        p.add_membership(o, start_date='2008', end_date='2013')
+
+        outcomes = Membership.objects.bulk_load([
+            {'person': p, 'organization': o,
+             'start_date': '2013', 'end_date': '2018'},
+            {'person': p, 'organization': o,
+             'start_date': '2010', 'end_date': '2012'},
+            {'person': p, 'organization': o,
+             'start_date': '2015', 'end_date': '2016'},
+            {'person': p, 'post': po,
+             'start_date': '2015', 'end_date': '2016'},
+            {'person': p, 'post': generic},
+            {'person_id': p.id + 100, 'organization': o},
+            {'organization': o},
+            {'person': p, 'organization': o,
+             'start_date': '2020', 'end_date': '2019'},
+            {'person': p, 'organization': o, 'start_date': '2020-13'},
+            {'person': p, 'organization': o,
+             'start_date': '2010', 'allow_overlap': True},
+        ])
+        self.assertEqual(
+            [o.status for o in outcomes],
+            [
+                ItemOutcome.CREATED, ItemOutcome.FAILED,
+                ItemOutcome.FAILED, ItemOutcome.CREATED,
+                ItemOutcome.FAILED, ItemOutcome.FAILED,
+                ItemOutcome.FAILED, ItemOutcome.FAILED,
+                ItemOutcome.FAILED, ItemOutcome.CREATED,
+            ]
+        )
+        self.assertIsInstance(outcomes[1].error, OverlappingIntervalError)
+        self.assertIsInstance(outcomes[5].error, ValidationError)
+        self.assertEqual(p.memberships.count(), 4)
+        m = p.memberships.get(post=po)
+        self.assertEqual(m.organization, o)
+        self.assertEqual(m.start_key, PartialDate.of('2015').key)
+
+        slugs = list(
+            p.memberships.order_by('pk').values_list('slug', flat=True)
+        )
+        self.assertEqual(len(set(slugs)), 4)
+        self.assertEqual(
+            slugs,
+            ['mario-rossi-camera-dei-deputati'] + [
+                'mario-rossi-camera-dei-deputati-{0}'.format(n)
+                for n in range(2, 5)
+            ]
+        )
+
+    def test_bulk_load_queries(self):
+        o = Organization.objects.create(name=faker.company())
+        persons = [Person.objects.create(name=faker.name()) for n in range(20)]
+        rows = [
+            {'person': p, 'organization': o, 'start_date': '2010'}
+            for p in persons
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            outcomes = Membership.objects.bulk_load(rows)
+        self.assertLessEqual(len(ctx.captured_queries), 8)
+        self.assertEqual(
+            set(o.status for o in outcomes), set([ItemOutcome.CREATED])
+        )
+        self.assertEqual(o.memberships.count(), 20)
+
+
+class DeferredValidationTestCase(TestCase):
+
+    def test_receivers_are_connected_to_the_models_needing_them(self):
+        self.assertFalse(pre_save.has_listeners(Language))
+        self.assertTrue(pre_save.has_listeners(Identifier))
+
+    def test_valid_instances_are_saved(self):
+        with deferred():
+            self.assertTrue(is_deferred())
+            for n in range(5):
+                Person.objects.create(
+                    name=faker.name(), email=faker.email(),
+                    birth_date='1962-04'
+                )
+        self.assertFalse(is_deferred())
+        self.assertEqual(Person.objects.count(), 5)
+
+    def test_validation_errors_roll_back_the_block(self):
+        with self.assertRaises(ValidationError):
+            with deferred():
+                Person.objects.create(name=faker.name(), email=faker.email())
+                Person.objects.create(name=faker.name(), email='not an email')
+                # nested blocks are validated by the outermost one
+                with deferred():
+                    Person.objects.create(
+                        name=faker.name(), email='not an email either'
+                    )
+                self.assertEqual(Person.objects.count(), 3)
+        self.assertFalse(is_deferred())
+        self.assertEqual(Person.objects.count(), 0)
+
+    def test_validate_instances(self):
+        persons = [
+            Person(name=faker.name(), email='not an email'),
+            Person(name=faker.name(), email='not an email'),
+            Person(name=faker.name(), email=faker.email()),
+        ]
+        with self.assertNumQueries(0):
+            with self.assertRaises(ValidationError) as ctx:
+                validate_instances(persons)
+        self.assertEqual(len(ctx.exception.messages), 2)
+
+    def test_validate_instances_related(self):
+        o = Organization.objects.create(name=faker.company())
+        p = Person.objects.create(name=faker.name())
+        memberships = [
+            Membership(organization=o, person=p, start_date='2015'),
+            Membership(organization=o, person_id=1000, start_date='2015'),
+            Membership(organization=o, person_id=1001, start_date='2015-02'),
+        ]
+        validate_instances(memberships[:1])
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertRaises(ValidationError) as ctx:
+                validate_instances(memberships)
+        # a single query for each relation
+        self.assertEqual(
+            len([q for q in queries if ' IN (' in q['sql']]), 2
+        )
+        self.assertEqual(len(ctx.exception.messages), 2)
+
+
+class PermalinkableQuerySetTestCase(TestCase):
+
+    def test_bulk_create_allocates_slugs(self):
+        Person.objects.create(name='Mario Rossi', birth_date='1950')
+        persons = [
+            Person(name='Mario Rossi', birth_date='1950') for n in range(5)
+        ] + [Person(name='Mario Rossi', slug='mario-rossi')]
+        with self.assertNumQueries(2):
+            Person.objects.bulk_create(persons)
+        self.assertEqual(
+            list(Person.objects.order_by('pk').values_list('slug', flat=True)),
+            ['mario-rossi-1950'] + [
+                'mario-rossi-1950-{0}'.format(n) for n in range(2, 7)
+            ] + ['mario-rossi']
+        )
+        self.assertFalse(hasattr(persons[0], '_slug_allocated'))
+
+    def test_save_allocates_slug_with_a_single_query(self):
+        def save():
+            with CaptureQueriesContext(connection) as ctx:
+                p = Person.objects.create(name='Mario Rossi')
+            return p, len(ctx.captured_queries)
+
+        first, n_queries = save()
+        for n in range(5):
+            p, n = save()
+            self.assertEqual(n, n_queries)
+        self.assertEqual(p.slug, '{0}-6'.format(first.slug))
+
+    def test_bulk_create_fetches_slug_sources(self):
+        organizations = [
+            Organization.objects.create(name=faker.company())
+            for n in range(3)
+        ]
+        persons = [Person.objects.create(name=faker.name()) for n in range(3)]
+        memberships = [
+            Membership(
+                person_id=p.id, organization_id=o.id, start_date='2010'
+            ) for p in persons for o in organizations
+        ] + [
+            Membership(
+                member_organization_id=organizations[0].id,
+                organization_id=organizations[1].id
+            )
+        ]
+        # persons, organizations, slugs, insert
+        with self.assertNumQueries(4):
+            Membership.objects.bulk_create(memberships)
+        self.assertEqual(
+            memberships[-1].slug, slugify(u"{0} {1}".format(
+                organizations[0].name, organizations[1].name
+            ))
+        )
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Implements tests of the prefetching of generic relations.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+
+from popolo import prefetch
+from popolo.models import Area, Organization, Person
+
+
+class GenericPrefetchTestCase(TestCase):
+
+    def setUp(self):
+        self.objects = []
+        for n in range(3):
+            p = Person.objects.create(name='Persona {0}'.format(n))
+            p.add_identifier('P{0}'.format(n), 'TEST')
+            p.add_source('http://example.com/p{0}'.format(n))
+            o = Organization.objects.create(name='Org {0}'.format(n))
+            o.add_identifier('O{0}'.format(n), 'TEST')
+            a = Area.objects.create(
+                name='Area {0}'.format(n), identifier='A{0}'.format(n),
+                classification='ADM1'
+            )
+            a.add_link('http://example.com/a{0}'.format(n))
+            self.objects.extend([p, o, a])
+        # a person without identifiers
+        self.objects.append(Person.objects.create(name='Persona'))
+        for model in (Person, Organization, Area):
+            ContentType.objects.get_for_model(model)
+
+    def test_generic(self):
+        objects = [
+            type(o).objects.get(pk=o.pk) for o in self.objects
+        ]
+        # a query for each relation of each of the 3 content types,
+        # areas having no contact details
+        with self.assertNumQueries(11):
+            prefetch.generic(
+                objects, 'identifiers', 'sources', 'links', 'contact_details'
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [o.identifiers.all()[0].identifier for o in objects[:2]],
+                ['P0', 'O0']
+            )
+            self.assertEqual(list(objects[2].identifiers.all()), [])
+            self.assertEqual(list(objects[-1].identifiers.all()), [])
+            self.assertEqual(
+                objects[0].sources.all()[0].source.url,
+                'http://example.com/p0'
+            )
+            self.assertEqual(
+                objects[2].links.all()[0].link.url, 'http://example.com/a0'
+            )
+            self.assertEqual(list(objects[1].sources.all()), [])
+
+    def test_generic_replaces_previous_results(self):
+        p = Person.objects.get(pk=self.objects[0].pk)
+        prefetch.generic([p], 'identifiers')
+        p.add_identifier('P9', 'OTHER')
+        prefetch.generic([p], 'identifiers')
+        self.assertEqual(p.identifiers.all().count(), 2)
+
+    def test_not_generic(self):
+        with self.assertRaises(ValueError):
+            prefetch.generic(self.objects, 'memberships')
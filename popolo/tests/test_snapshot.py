@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Implements tests of the columnar snapshot exporter.
+"""
+import csv
+import io
+import os
+import shutil
+import tempfile
+from unittest import skipIf, skipUnless
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import six
+
+from popolo.exporters import snapshot
+from popolo.exporters.snapshot import SnapshotExporter
+from popolo.models import Area, ElectoralEvent, ElectoralResult, \
+    Membership, Organization, Ownership, Person, Post
+
+
+class SnapshotExporterTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        italia = Area.objects.create(
+            name='Italia', identifier='IT', classification='PCL'
+        )
+        self.lazio = Area.objects.create(
+            name='Lazio', identifier='12', classification='ADM1',
+            parent=italia, inhabitants=5000000
+        )
+        self.camera = Organization.objects.create(name='Camera')
+        self.person = Person.objects.create(name=u'Nicolò Rossi')
+        post = Post.objects.create(
+            label='Deputato', organization=self.camera, area=self.lazio
+        )
+        Membership.objects.create(
+            person=self.person, organization=self.camera, post=post,
+            area=self.lazio, start_date='2013-03-15'
+        )
+        Ownership.objects.create(
+            organization=self.camera, owner_person=self.person,
+            percentage=0.5
+        )
+        event = ElectoralEvent.objects.create(
+            name='Politiche 2013', electoral_system='Proporzionale',
+            classification=ElectoralEvent.CLASSIFICATIONS.general
+        )
+        ElectoralResult.objects.create(
+            event=event, organization=self.camera, constituency=self.lazio,
+            candidate=self.person, n_preferences=1000, is_elected=True
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read_csv(self, path):
+        if six.PY2:
+            with open(path, 'rb') as f:
+                return [
+                    [v.decode('utf-8') for v in row]
+                    for row in csv.reader(f)
+                ]
+        with io.open(path, encoding='utf-8', newline='') as f:
+            return list(csv.reader(f))
+
+    def test_columns(self):
+        columns = dict(
+            (name, type) for name, lookup, type
+            in SnapshotExporter(format='csv').columns('electoral_results')
+        )
+        self.assertEqual(columns['id'], 'int')
+        self.assertEqual(columns['candidate_id'], 'int')
+        self.assertEqual(columns['candidate_name'], 'string')
+        self.assertEqual(columns['perc_turnout'], 'float')
+        self.assertEqual(columns['is_elected'], 'bool')
+
+    def test_csv(self):
+        exporter = SnapshotExporter(batch_size=1, format='csv')
+        with self.assertNumQueries(1):
+            exporter.export_table(
+                'areas', os.path.join(self.tmpdir, 'areas.csv')
+            )
+        files = exporter.export(self.tmpdir)
+        self.assertEqual(
+            [(t, n) for t, (path, n) in files.items()],
+            [('memberships', 1), ('ownerships', 1),
+             ('electoral_results', 1), ('areas', 2)]
+        )
+
+        rows = self.read_csv(files['memberships'][0])
+        membership = dict(zip(rows[0], rows[1]))
+        self.assertEqual(membership['person_name'], u'Nicolò Rossi')
+        self.assertEqual(membership['post_label'], 'Deputato')
+        self.assertEqual(membership['area_identifier'], '12')
+        self.assertEqual(membership['start_date'], '2013-03-15')
+        self.assertEqual(membership['member_organization_id'], '')
+
+        rows = self.read_csv(files['areas'][0])
+        lazio = dict(zip(rows[0], rows[2]))
+        self.assertEqual(lazio['parent_name'], 'Italia')
+        self.assertEqual(lazio['inhabitants'], '5000000')
+
+    @skipUnless(snapshot.pyarrow, "pyarrow is not installed")
+    def test_parquet(self):
+        import pyarrow.parquet
+
+        files = SnapshotExporter(format='parquet').export(self.tmpdir)
+        table = pyarrow.parquet.read_table(files['electoral_results'][0])
+        row = table.to_pydict()
+        self.assertEqual(row['candidate_name'], [u'Nicolò Rossi'])
+        self.assertEqual(row['is_elected'], [True])
+        self.assertEqual(row['n_preferences'], [1000])
+
+    @skipIf(snapshot.pyarrow, "pyarrow is installed")
+    def test_parquet_missing(self):
+        with self.assertRaises(ImportError):
+            SnapshotExporter(format='parquet')
+        self.assertEqual(SnapshotExporter().format, 'csv')
+
+    def test_command(self):
+        out = six.StringIO()
+        call_command(
+            'popolo_export_snapshot', self.tmpdir, format='csv',
+            tables=['ownerships'], stdout=out
+        )
+        self.assertIn('ownerships: 1 rows', out.getvalue())
+        rows = self.read_csv(os.path.join(self.tmpdir, 'ownerships.csv'))
+        self.assertEqual(dict(zip(*rows))['percentage'], '0.5')
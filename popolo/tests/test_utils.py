@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 
+import copy
+import pickle
 from datetime import datetime, timedelta
-from unittest import TestCase
+from importlib import import_module
+from unittest import TestCase, skipIf
 from faker import Factory
-from popolo.utils import PartialDate, PartialDateException, PartialDatesInterval
+from popolo.utils import PartialDate, PartialDateException, \
+    PartialDatesInterval, LRUCache, partial_dates_cache
+from popolo.utils.intervals import np, intervals_ordinals, \
+    overlaps_one_to_many, overlaps_many_to_many, overlapping_pairs, \
+    IntervalIndex, start_key, end_key
 
 faker = Factory.create('it_IT')  # a factory to create fake names for tests
 
@@ -247,3 +254,264 @@ class PartialDateTestCase(TestCase):
 
         overlap = PartialDate.intervals_overlap(a, b)
         self.assertLessEqual(overlap, 0)
+
+    def test_new_instance_has_ordinal_and_key(self):
+        d = PartialDate('2010-01')
+        self.assertEqual(d.ordinal, datetime(2010, 1, 1).toordinal())
+        self.assertEqual(d.key & 3, PartialDate.MONTH_PRECISION)
+
+    def test_new_instance_has_no_dict(self):
+        d = PartialDate('2010-01-01')
+        self.assertFalse(hasattr(d, '__dict__'))
+        with self.assertRaises(AttributeError):
+            d.other_attribute = 1
+
+    def test_new_instance_non_canonical_format(self):
+        d = PartialDate('2010-1-5')
+        self.assertEqual(d.date_as_dt, datetime(2010, 1, 5))
+
+    def test_new_instance_wrong_format(self):
+        for ds in ('2010-13', '2010-02-30', '2010-1210', 'YESTERDAY'):
+            with self.assertRaises(PartialDateException):
+                PartialDate(ds)
+
+    def test_keys_sort_as_strings(self):
+        ds = ['2010-01-02', '2010', '2009-12-31', '2010-01-01', '2010-01']
+        self.assertEqual(
+            [d.date for d in sorted(PartialDate(d) for d in ds)],
+            sorted(ds)
+        )
+
+    def test_intervals_overlap_null_starts(self):
+        a = PartialDatesInterval(start=None, end='2010')
+        b = PartialDatesInterval(start=None, end='2000')
+
+        overlap = PartialDate.intervals_overlap(a, b)
+        self.assertEqual(overlap, PartialDate.HUGE_OVERLAP)
+
+    def test_intervals_overlap_days(self):
+        a = PartialDatesInterval(start='2010-01-01', end='2010-01-31')
+        b = PartialDatesInterval(start='2010-01-21', end=None)
+
+        overlap = PartialDate.intervals_overlap(a, b)
+        self.assertEqual(overlap, 10)
+
+    def test_new_instance_is_immutable(self):
+        d = PartialDate('2010-01-01')
+        with self.assertRaises(AttributeError):
+            d.date = '2011-01-01'
+
+    def test_of_returns_shared_instances(self):
+        ds = faker.date()
+        self.assertIs(PartialDate.of(ds), PartialDate.of(ds))
+        self.assertEqual(PartialDate.of(ds), PartialDate(ds))
+
+    def test_of_counts_hits_and_misses(self):
+        partial_dates_cache.clear()
+        PartialDate.of('2013-03-15')
+        PartialDate.of('2013-03-15')
+        PartialDate.of('2018')
+
+        info = PartialDate.cache_info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 2)
+        self.assertEqual(info.currsize, 2)
+
+    def test_copy_and_pickle(self):
+        for ds in ('2010', '2010-01', '2010-01-05', None):
+            d = PartialDate(ds)
+            for c in (
+                copy.copy(d), copy.deepcopy(d),
+                pickle.loads(pickle.dumps(d)),
+                pickle.loads(pickle.dumps(d, pickle.HIGHEST_PROTOCOL)),
+            ):
+                self.assertEqual(c.date, ds)
+                self.assertEqual(c.ordinal, d.ordinal)
+                self.assertEqual(c.key, d.key)
+
+        interval = PartialDatesInterval('2010', '2012-06')
+        self.assertEqual(copy.deepcopy(interval), interval)
+        self.assertEqual(pickle.loads(pickle.dumps(interval)), interval)
+
+    def test_keys_of_the_date_keys_migration(self):
+        # the migration filling the keys has its own copy of the code
+        date_key = import_module(
+            'popolo.migrations.0005_dateframeable_date_keys'
+        ).date_key
+        for ds in (
+            '2010', '2010-01', '2010-01-05', '2010-1-5', '0001',
+            '9999-12-31', '2010-13', '2010-02-30', 'abc',
+        ):
+            try:
+                key = PartialDate(ds).key
+            except PartialDateException:
+                key = None
+            self.assertEqual(date_key(ds), key)
+
+
+class LRUCacheTestCase(TestCase):
+
+    def test_get_set(self):
+        c = LRUCache(maxsize=2)
+        c.set('a', 1)
+        self.assertEqual(c.get('a'), 1)
+        self.assertIsNone(c.get('b'))
+        self.assertEqual(c.info(), (1, 1, 2, 1))
+
+    def test_least_recently_used_key_is_evicted(self):
+        c = LRUCache(maxsize=2)
+        c.set('a', 1)
+        c.set('b', 2)
+        c.get('a')
+        c.set('c', 3)
+
+        self.assertIn('a', c)
+        self.assertNotIn('b', c)
+        self.assertIn('c', c)
+        self.assertEqual(len(c), 2)
+
+    def test_discard_and_clear(self):
+        c = LRUCache()
+        c.set('a', 1)
+        c.set('b', 2)
+        c.discard('a')
+        self.assertNotIn('a', c)
+        c.get('b')
+        c.clear()
+        self.assertEqual(c.info(), (0, 0, c.maxsize, 0))
+
+
+class BatchOverlapsTestCase(TestCase):
+
+    def random_interval(self):
+        start = faker.date() if faker.boolean(80) else None
+        end = faker.date() if faker.boolean(80) else None
+        if start and end and start > end:
+            start, end = end, start
+        return PartialDatesInterval(start=start, end=end)
+
+    def check_one_to_many(self, use_numpy):
+        a = self.random_interval()
+        others = [self.random_interval() for n in range(50)]
+        starts, ends = intervals_ordinals(others)
+
+        overlaps = overlaps_one_to_many(
+            a.start.ordinal, a.end.ordinal, starts, ends,
+            use_numpy=use_numpy
+        )
+        self.assertEqual(
+            list(overlaps),
+            [PartialDate.intervals_overlap(a, b) for b in others]
+        )
+
+    def check_many_to_many(self, use_numpy):
+        a = [self.random_interval() for n in range(10)]
+        b = [self.random_interval() for n in range(20)]
+        a_starts, a_ends = intervals_ordinals(a)
+        b_starts, b_ends = intervals_ordinals(b)
+
+        overlaps = overlaps_many_to_many(
+            a_starts, a_ends, b_starts, b_ends, use_numpy=use_numpy
+        )
+        self.assertEqual(
+            [list(r) for r in overlaps],
+            [[PartialDate.intervals_overlap(i, j) for j in b] for i in a]
+        )
+
+    def check_overlapping_pairs(self, use_numpy):
+        intervals = [
+            PartialDatesInterval('2010', '2012'),
+            PartialDatesInterval('2011', '2013'),
+            PartialDatesInterval('2012', '2014'),
+            PartialDatesInterval(None, '2009'),
+            PartialDatesInterval('2011', None),
+        ]
+        starts, ends = intervals_ordinals(intervals)
+
+        self.assertEqual(
+            sorted(overlapping_pairs(starts, ends, use_numpy=use_numpy)),
+            [(0, 1), (0, 4), (1, 2), (1, 4), (2, 4)]
+        )
+        self.assertEqual(
+            sorted(overlapping_pairs(
+                starts, ends, groups=['a', 'a', 'b', 'a', 'b'],
+                use_numpy=use_numpy
+            )),
+            [(0, 1), (2, 4)]
+        )
+
+    def test_one_to_many(self):
+        self.check_one_to_many(use_numpy=False)
+
+    def test_many_to_many(self):
+        self.check_many_to_many(use_numpy=False)
+
+    def test_overlapping_pairs(self):
+        self.check_overlapping_pairs(use_numpy=False)
+
+    @skipIf(np is None, "NumPy is not installed")
+    def test_one_to_many_numpy(self):
+        self.check_one_to_many(use_numpy=True)
+
+    @skipIf(np is None, "NumPy is not installed")
+    def test_many_to_many_numpy(self):
+        self.check_many_to_many(use_numpy=True)
+
+    @skipIf(np is None, "NumPy is not installed")
+    def test_overlapping_pairs_numpy(self):
+        self.check_overlapping_pairs(use_numpy=True)
+
+
+class IntervalIndexTestCase(TestCase):
+
+    def random_intervals(self, n):
+        intervals = []
+        for i in range(n):
+            s = start_key(faker.date() if faker.boolean(80) else None)
+            e = end_key(faker.date() if faker.boolean(80) else None)
+            if s > e:
+                s, e = e, s
+            intervals.append((i, s, e))
+        return intervals
+
+    def assertIndexConsistent(self, index, intervals):
+        for n in range(20):
+            p = PartialDate(faker.date()).key
+            self.assertEqual(
+                sorted(index.stab(p)),
+                sorted(i for i, s, e in intervals if s <= p <= e)
+            )
+            a, b = sorted([PartialDate(faker.date()).key for m in range(2)])
+            self.assertEqual(
+                sorted(index.overlapping(a, b)),
+                sorted(i for i, s, e in intervals if s <= b and e >= a)
+            )
+
+    def test_queries(self):
+        intervals = self.random_intervals(200)
+        index = IntervalIndex(intervals)
+        self.assertEqual(len(index), 200)
+        self.assertIndexConsistent(index, intervals)
+
+    def test_incremental_changes(self):
+        intervals = self.random_intervals(200)
+        index = IntervalIndex(intervals, max_pending=10)
+        index.stab(0)
+
+        # changes are applied on the overlay first, then on the tree
+        bounds = dict((i, (s, e)) for i, s, e in intervals)
+        for n in range(30):
+            del bounds[n]
+            index.remove(n)
+            s, e = bounds[199 - n]
+            bounds[199 - n] = (start_key(None), e)
+            index.add(199 - n, start_key(None), e)
+            self.assertIndexConsistent(
+                index, [(i, s, e) for i, (s, e) in bounds.items()]
+            )
+
+        self.assertEqual(len(index), 170)
+
+    def test_null_dates_keys(self):
+        self.assertLess(start_key(None), start_key('0001-01-01'))
+        self.assertGreater(end_key(None), end_key('9999-12-31'))
@@ -1,4 +1,8 @@
 import operator
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import date
 from datetime import datetime as dt
 from datetime import timedelta
 
@@ -6,9 +10,108 @@ import sys
 from django.utils.translation import ugettext_lazy as _
 
 
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class LRUCache(object):
+    """A size-bounded, thread-safe mapping,
+    evicting the least recently used keys when full.
+
+    Hits and misses are counted, so that the effectiveness of the
+    cache can be checked in production, through ``info()``::
+
+        c = LRUCache(maxsize=2)
+        c.set('a', 1)
+        c.get('a')
+        > 1
+        c.get('b')
+        > None
+        c.info()
+        > CacheInfo(hits=1, misses=1, maxsize=2, currsize=1)
+    """
+
+    def __init__(self, maxsize=1024):
+        """Initialize the instance
+
+        :param maxsize: the maximum number of keys held in the cache
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value cached for key, or default if key is missing
+
+        :param key: the key to look for
+        :param default: the value returned in case of a miss
+        :return: the cached value
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            # re-insert the key, so that it's the most recently used
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Cache value under key, evicting the least recently used key
+        if the cache is full
+
+        :param key: the key
+        :param value: the value to cache
+        :return:
+        """
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        """Remove key from the cache, if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove all keys from the cache and reset the counters"""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """Return the cache statistics
+
+        :return: a CacheInfo namedtuple
+        """
+        with self._lock:
+            return CacheInfo(
+                self.hits, self.misses, self.maxsize, len(self._data)
+            )
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+# shared PartialDate instances, see PartialDate.of
+partial_dates_cache = LRUCache(maxsize=4096)
+
+_missing = object()
+
+
 class PartialDatesInterval(object):
     """Class used to represent an interval among two ``PartialDate`` instances
     """
+    __slots__ = ('start', 'end')
 
     def __init__(self, start, end):
         """Initialize the instance.
@@ -29,7 +132,7 @@ class PartialDatesInterval(object):
             elif isinstance(start, str) \
                 or isinstance(start, bytes) \
                 or start is None:
-                self.start = PartialDate(start)
+                self.start = PartialDate.of(start)
             else:
                 raise PartialDateException(
                     "Class {0} not allowed here".format(
@@ -42,7 +145,7 @@ class PartialDatesInterval(object):
             elif isinstance(end, str) \
                 or isinstance(end, bytes) \
                 or end is None:
-                self.end = PartialDate(end)
+                self.end = PartialDate.of(end)
             else:
                 raise PartialDateException(
                     "Class {0} not allowed here".format(
@@ -57,7 +160,7 @@ class PartialDatesInterval(object):
             elif isinstance(start, str) \
                 or isinstance(start, unicode) \
                 or start is None:
-                self.start = PartialDate(start)
+                self.start = PartialDate.of(start)
             else:
                 raise PartialDateException(
                     "Class {0} not allowed here".format(
@@ -70,7 +173,7 @@ class PartialDatesInterval(object):
             elif isinstance(end, str) \
                 or isinstance(end, unicode) \
                 or end is None:
-                self.end = PartialDate(end)
+                self.end = PartialDate.of(end)
             else:
                 raise PartialDateException(
                     "Class {0} not allowed here".format(
@@ -78,6 +181,10 @@ class PartialDatesInterval(object):
                     )
                 )
 
+    def __reduce__(self):
+        # instances with __slots__ can not be pickled with protocol 0
+        return type(self), (self.start, self.end)
+
     def __eq__(self, other):
         """Equality operator for PartialDateInterval
 
@@ -124,7 +231,19 @@ class PartialDate(object):
         a.date
         > '2010-01'
 
-    During the initialization, the attribute ``date_as_dt`` is instantiated::
+    During the initialization, the string is parsed into the ``ordinal``
+    attribute (the proleptic Gregorian ordinal of the first day
+    the partial date points to) and into the ``key`` attribute, an
+    integer sort key combining the ordinal and the precision of the date
+    (year, month or day)::
+
+        a.ordinal
+        > 733773
+
+        a.key
+        > 2935093
+
+    The ``date_as_dt`` attribute is computed from the ordinal on access::
 
         a.date_as_dt
         > datetime.datetime(2010, 1, 1, 0, 0)
@@ -138,18 +257,44 @@ class PartialDate(object):
 
     Partial dates are pointed to the first days in the month, or year.
 
-    Comparison operators are overrided, so that the textual representations
-    are always compared.
+    Comparison operators are overrided, so that the integer sort keys
+    are compared; the keys sort exactly as the textual representations
+    do, so that ``2010 < 2010-01 < 2010-01-01 < 2010-01-02``.
 
     The ``intervals_overlap`` class method allows to compare two
     ``PartialDatesInterval`` instances and return the n. of days of overlap.
 
+    Instances only hold three attributes, declared in ``__slots__``,
+    in order to keep the memory footprint low when millions of them
+    are built.
 
+    Instances are immutable, so that they can be shared; the ``of``
+    class method returns shared instances out of a bounded LRU cache,
+    and should be preferred to the constructor whenever the same date
+    strings are parsed over and over::
+
+        a = PartialDate.of('2010-01')
+        a is PartialDate.of('2010-01')
+        > True
     """
+    __slots__ = ('date', 'ordinal', 'key')
+
     d_fmt = '%Y-%m-%d'
     m_fmt = '%Y-%m'
     y_fmt = '%Y'
 
+    # precision tags, stored in the two lowest bits of the sort key
+    YEAR_PRECISION = 0
+    MONTH_PRECISION = 1
+    DAY_PRECISION = 2
+
+    HUGE_OVERLAP = 999999
+
+    # sort keys standing for null start and end dates, ie: -inf and +inf
+    MIN_KEY = 0
+    MAX_KEY = (date.max.toordinal() + 1) << 2
+
+    _date_re = re.compile(r'^([0-9]{4})(?:-([0-9]{2})(?:-([0-9]{2}))?)?\Z')
 
     @classmethod
     def intervals_overlap(cls, a, b):
@@ -166,12 +311,12 @@ class PartialDate(object):
         When the two starting dates are both null, then the two intervals
         return a ``HUGE_OVERLAP`` value (999999).
 
+        The computation is performed on the integer ordinals of the dates.
+
         :param a: PartialDatesInterval
         :param b: PartialDatesInterval
         :return: integer
         """
-        HUGE_OVERLAP = 999999
-
         if not isinstance(a, PartialDatesInterval) or \
            not isinstance(b, PartialDatesInterval):
            raise PartialDateException(
@@ -179,32 +324,104 @@ class PartialDate(object):
                 "popolo.utils.PartialDatesInterval"
            )
 
-        if a.start.date == None and b.start.date == None:
+        a_start = a.start.ordinal
+        b_start = b.start.ordinal
+        if a_start is None and b_start is None:
             # when both start dates are null,
             # there's always a big overlap
-            return HUGE_OVERLAP
-        elif a.start.date != None and b.start.date != None:
-            latest_start = max(a.start, b.start)
-        elif a.start.date == None:
-            latest_start = b.start
-        elif b.start.date == None:
-            latest_start = a.start
-
-        if a.end.date == None and b.end.date == None:
+            return cls.HUGE_OVERLAP
+        elif a_start is None:
+            latest_start = b_start
+        elif b_start is None:
+            latest_start = a_start
+        else:
+            latest_start = max(a_start, b_start)
+
+        a_end = a.end.ordinal
+        b_end = b.end.ordinal
+        if a_end is None and b_end is None:
             # when both end dates are null,
             # there's always a big overlap
-            return HUGE_OVERLAP
-        elif a.end.date != None and b.end.date != None:
-            earliest_end = min(a.end, b.end)
-        elif a.end.date == None:
-            earliest_end = b.end
-        elif b.end.date == None:
-            earliest_end = a.end
+            return cls.HUGE_OVERLAP
+        elif a_end is None:
+            earliest_end = b_end
+        elif b_end is None:
+            earliest_end = a_end
+        else:
+            earliest_end = min(a_end, b_end)
 
-        overlap = (earliest_end - latest_start).days
+        return earliest_end - latest_start
 
-        return overlap
+    @classmethod
+    def of(cls, date_string):
+        """Return a shared instance for date_string,
+        parsing it only when it's not in the cache.
+
+        :param date_string: the date in one of the allowed formats.
+        :return: the PartialDate instance
+        """
+        d = partial_dates_cache.get(date_string, _missing)
+        if d is _missing:
+            d = cls(date_string)
+            partial_dates_cache.set(date_string, d)
+        return d
+
+    @classmethod
+    def cache_info(cls):
+        """Return hits, misses and size of the cache used by ``of``
+
+        :return: a CacheInfo namedtuple
+        """
+        return partial_dates_cache.info()
+
+    @classmethod
+    def parse(cls, date_string):
+        """Parse a partial date string into its ordinal and precision.
+
+        Dates in the canonical ``YYYY-MM-DD``, ``YYYY-MM`` and ``YYYY``
+        forms are matched by a regular expression and converted without
+        going through ``strptime``; other forms accepted by the
+        formats (ex: ``2010-1-5``) fall back to ``strptime``.
+
+        :param date_string: the date in one of the allowed formats.
+        :return: a tuple with the ordinal and the precision of the date
+        :raise PartialDateException: if the string can not be converted
+        """
+        try:
+            m = cls._date_re.match(date_string)
+            if m is not None:
+                year, month, day = m.groups()
+                if day is not None:
+                    return (
+                        date(int(year), int(month), int(day)).toordinal(),
+                        cls.DAY_PRECISION
+                    )
+                elif month is not None:
+                    return (
+                        date(int(year), int(month), 1).toordinal(),
+                        cls.MONTH_PRECISION
+                    )
+                else:
+                    return (
+                        date(int(year), 1, 1).toordinal(),
+                        cls.YEAR_PRECISION
+                    )
 
+            for fmt, precision in (
+                (cls.d_fmt, cls.DAY_PRECISION),
+                (cls.m_fmt, cls.MONTH_PRECISION),
+                (cls.y_fmt, cls.YEAR_PRECISION),
+            ):
+                try:
+                    return dt.strptime(date_string, fmt).toordinal(), precision
+                except ValueError:
+                    continue
+        except (ValueError, TypeError):
+            pass
+
+        raise PartialDateException(
+            "Could not convert {0} into datetime".format(date_string)
+        )
 
     def __init__(self, date_string):
         """Initialize the instance, trying the various allowed format.
@@ -212,31 +429,46 @@ class PartialDate(object):
         If the string is not in one of the allowed format, then a
         ``PartialDateException`` is raised.
 
-        The converted datetime instance is stored in the
-        ``date_as_dt`` attribute.
+        The ordinal and the sort key are stored in the
+        ``ordinal`` and ``key`` attributes.
 
         :param date_string: the date in one of the allowed formats.
         """
 
-        self.date = date_string
-
-        if self.date:
-            try:
-                self.date_as_dt = dt.strptime(self.date, self.d_fmt)
-            except ValueError:
-                try:
-                    self.date_as_dt = dt.strptime(self.date, self.m_fmt)
-                except ValueError:
-                    try:
-                        self.date_as_dt = dt.strptime(self.date, self.y_fmt)
-                    except ValueError:
-                        raise PartialDateException(
-                            "Could not convert {0} into datetime".format(
-                                self.date
-                            )
-                        )
+        if date_string:
+            ordinal, precision = self.parse(date_string)
+            key = ordinal << 2 | precision
         else:
-            self.date_as_dt = None
+            ordinal = None
+            key = None
+
+        # instances are immutable, __setattr__ is bypassed
+        object.__setattr__(self, 'date', date_string)
+        object.__setattr__(self, 'ordinal', ordinal)
+        object.__setattr__(self, 'key', key)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PartialDate instances are immutable")
+
+    def __reduce__(self):
+        # rebuilt out of the date string, as __setattr__ is guarded
+        return type(self), (self.date,)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    @property
+    def date_as_dt(self):
+        """The datetime instance corresponding to the partial date
+
+        :return: a datetime, or None for null dates
+        """
+        if self.ordinal is None:
+            return None
+        return dt.fromordinal(self.ordinal)
 
     def __sub__(self, other):
         """Overrides the  `-` operator, so that:
@@ -257,7 +489,7 @@ class PartialDate(object):
         :rtype: timedelta
         """
         if isinstance(other, PartialDate):
-            return self.date_as_dt - other.date_as_dt
+            return timedelta(days=self.ordinal - other.ordinal)
         elif isinstance(other, timedelta):
             return self.date_as_dt - other
         else:
@@ -292,10 +524,15 @@ class PartialDate(object):
         """
 
         if other:
-            return self.date == other.date
+            return self.key == other.key
         else:
             return self.date is None
 
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.key)
 
     def _compare(self, other, op):
         """overrides comparison operators,
@@ -307,8 +544,8 @@ class PartialDate(object):
         :param other: the PartialDate instance to be compared with
         :return: boolean
         """
-        if self.date and other.date:
-            return op(self.date, other.date)
+        if self.key is not None and other.key is not None:
+            return op(self.key, other.key)
         else:
             raise PartialDateException(
                 "Could not compare null dates"
@@ -334,4 +571,3 @@ class PartialDate(object):
             return 'None'
         else:
             return self.date
-
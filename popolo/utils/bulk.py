@@ -0,0 +1,222 @@
+"""Helpers for bulk database operations
+"""
+from collections import OrderedDict
+
+from django.db import connections, transaction
+from django.db.models import Case, When, Value, Q
+
+
+def chunks(items, size):
+    """Split a sequence into lists of at most size items
+
+    :param items: the sequence, or iterable
+    :param size: the size of the chunks
+    :return: generator of lists
+    """
+    chunk = []
+    for i in items:
+        chunk.append(i)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def bulk_update(objs, fields, batch_size=None, using='default'):
+    """Update the given fields of the instances in objs,
+    with one UPDATE query for each batch.
+
+    ``QuerySet.bulk_update`` is used when available (Django >= 2.2),
+    otherwise the same ``CASE pk WHEN ... THEN ...`` queries are built
+    here. As for ``bulk_update``, ``save`` is not called and signals
+    are not sent.
+
+    :param objs: the model instances, all of the same model
+    :param fields: the names of the fields to update
+    :param batch_size: the maximum number of instances updated by a query
+    :param using: the database alias
+    :return: the number of updated rows
+    """
+    objs = list(objs)
+    if not objs:
+        return 0
+
+    model = type(objs[0])
+    manager = model._default_manager.db_manager(using)
+    if hasattr(manager.get_queryset(), 'bulk_update'):
+        return manager.bulk_update(objs, fields, batch_size=batch_size)
+
+    fields = [model._meta.get_field(f) for f in fields]
+    max_batch_size = connections[using].ops.bulk_batch_size(
+        ['pk', 'pk'] + fields, objs
+    )
+    if batch_size:
+        batch_size = min(batch_size, max_batch_size)
+    else:
+        batch_size = max_batch_size
+
+    n = 0
+    for batch in chunks(objs, max(batch_size, 1)):
+        updates = {}
+        for field in fields:
+            updates[field.attname] = Case(
+                *[
+                    When(
+                        pk=o.pk,
+                        then=Value(getattr(o, field.attname), output_field=field)
+                    ) for o in batch
+                ],
+                output_field=field
+            )
+        n += manager.filter(pk__in=[o.pk for o in batch]).update(**updates)
+    return n
+
+
+def on_commit(func, using='default'):
+    """Call func once the current transaction is committed
+
+    func is called immediately outside of transactions, and on Django
+    versions lacking ``transaction.on_commit``.
+
+    :param func: a callable, with no arguments
+    :param using: the database alias
+    """
+    if hasattr(transaction, 'on_commit'):
+        transaction.on_commit(func, using=using)
+    else:
+        func()
+
+
+def set_on_commit(cache, items, using='default'):
+    """Set entries of a cache once the current transaction is committed,
+    so that the cache never refers to rows that are rolled back
+
+    Entries are set immediately outside of transactions, and on Django
+    versions lacking ``transaction.on_commit``.
+
+    :param cache: a LRUCache instance
+    :param items: iterable of (key, value) tuples
+    :param using: the database alias
+    """
+    items = list(items)
+
+    def set_items():
+        for k, v in items:
+            cache.set(k, v)
+
+    on_commit(set_items, using=using)
+
+
+def fetch_related(instances, field_names, using='default'):
+    """Load the related instances of some foreign keys of a batch
+    of instances, with one query for each related model
+
+    Related instances already loaded, e.g. assigned when the instances
+    were built, are not fetched again; the fetched ones are set on the
+    instances, so that accessing the foreign keys does not hit the
+    database.
+
+    :param instances: the model instances, all of the same model
+    :param field_names: the names of the foreign keys
+    :param using: the database alias
+    """
+    instances = list(instances)
+    if not instances or not field_names:
+        return
+    opts = instances[0]._meta
+    fields = [opts.get_field(name) for name in field_names]
+
+    def is_cached(field, instance):
+        if hasattr(field, 'is_cached'):
+            return field.is_cached(instance)
+        return hasattr(instance, field.get_cache_name())
+
+    wanted = OrderedDict()
+    for field in fields:
+        key = (field.related_model, field.remote_field.field_name)
+        for instance in instances:
+            value = getattr(instance, field.attname)
+            if value is not None and not is_cached(field, instance):
+                wanted.setdefault(key, set()).add(value)
+
+    fetched = {}
+    for (model, field_name), values in wanted.items():
+        fetched[(model, field_name)] = dict(
+            (getattr(o, field_name), o)
+            for o in model._default_manager.db_manager(using).filter(
+                **{'{0}__in'.format(field_name): values}
+            )
+        )
+
+    for field in fields:
+        related = fetched.get(
+            (field.related_model, field.remote_field.field_name), {}
+        )
+        for instance in instances:
+            value = getattr(instance, field.attname)
+            if value in related and not is_cached(field, instance):
+                setattr(instance, field.name, related[value])
+
+
+def unique_slugs(model, sources, field_name='slug', using='default',
+                 exclude=None):
+    """Return unique slugs for new instances of a model,
+    out of their slug sources
+
+    Slugs are the ones ``AutoSlugField`` would generate saving the
+    instances one after the other, ``-2``, ``-3``, ... suffixes included,
+    but the existing slugs sharing the same prefixes are fetched
+    with a single query, and suffixes are assigned in memory.
+
+    :param model: the model class
+    :param sources: the slug sources (or given slugs), one for each
+        new instance
+    :param field_name: the name of the AutoSlugField
+    :param using: the database alias
+    :param exclude: the primary keys of existing instances being saved,
+        whose own slugs are not rivals
+    :return: list of slugs
+    """
+    field = model._meta.get_field(field_name)
+    sep = field.index_sep
+    rivals = model._default_manager.db_manager(using).all()
+    if exclude:
+        rivals = rivals.exclude(pk__in=exclude)
+
+    bases = []
+    for source in sources:
+        slug = field.slugify(source) if source else None
+        if not slug:
+            slug = model._meta.model_name
+        bases.append(slug[:field.max_length])
+
+    taken = set()
+    for chunk in chunks(sorted(set(bases)), 400):
+        q = Q()
+        for base in chunk:
+            q |= Q(**{field_name: base})
+            q |= Q(**{'{0}__startswith'.format(field_name): base + sep})
+        taken.update(rivals.filter(q).values_list(field_name, flat=True))
+
+    def is_free(slug, base):
+        if slug in taken:
+            return False
+        if slug == base or slug.startswith(base + sep):
+            return True
+        # the prefix was cropped to fit the suffix, not fetched
+        return not rivals.filter(**{field_name: slug}).exists()
+
+    slugs = []
+    for base in bases:
+        original_slug = slug = base
+        index = 1
+        while not is_free(slug, base):
+            index += 1
+            tail_length = len(sep) + len(str(index))
+            if field.max_length < len(original_slug) + tail_length:
+                original_slug = original_slug[:field.max_length - tail_length]
+            slug = '{0}{1}{2}'.format(original_slug, sep, index)
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
@@ -0,0 +1,100 @@
+"""Process-wide map of the content types of the popolo models.
+
+Generic relations (identifiers, other names, contact details, links,
+sources, classifications) are filtered and written by content type;
+the content types of all popolo models are fetched together, with a
+single query, and then kept in memory, so that shortcuts, bulk methods
+and importers do not query ``django_content_type``::
+
+    from popolo.utils.content_types import get_content_type_id
+
+    Identifier.objects.filter(
+        content_type_id=get_content_type_id(Person), object_id=pk
+    )
+
+The models are registered when the app is ready, and the map is filled
+after the migrations of the app, or the first time it is used.
+Fetching the content types also fills the cache of
+``ContentType.objects``, read by the generic relation managers
+(ex: ``person.identifiers.filter(...)``).
+
+Content types of models of other apps are read from
+``ContentType.objects``.
+"""
+import threading
+
+from django.contrib.contenttypes.models import ContentType
+
+_models = frozenset()
+_content_types = {}
+_lock = threading.Lock()
+
+
+def register(models):
+    """Set the models whose content types are kept in the map,
+    emptying it
+
+    :param models: the model classes
+    """
+    global _models
+    with _lock:
+        _models = frozenset(m._meta.concrete_model for m in models)
+        _content_types.clear()
+
+
+def warm(using=None):
+    """Fetch the content types of the registered models,
+    with a single query
+
+    :param using: the database alias, by default the one of
+        ``ContentType.objects``
+    :return: dict of content types, by model
+    """
+    manager = ContentType.objects.db_manager(using)
+    with _lock:
+        content_types = manager.get_for_models(*_models)
+        _content_types[manager.db] = content_types
+    return content_types
+
+
+def clear(using=None, **kwargs):
+    """Empty the map, or the entries of a database; it is filled
+    again when next used
+
+    Connected to ``post_migrate``, as content types may be created,
+    or deleted, by migrations.
+    """
+    with _lock:
+        if using is None:
+            _content_types.clear()
+        else:
+            _content_types.pop(using, None)
+
+
+def get_content_type(model, using=None):
+    """Return the content type of a model, or of an instance
+
+    :param model: a model class or instance
+    :param using: the database alias, by default the one of
+        ``ContentType.objects``
+    :return: the ``ContentType``
+    """
+    model = model._meta.concrete_model
+    if model not in _models:
+        return ContentType.objects.db_manager(using).get_for_model(model)
+    db = ContentType.objects.db_manager(using).db
+    content_types = _content_types.get(db)
+    if content_types is None:
+        content_types = warm(db)
+    return content_types[model]
+
+
+def get_content_type_id(model, using=None):
+    """Return the id of the content type of a model, or of an instance
+
+    :param model: a model class or instance
+    :param using: the database alias, by default the one of
+        ``ContentType.objects``
+    :return: the id
+    """
+    return get_content_type(model, using).pk
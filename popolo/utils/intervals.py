@@ -0,0 +1,410 @@
+"""Batch computation of overlaps among date intervals.
+
+The functions in this module compute the same number of overlapping
+days returned by ``PartialDate.intervals_overlap``, but on whole
+sequences of intervals at once, so that existing rows can be checked
+without building a ``PartialDatesInterval`` for each one of them.
+
+Intervals are expressed as start and end *ordinals*
+(see ``PartialDate.ordinal``); open-ended (null) dates are expressed
+as ``None``, or as ``0``, which is never a valid ordinal.
+
+NumPy is used when it is installed, falling back to pure python
+otherwise; results are NumPy arrays in the first case, lists
+(or lists of lists) in the second.
+
+The ``IntervalIndex`` class is an in-memory index of intervals,
+expressed as sort keys, answering point-in-time and range queries.
+"""
+from bisect import bisect_right
+from collections import OrderedDict
+
+from popolo.utils import PartialDate
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HUGE_OVERLAP = PartialDate.HUGE_OVERLAP
+
+
+def _use_numpy(use_numpy):
+    if use_numpy is None:
+        return np is not None
+    if use_numpy and np is None:
+        raise ImportError("NumPy is required, but it is not installed")
+    return use_numpy
+
+
+def intervals_ordinals(intervals):
+    """Return the start and end ordinals of a sequence of intervals
+
+    :param intervals: iterable of PartialDatesInterval instances
+    :return: a tuple with the list of start and the list of end ordinals
+    """
+    starts = []
+    ends = []
+    for i in intervals:
+        starts.append(i.start.ordinal)
+        ends.append(i.end.ordinal)
+    return starts, ends
+
+
+def overlap_days(a_start, a_end, b_start, b_end):
+    """Return the number of overlapping days between two intervals,
+    expressed as ordinals.
+
+    This is the scalar version of the batch functions, and follows the
+    ``PartialDate.intervals_overlap`` semantics: when both start dates,
+    or both end dates are null, ``HUGE_OVERLAP`` is returned.
+
+    :return: integer
+    """
+    if not a_start and not b_start:
+        return HUGE_OVERLAP
+    if not a_end and not b_end:
+        return HUGE_OVERLAP
+
+    if a_start and b_start:
+        latest_start = max(a_start, b_start)
+    else:
+        latest_start = a_start or b_start
+
+    if a_end and b_end:
+        earliest_end = min(a_end, b_end)
+    else:
+        earliest_end = a_end or b_end
+
+    return earliest_end - latest_start
+
+
+def _as_array(values):
+    if isinstance(values, np.ndarray):
+        return values.astype(np.int64)
+    return np.array([v or 0 for v in values], dtype=np.int64)
+
+
+def _np_overlap_days(a_start, a_end, b_start, b_end):
+    """Vectorized ``overlap_days``, arguments are broadcast against
+    each other"""
+    a_start_null = a_start == 0
+    b_start_null = b_start == 0
+    a_end_null = a_end == 0
+    b_end_null = b_end == 0
+
+    latest_start = np.where(
+        a_start_null, b_start,
+        np.where(b_start_null, a_start, np.maximum(a_start, b_start))
+    )
+    earliest_end = np.where(
+        a_end_null, b_end,
+        np.where(b_end_null, a_end, np.minimum(a_end, b_end))
+    )
+
+    return np.where(
+        (a_start_null & b_start_null) | (a_end_null & b_end_null),
+        HUGE_OVERLAP,
+        earliest_end - latest_start
+    )
+
+
+def overlaps_one_to_many(start, end, starts, ends, use_numpy=None):
+    """Return the overlapping days between one interval and many others
+
+    :param start: the start ordinal of the interval
+    :param end: the end ordinal of the interval
+    :param starts: sequence of start ordinals of the other intervals
+    :param ends: sequence of end ordinals of the other intervals
+    :param use_numpy: force (True) or avoid (False) the usage of NumPy,
+        by default it's used if installed
+    :return: the overlapping days, one for each of the other intervals
+    """
+    if _use_numpy(use_numpy):
+        return _np_overlap_days(
+            np.int64(start or 0), np.int64(end or 0),
+            _as_array(starts), _as_array(ends)
+        )
+    return [
+        overlap_days(start, end, s, e) for s, e in zip(starts, ends)
+    ]
+
+
+def overlaps_many_to_many(
+    a_starts, a_ends, b_starts, b_ends, use_numpy=None
+):
+    """Return the overlapping days between each couple of intervals
+    taken from two sequences
+
+    :param a_starts: start ordinals of the first sequence of intervals
+    :param a_ends: end ordinals of the first sequence of intervals
+    :param b_starts: start ordinals of the second sequence of intervals
+    :param b_ends: end ordinals of the second sequence of intervals
+    :param use_numpy: force (True) or avoid (False) the usage of NumPy,
+        by default it's used if installed
+    :return: a matrix, with a row for each interval of the first sequence,
+        and a column for each interval of the second one
+    """
+    if _use_numpy(use_numpy):
+        return _np_overlap_days(
+            _as_array(a_starts)[:, None], _as_array(a_ends)[:, None],
+            _as_array(b_starts)[None, :], _as_array(b_ends)[None, :]
+        )
+    b = list(zip(b_starts, b_ends))
+    return [
+        [overlap_days(a_s, a_e, b_s, b_e) for b_s, b_e in b]
+        for a_s, a_e in zip(a_starts, a_ends)
+    ]
+
+
+def overlapping_pairs(
+    starts, ends, groups=None, min_overlap=1, use_numpy=None
+):
+    """Return the couples of overlapping intervals within a sequence
+
+    This can be used to audit a whole table, ex: the memberships
+    of the same person to the same organization and post
+    that overlap each other::
+
+        rows = list(Membership.objects.values_list(
+            'person_id', 'organization_id', 'post_id',
+            'start_date', 'end_date'
+        ))
+        overlapping_pairs(
+            [PartialDate.of(r[3]).ordinal for r in rows],
+            [PartialDate.of(r[4]).ordinal for r in rows],
+            groups=[r[:3] for r in rows]
+        )
+
+    :param starts: start ordinals of the intervals
+    :param ends: end ordinals of the intervals
+    :param groups: optional sequence of hashable keys, one for each
+        interval; when specified only intervals within the same group
+        are compared
+    :param min_overlap: minimum number of overlapping days,
+        by default intervals touching each other are not reported
+    :param use_numpy: force (True) or avoid (False) the usage of NumPy,
+        by default it's used if installed
+    :return: list of (i, j) couples of indexes, with i < j
+    """
+    starts = list(starts)
+    ends = list(ends)
+    if groups is None:
+        groups = [None] * len(starts)
+
+    indexes = OrderedDict()
+    for n, g in enumerate(groups):
+        indexes.setdefault(g, []).append(n)
+
+    use_numpy = _use_numpy(use_numpy)
+    pairs = []
+    for idx in indexes.values():
+        if len(idx) < 2:
+            continue
+        g_starts = [starts[n] for n in idx]
+        g_ends = [ends[n] for n in idx]
+        overlaps = overlaps_many_to_many(
+            g_starts, g_ends, g_starts, g_ends, use_numpy=use_numpy
+        )
+        if use_numpy:
+            rows, cols = np.nonzero(
+                np.triu(overlaps >= min_overlap, k=1)
+            )
+            pairs.extend(
+                (idx[r], idx[c]) for r, c in zip(rows.tolist(), cols.tolist())
+            )
+        else:
+            for r in range(len(idx)):
+                for c in range(r + 1, len(idx)):
+                    if overlaps[r][c] >= min_overlap:
+                        pairs.append((idx[r], idx[c]))
+    return pairs
+
+
+def start_key(date_string):
+    """Return the sort key of a start date, ``MIN_KEY`` if null
+
+    :param date_string: the date in one of the PartialDate allowed formats
+    :return: integer
+    """
+    if date_string:
+        return PartialDate.of(date_string).key
+    return PartialDate.MIN_KEY
+
+
+def end_key(date_string):
+    """Return the sort key of an end date, ``MAX_KEY`` if null
+
+    :param date_string: the date in one of the PartialDate allowed formats
+    :return: integer
+    """
+    if date_string:
+        return PartialDate.of(date_string).key
+    return PartialDate.MAX_KEY
+
+
+class _Node(object):
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+
+class IntervalIndex(object):
+    """An index of closed intervals, answering which intervals
+    contain a point, or overlap a range, in O(log n + k).
+
+    Intervals are identified by an id, and their bounds are integer sort
+    keys (see ``PartialDate.key``); open-ended intervals use the
+    ``PartialDate.MIN_KEY`` and ``PartialDate.MAX_KEY`` sentinels,
+    see ``start_key`` and ``end_key``.
+
+    The index is a centered interval tree, plus the list of intervals
+    sorted by start. Intervals can be added, changed and removed
+    incrementally; changes are kept in a small overlay, scanned
+    linearly at query time, and the tree is rebuilt lazily when the
+    overlay grows past ``max_pending`` changes.
+    """
+
+    def __init__(self, intervals=(), max_pending=256):
+        """Initialize the index
+
+        :param intervals: iterable of (id, start key, end key) tuples
+        :param max_pending: the number of incremental changes
+            that triggers a rebuild of the tree
+        """
+        self.max_pending = max_pending
+        self._intervals = {}
+        for i, s, e in intervals:
+            self._intervals[i] = (s, e)
+        self._root = None
+        self._starts = []
+        self._start_ids = []
+        self._stale = set()
+        self._pending = {}
+        self._built = False
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def __contains__(self, id):
+        return id in self._intervals
+
+    def add(self, id, start, end):
+        """Add an interval to the index, or change its bounds
+
+        :param id: the interval identifier
+        :param start: the start key
+        :param end: the end key
+        """
+        if self._intervals.get(id) == (start, end):
+            return
+        self._intervals[id] = (start, end)
+        if self._built:
+            self._stale.add(id)
+            self._pending[id] = (start, end)
+            self._check_pending()
+
+    def remove(self, id):
+        """Remove an interval from the index, if present
+
+        :param id: the interval identifier
+        """
+        if self._intervals.pop(id, None) is None:
+            return
+        if self._built:
+            self._stale.add(id)
+            self._pending.pop(id, None)
+            self._check_pending()
+
+    def _check_pending(self):
+        if len(self._stale) > self.max_pending:
+            self._built = False
+
+    def _build(self):
+        items = sorted(
+            (s, e, i) for i, (s, e) in self._intervals.items()
+        )
+        self._starts = [s for s, e, i in items]
+        self._start_ids = [i for s, e, i in items]
+        self._root = self._build_node(items)
+        self._stale = set()
+        self._pending = {}
+        self._built = True
+
+    def _build_node(self, items):
+        """Build the tree out of (start, end, id) tuples sorted by start"""
+        if not items:
+            return None
+        node = _Node()
+        node.center = items[len(items) // 2][0]
+        left, here, right = [], [], []
+        for item in items:
+            if item[1] < node.center:
+                left.append(item)
+            elif item[0] > node.center:
+                right.append(item)
+            else:
+                here.append(item)
+        node.by_start = [(s, i) for s, e, i in here]
+        node.by_end = sorted(
+            ((e, i) for s, e, i in here), reverse=True
+        )
+        node.left = self._build_node(left)
+        node.right = self._build_node(right)
+        return node
+
+    def _stab(self, point):
+        node = self._root
+        while node is not None:
+            if point < node.center:
+                for s, i in node.by_start:
+                    if s > point:
+                        break
+                    yield i
+                node = node.left
+            elif point > node.center:
+                for e, i in node.by_end:
+                    if e < point:
+                        break
+                    yield i
+                node = node.right
+            else:
+                for s, i in node.by_start:
+                    yield i
+                break
+
+    def stab(self, point):
+        """Return the ids of the intervals containing point
+
+        :param point: the key of the point
+        :return: list of ids
+        """
+        if not self._built:
+            self._build()
+        stale = self._stale
+        ids = [i for i in self._stab(point) if i not in stale]
+        ids.extend(
+            i for i, (s, e) in self._pending.items() if s <= point <= e
+        )
+        return ids
+
+    def overlapping(self, start, end):
+        """Return the ids of the intervals overlapping the [start, end]
+        range, touching ones included
+
+        :param start: the start key of the range
+        :param end: the end key of the range
+        :return: list of ids
+        """
+        if not self._built:
+            self._build()
+        stale = self._stale
+        # intervals containing start, plus intervals starting within
+        # (start, end], are the intervals overlapping [start, end]
+        ids = [i for i in self._stab(start) if i not in stale]
+        lo = bisect_right(self._starts, start)
+        hi = bisect_right(self._starts, end)
+        ids.extend(i for i in self._start_ids[lo:hi] if i not in stale)
+        ids.extend(
+            i for i, (s, e) in self._pending.items()
+            if s <= end and e >= start
+        )
+        return ids
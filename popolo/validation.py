@@ -0,0 +1,231 @@
+"""Deferred, batched validation of the instances saved within a block.
+
+By default, the main popolo instances are validated with ``full_clean``
+whenever they are saved, one at a time, which means validating the
+same date strings and URLs over and over, one query for each unique
+field and one for each related instance.
+
+Within the ``deferred`` context manager, the ``validate_fields``
+receiver only records the saved instances, that are validated
+as a batch when the block exits::
+
+    from popolo.validation import deferred
+
+    with deferred():
+        for row in rows:
+            Person.objects.create(**row)
+
+The block is run in a transaction, rolled back if the validation fails,
+so that no invalid rows are left in the database.
+
+The batch validation (``validate_instances``) validates each distinct
+value of a field only once, checks the existence of related instances
+with one query per relation, and calls the ``clean`` method of each
+instance. Uniqueness is not checked, as the rows are already written
+when the batch is validated, and unique fields are enforced by the
+database constraints, raising ``IntegrityError`` on save.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils import six
+
+_state = threading.local()
+
+
+def is_deferred():
+    """Return whether the validation is deferred in the current thread
+
+    :return: boolean
+    """
+    return getattr(_state, 'pending', None) is not None
+
+
+def defer(instance):
+    """Record an instance for the validation at the end of the current
+    ``deferred`` block, if any
+
+    :param instance: the model instance being saved
+    :return: True if the validation is deferred, False otherwise
+    """
+    pending = getattr(_state, 'pending', None)
+    if pending is None:
+        return False
+    pending[id(instance)] = instance
+    return True
+
+
+@contextmanager
+def deferred(using=None):
+    """Defer the validation of the instances saved within the block,
+    validating them as a batch when the block exits
+
+    The block is run within ``transaction.atomic``; blocks can be nested,
+    the validation is performed when the outermost block exits.
+
+    :param using: the database alias
+    :raise ValidationError: if some of the saved instances are not valid
+    """
+    if is_deferred():
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    _state.pending = OrderedDict()
+    try:
+        with transaction.atomic(using=using):
+            yield
+            instances = list(_state.pending.values())
+            _state.pending = None
+            validate_instances(instances, using=using)
+    finally:
+        _state.pending = None
+
+
+def _clean_values(field, instances, errors):
+    """Clean the values of a non-relational field, validating each
+    distinct value once"""
+    cleaned = {}
+    for n, obj in enumerate(instances):
+        raw_value = getattr(obj, field.attname)
+        if field.blank and raw_value in field.empty_values:
+            continue
+        try:
+            key = (type(raw_value), raw_value)
+            hash(key)
+        except TypeError:
+            key = None
+
+        if key is None or key not in cleaned:
+            try:
+                result = (True, field.clean(raw_value, obj))
+            except ValidationError as e:
+                result = (False, e)
+            if key is None:
+                outcome = result
+            else:
+                outcome = cleaned[key] = result
+        else:
+            outcome = cleaned[key]
+
+        if outcome[0]:
+            setattr(obj, field.attname, outcome[1])
+        else:
+            errors[n].setdefault(field.name, []).extend(
+                outcome[1].error_list
+            )
+
+
+def _check_related(field, instances, errors, using):
+    """Validate the values of a foreign key, checking the existence
+    of the related instances with a single query"""
+    values = {}
+    for n, obj in enumerate(instances):
+        value = getattr(obj, field.attname)
+        if field.blank and value in field.empty_values:
+            continue
+        try:
+            # the checks of ForeignKey.validate, but the query
+            value = field.to_python(value)
+            models.Field.validate(field, value, obj)
+            field.run_validators(value)
+        except ValidationError as e:
+            errors[n].setdefault(field.name, []).extend(e.error_list)
+            continue
+        if value is not None:
+            values.setdefault(value, []).append(n)
+
+    if not values:
+        return
+    field_name = field.remote_field.field_name
+    existing = set(
+        field.remote_field.model._default_manager.using(using).filter(
+            **{'{0}__in'.format(field_name): list(values)}
+        ).complex_filter(
+            field.get_limit_choices_to()
+        ).values_list(field_name, flat=True)
+    )
+    for value, indexes in values.items():
+        if value in existing:
+            continue
+        for n in indexes:
+            errors[n].setdefault(field.name, []).append(ValidationError(
+                field.error_messages['invalid'],
+                code='invalid',
+                params={
+                    'model': field.remote_field.model._meta.verbose_name,
+                    'pk': value,
+                    'field': field_name,
+                    'value': value,
+                },
+            ))
+
+
+def _describe(obj):
+    try:
+        return six.text_type(obj)
+    except Exception:
+        # ex: a related instance used in __str__ does not exist
+        return u'pk={0}'.format(obj.pk)
+
+
+def instances_errors(instances, using=None):
+    """Return the errors of a batch of instances, validated
+    as ``full_clean`` would, but for the uniqueness checks
+
+    Values are cleaned and set on the instances, as in ``clean_fields``.
+
+    :param instances: the model instances, of any model
+    :param using: the database alias
+    :return: for each instance, the dict of the lists of errors
+        by field name, empty if the instance is valid
+    """
+    instances = list(instances)
+    by_model = OrderedDict()
+    for n, obj in enumerate(instances):
+        by_model.setdefault(type(obj), []).append(n)
+
+    errors = [{} for obj in instances]
+    for model, indexes in by_model.items():
+        objs = [instances[n] for n in indexes]
+        model_errors = [errors[n] for n in indexes]
+        for field in model._meta.fields:
+            if field.many_to_one or field.one_to_one:
+                _check_related(field, objs, model_errors, using)
+            else:
+                _clean_values(field, objs, model_errors)
+
+        for n in indexes:
+            try:
+                instances[n].clean()
+            except ValidationError as e:
+                errors[n] = e.update_error_dict(errors[n])
+    return errors
+
+
+def validate_instances(instances, using=None):
+    """Validate a batch of instances, as ``full_clean`` would,
+    but for the uniqueness checks
+
+    Values are cleaned and set on the instances, as in ``clean_fields``.
+
+    :param instances: the model instances, of any model
+    :param using: the database alias
+    :raise ValidationError: listing the errors of each invalid instance
+    """
+    instances = list(instances)
+    failures = []
+    for obj, errors in zip(instances, instances_errors(instances, using)):
+        if errors:
+            failures.append(ValidationError(
+                u'{0} "{1}": {2}'.format(
+                    obj._meta.verbose_name, _describe(obj),
+                    ValidationError(errors).message_dict
+                )
+            ))
+
+    if failures:
+        raise ValidationError(failures)
@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import os
 import sys
 
 import django
@@ -7,10 +8,18 @@ from django.conf import settings
 
 if not settings.configured:
     settings.configure(
+        # the tests run on SQLite, unless another database is set
+        # through the environment, ex: POPOLO_DB_ENGINE=postgresql
         DATABASES={
             'default': {
-                'ENGINE': 'django.db.backends.sqlite3',
-                'NAME': ':memory:',
+                'ENGINE': 'django.db.backends.' + os.environ.get(
+                    'POPOLO_DB_ENGINE', 'sqlite3'
+                ),
+                'NAME': os.environ.get('POPOLO_DB_NAME', ':memory:'),
+                'USER': os.environ.get('POPOLO_DB_USER', ''),
+                'PASSWORD': os.environ.get('POPOLO_DB_PASSWORD', ''),
+                'HOST': os.environ.get('POPOLO_DB_HOST', ''),
+                'PORT': os.environ.get('POPOLO_DB_PORT', ''),
             }
         },
         INSTALLED_APPS=(